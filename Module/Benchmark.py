@@ -0,0 +1,229 @@
+# coding = utf-8
+import os
+import sys
+import json
+import time
+import platform
+import subprocess
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+import torch
+import torch.optim as optim
+import Module.Training as Training
+import Module.Profile as Profile
+
+try:
+    import resource
+except ImportError:     # Windows没有resource模块，峰值内存记为None
+    resource = None
+
+# 基准测试的算例，Config中列出的模型全部参与
+# Benchmarked cases; every model listed in their Configs takes part.
+cases = [('Laplace', 'EXP'), ('Burgers_inv', 'EXP'), ('Poisson', 'EXP'), ('Flow', 'EXP')]
+
+
+def clock():
+    # GPU上的计算是异步的，计时前先同步
+    if torch.cuda.is_available():
+        torch.cuda.synchronize()
+    return time.perf_counter()
+
+
+def peak_rss():
+    # 进程的峰值常驻内存（MB），Linux上ru_maxrss的单位为KB，macOS上为字节
+    if resource is None:
+        return None
+    scale = 1 if sys.platform == 'darwin' else 1024
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale / 2 ** 20
+
+
+def run_model(ques_name, ini_num, model_name, steps: int = 20, warmup_steps: int = 2, thread_num: int = 1, lean_state: int = 0):
+    '''
+    对一个(算例, 模型)计时固定步数的训练，返回各阶段每步的平均时间、每秒步数和峰值内存
+    Time a fixed number of training steps of one (case, model) and return the mean time per step of
+    each phase, steps per second and peak memory. Step peak RSS MB is how far the peak RSS rose
+    during the steps, above what setup already reached.
+
+    forward: 在全部配点上的一次前向；residual: 损失的计算（前向、残差导数、边界和监督损失）；
+    backward: 反传；optimizer: Adam更新。一步的时间为后三者之和。lean_state时残差计算中的分块反传计入backward
+    forward is one forward pass over the collocation points; residual is the loss evaluation (forward,
+    residual derivatives, boundary and data terms); backward and optimizer are the backward pass and
+    the Adam update. A step is residual + backward + optimizer. With lean_state the chunked backward
+    that runs inside the residual is counted as backward, so the two modes compare phase by phase.
+    '''
+    torch.set_num_threads(thread_num)
+    torch.manual_seed(1234)
+    start = clock()
+    task = Training.model(ques_name, ini_num)
+    task.lean_state = lean_state
+    task.mesh_init()
+    task.net = task.net_build(model_name)
+    task.para_undetermin = torch.nn.Parameter(torch.zeros(task.para_ctrl_num).float().to(Training.device))
+    optimizer = optim.Adam(list(task.net.parameters()) + [task.para_undetermin], lr=task.learning_rate)
+    # 省内存模式在残差计算中分块反传，用Profile的backward阶段把这部分时间从residual移到backward，两种模式逐项可比
+    if lean_state:
+        task.profiler = Profile.Profiler(True, torch.cuda.is_available())
+    loss_step = task.loss_compile()
+    xy = torch.cat([task.x, task.y], dim=1)
+    setup_time = clock() - start
+    setup_rss = peak_rss()
+
+    phases = {'forward': 0., 'residual': 0., 'backward': 0., 'optimizer': 0.}
+    for step in range(warmup_steps + steps):
+        time_0 = clock()
+        task.net(xy)
+        time_1 = clock()
+        optimizer.zero_grad()
+        chunk_start = task.profiler.phases.get('backward', (0., 0))[0]
+        # 与训练循环相同，保存的损失保留到下一步（省内存模式下计算图在反传时已释放）
+        task.loss, loss_backward = loss_step()[:2]
+        time_2 = clock()
+        chunk_backward = task.profiler.phases.get('backward', (0., 0))[0] - chunk_start
+        task.backward(loss_backward)
+        time_3 = clock()
+        optimizer.step()
+        time_4 = clock()
+        if step >= warmup_steps:
+            elapsed_list = [time_1 - time_0, time_2 - time_1 - chunk_backward, time_3 - time_2 + chunk_backward, time_4 - time_3]
+            for phase, elapsed in zip(phases, elapsed_list):
+                phases[phase] += elapsed
+
+    step_time = (phases['residual'] + phases['backward'] + phases['optimizer']) / steps
+    return {
+        'Question': ques_name,
+        'Number': ini_num,
+        'Module': model_name,
+        'Lean': lean_state,
+        'Parameters': sum(p.numel() for p in task.net.parameters()),
+        'Points': int(xy.shape[0]),
+        'Setup time': setup_time,
+        **{f'{phase} ms': 1000 * elapsed / steps for phase, elapsed in phases.items()},
+        'Steps per second': 1 / step_time,
+        'Peak RSS MB': peak_rss(),
+        'Step peak RSS MB': None if resource is None else peak_rss() - setup_rss,
+        'Peak CUDA MB': torch.cuda.max_memory_allocated() / 2 ** 20 if torch.cuda.is_available() else None,
+    }
+
+
+def environment(steps, warmup_steps, thread_num):
+    # 记录运行环境，便于判断两次结果是否可比
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {'Time': time.strftime('%Y-%m-%d %H:%M:%S'), 'Commit': commit, 'Python': platform.python_version(),
+            'Torch': torch.__version__, 'Platform': platform.platform(), 'Processor': platform.processor(),
+            'CPU count': os.cpu_count(), 'CUDA': torch.cuda.get_device_name(0) if torch.cuda.is_available() else None,
+            'Steps': steps, 'Warmup steps': warmup_steps, 'Threads': thread_num}
+
+
+def run(case_list=None, steps: int = 20, warmup_steps: int = 2, thread_num: int = 1, file_path=None, lean_state: int = 0):
+    '''
+    依次在独立的子进程中测试每个(算例, 模型)，结果写入JSON（默认 Results/Benchmark/benchmark_<时间>.json）
+    Benchmark every (case, model) one after another, each in a fresh process so that peak memory is
+    per model and no run warms up the next; results go to a JSON file, by default
+    Results/Benchmark/benchmark_<time>.json. Runs are sequential and use a fixed thread count so
+    that results stay comparable over time.
+    '''
+    case_list = cases if case_list is None else case_list
+    job_list = [(ques_name, ini_num, model_name) for ques_name, ini_num in case_list
+                for model_name in Training.model(ques_name, ini_num).model_ini_dict['model']]
+
+    results = []
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(1, mp_context=context, max_tasks_per_child=1) as executor:
+        for job in job_list:
+            result = executor.submit(run_model, *job, steps, warmup_steps, thread_num, lean_state).result()
+            results.append(result)
+            rss = f"{result['Peak RSS MB']:.0f} MB" if result['Peak RSS MB'] is not None else 'n/a'
+            print(f"{result['Question']}_{result['Number']} {result['Module']}: {result['Steps per second']:.2f} steps/s, "
+                  f"forward {result['forward ms']:.1f} ms, residual {result['residual ms']:.1f} ms, "
+                  f"backward {result['backward ms']:.1f} ms, optimizer {result['optimizer ms']:.2f} ms, peak RSS {rss}")
+
+    if file_path is None:
+        os.makedirs('./Results/Benchmark/', exist_ok=True)
+        file_path = f"./Results/Benchmark/benchmark_{time.strftime('%Y%m%d-%H%M%S')}.json"
+    with open(file_path, 'w') as file:
+        json.dump({'Environment': environment(steps, warmup_steps, thread_num), 'Results': results}, file, indent=2)
+    print(f'Benchmark written to {file_path}')
+    return file_path
+
+
+def compare(base_path, new_path, tolerance: float = 0.1):
+    '''
+    比较两次基准测试，每秒步数下降超过tolerance（比例）的(算例, 模型)视为性能退化，返回退化列表
+    Compare two benchmark files; a (case, model) whose steps per second dropped by more than
+    tolerance (a fraction) is a regression. Returns the list of regressions.
+    '''
+    with open(base_path) as file:
+        base = json.load(file)
+    with open(new_path) as file:
+        new = json.load(file)
+    base_results = {(r['Question'], r['Number'], r['Module']): r for r in base['Results']}
+
+    regressions = []
+    for result in new['Results']:
+        key = (result['Question'], result['Number'], result['Module'])
+        if key not in base_results:
+            continue
+        ratio = result['Steps per second'] / base_results[key]['Steps per second']
+        print(f"{key[0]}_{key[1]} {key[2]}: {base_results[key]['Steps per second']:.2f} -> {result['Steps per second']:.2f} steps/s ({ratio:.2f}x)")
+        if ratio < 1 - tolerance:
+            regressions.append({'Case': key, 'Ratio': ratio})
+
+    for name in ['Torch', 'Threads', 'Steps', 'Processor']:
+        if base['Environment'].get(name) != new['Environment'].get(name):
+            print(f"Note: {name} differs ({base['Environment'].get(name)} vs {new['Environment'].get(name)}), results may not be comparable.")
+    return regressions
+
+
+def memory(case_list=None, steps: int = 5, thread_num: int = 1, file_path=None):
+    '''
+    每个(算例, 模型)分别在普通模式和省内存模式（lean_state）下各训练steps步，比较训练步使CPU峰值内存（RSS）
+    增加的量和CUDA峰值显存，结果写入JSON（默认 Results/Benchmark/memory_<时间>.json）
+    Train every (case, model) for steps steps in the default and in the memory-lean mode
+    (lean_state), each in a fresh process, and compare how far the steps raised the peak RSS and
+    the peak CUDA memory. Results go to a JSON file, by default Results/Benchmark/memory_<time>.json.
+    '''
+    case_list = cases if case_list is None else case_list
+    job_list = [(ques_name, ini_num, model_name) for ques_name, ini_num in case_list
+                for model_name in Training.model(ques_name, ini_num).model_ini_dict['model']]
+
+    results = []
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(1, mp_context=context, max_tasks_per_child=1) as executor:
+        for job in job_list:
+            base, lean = [executor.submit(run_model, *job, steps, 1, thread_num, lean_state).result() for lean_state in [0, 1]]
+            result = {'Question': job[0], 'Number': job[1], 'Module': job[2]}
+            for name in ['Step peak RSS MB', 'Peak CUDA MB', 'Steps per second']:
+                result[name] = base[name]
+                result[f'{name} (lean)'] = lean[name]
+            results.append(result)
+
+            key = 'Peak CUDA MB' if torch.cuda.is_available() else 'Step peak RSS MB'
+            if base[key] is not None:
+                print(f"{job[0]}_{job[1]} {job[2]}: {key} {base[key]:.1f} -> {lean[key]:.1f} "
+                      f"({1 - lean[key] / max(base[key], 1e-9):.0%} saved), {base['Steps per second']:.2f} -> {lean['Steps per second']:.2f} steps/s")
+
+    if file_path is None:
+        os.makedirs('./Results/Benchmark/', exist_ok=True)
+        file_path = f"./Results/Benchmark/memory_{time.strftime('%Y%m%d-%H%M%S')}.json"
+    with open(file_path, 'w') as file:
+        json.dump({'Environment': environment(steps, 1, thread_num), 'Results': results}, file, indent=2)
+    print(f'Memory comparison written to {file_path}')
+    return file_path
+
+
+if __name__ == '__main__':
+    # 用法 / usage: python -m Module.Benchmark [steps]
+    #               python -m Module.Benchmark compare base.json new.json [tolerance]
+    #               python -m Module.Benchmark memory [steps]
+    if len(sys.argv) > 1 and sys.argv[1] == 'memory':
+        memory(steps=int(sys.argv[2]) if len(sys.argv) > 2 else 5)
+    elif len(sys.argv) > 1 and sys.argv[1] == 'compare':
+        regression_list = compare(sys.argv[2], sys.argv[3], float(sys.argv[4]) if len(sys.argv) > 4 else 0.1)
+        if regression_list:
+            print(f'{len(regression_list)} regressions: {regression_list}')
+            sys.exit(1)
+    else:
+        run(steps=int(sys.argv[1]) if len(sys.argv) > 1 else 20)
@@ -0,0 +1,124 @@
+# coding = utf-8
+import os
+import io
+import csv
+import copy
+import shutil
+import queue
+import threading
+import torch
+
+
+def snapshot(state):
+    '''
+    复制一份训练状态，张量在原device上clone，不需要与主机同步
+    Copy a (nested) training state. Tensors are cloned on their own device, which is queued on the
+    same stream as the training step, so the copy is consistent without a host sync; later in-place
+    updates of the weights or Adam moments do not reach it.
+    '''
+    if isinstance(state, torch.Tensor):
+        return state.detach().clone()
+    if isinstance(state, dict):
+        return {key: snapshot(value) for key, value in state.items()}
+    if isinstance(state, (list, tuple)):
+        return type(state)(snapshot(value) for value in state)
+    return copy.deepcopy(state)
+
+
+def save(path, state):
+    '''
+    先写临时文件再替换，中途被终止时不会留下损坏的检查点
+    Write to a temporary file and rename it over path, so a kill mid-write never leaves a broken file.
+    '''
+    torch.save(state, path + '.tmp')
+    os.replace(path + '.tmp', path)
+
+
+def copy_file(source, path):
+    '''
+    原子地复制文件，多个进程同时写同一个目标时读者只会看到完整的文件
+    Copy source to path atomically: a per-process temporary file is renamed over path, so
+    concurrent writers of the same target never leave a mixed or truncated file.
+    '''
+    temp_path = f'{path}.{os.getpid()}.tmp'
+    shutil.copyfile(source, temp_path)
+    os.replace(temp_path, path)
+
+
+def append_row(path, header, row):
+    '''
+    多个进程向同一个CSV追加一行：表头先写入临时文件再用os.link原子地放到path（已存在时不覆盖），
+    每一行用一次O_APPEND写入，不会重复写表头，行之间也不会交错
+    Append one row to a CSV shared by several processes. The header is written to a temporary
+    file and hard-linked into place, which fails instead of overwriting when another process got
+    there first, so the header is written exactly once; each row is then a single O_APPEND write,
+    so rows from different processes never interleave.
+    '''
+    if not os.path.isfile(path):
+        temp_path = f'{path}.{os.getpid()}.tmp'
+        with open(temp_path, 'w', newline='') as file:
+            csv.writer(file, lineterminator='\n').writerow(header)
+        try:
+            os.link(temp_path, path)
+        except FileExistsError:
+            pass
+        finally:
+            os.remove(temp_path)
+
+    buffer = io.StringIO()
+    csv.writer(buffer, lineterminator='\n').writerow(row)
+    file = os.open(path, os.O_WRONLY | os.O_APPEND)
+    try:
+        os.write(file, buffer.getvalue().encode('utf-8'))
+    finally:
+        os.close(file)
+
+
+def load(path, device=None):
+    return torch.load(path, map_location=device, weights_only=False)
+
+
+class Writer():
+    '''
+    后台线程写检查点，训练循环只负责提交快照
+    Background checkpoint writer: the step loop only takes the snapshot, the thread moves it to
+    the host and writes it. At most queue_num snapshots wait at a time; submit() blocks beyond that.
+
+    写入中的异常在下一次submit()或wait()时抛出
+    An error raised while writing is re-raised on the next submit() or wait().
+
+    线程在第一次submit()时才启动，只用来读取Config的model不会多出线程
+    The thread starts on the first submit(), so models that never save (e.g. built only to read
+    their Config) do not start one.
+    '''
+    def __init__(self, queue_num: int = 2):
+        self.queue = queue.Queue(maxsize=queue_num)
+        self.error = None
+        self.thread = None
+
+    def run(self):
+        while True:
+            path, state = self.queue.get()
+            try:
+                save(path, state)
+            except Exception as error:
+                self.error = error
+            finally:
+                self.queue.task_done()
+
+    def check(self):
+        if self.error is not None:
+            error, self.error = self.error, None
+            raise error
+
+    def submit(self, path, state):
+        self.check()
+        if self.thread is None:
+            self.thread = threading.Thread(target=self.run, daemon=True)
+            self.thread.start()
+        self.queue.put((path, snapshot(state)))
+
+    # 等待已提交的检查点全部写完
+    def wait(self):
+        self.queue.join()
+        self.check()
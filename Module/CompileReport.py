@@ -0,0 +1,76 @@
+# coding = utf-8
+import os
+import sys
+import time
+import pandas as pd
+import torch
+import torch.optim as optim
+import Module.Training as Training
+
+
+def step_rate(task, steps: int = 50, warmup_steps: int = 3):
+    '''
+    对当前的task.net计时完整训练步（前向、残差、损失、反传、Adam更新），返回(每秒步数, 预热时间)
+    Time full training steps of task.net and return (steps per second, warm-up seconds).
+    编译模式下预热时间包含编译时间
+    '''
+    task.para_undetermin = torch.nn.Parameter(torch.zeros(task.para_ctrl_num).float().to(Training.device))
+    optimizer = optim.Adam(list(task.net.parameters()) + [task.para_undetermin], lr=task.learning_rate)
+    loss_step = task.loss_compile()
+
+    def train_step():
+        optimizer.zero_grad()
+        loss_backward = loss_step()[1]
+        loss_backward.backward()
+        optimizer.step()
+
+    start = time.time()
+    for _ in range(warmup_steps):
+        train_step()
+    warmup_time = time.time() - start
+
+    start = time.time()
+    for _ in range(steps):
+        train_step()
+    return steps / (time.time() - start), warmup_time
+
+
+def report(ques_name, ini_num, steps: int = 50):
+    '''
+    对Config中的每个模型分别计时普通模式和编译模式，结果写入 Results/<case>/Compile report.csv
+    Compare eager and compiled steps per second for every model of a Config.
+    '''
+    task = Training.model(ques_name, ini_num)
+    task.mesh_init()
+
+    rows = []
+    for model_name in task.model_ini_dict['model']:
+        # 参数化模式不支持编译（见Training.compile_check），只计时普通模式
+        for compile_state in [0] if task.para_ctrl_add else [0, 1]:
+            torch.manual_seed(1234)
+            task.compile_state = compile_state
+            task.net = task.net_build(model_name)
+            rate, warmup_time = step_rate(task, steps)
+            rows.append({
+                'Question': ques_name,
+                'Number': ini_num,
+                'Module': model_name,
+                'Mode': 'compiled' if compile_state else 'eager',
+                'Fallback': int(compile_state and task.compile_fallback),
+                'Steps per second': rate,
+                'Warmup time': warmup_time
+            })
+            print(f"{model_name} ({rows[-1]['Mode']}): {rate:.2f} steps/s, warm-up {warmup_time:.2f} s")
+
+    df_report = pd.DataFrame(rows)
+    df_report['Speedup'] = df_report['Steps per second'] / df_report.groupby('Module')['Steps per second'].transform('first')
+
+    file_path = task.save_desti + 'Compile report.csv'
+    os.makedirs(task.save_desti, exist_ok=True)
+    df_report.to_csv(file_path, index=False)
+    return df_report
+
+
+if __name__ == '__main__':
+    # 用法 / usage: python -m Module.CompileReport Laplace EXP [steps]
+    report(sys.argv[1], sys.argv[2], int(sys.argv[3]) if len(sys.argv) > 3 else 50)
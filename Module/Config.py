@@ -0,0 +1,48 @@
+# coding = utf-8
+import os
+import csv
+
+# 扫描生成的Config所在的文件夹（见Sweep），不纳入版本管理
+# Folder of the configs generated by sweeps (see Sweep); it is not tracked by git.
+sweep_folder = './Config/Sweep/'
+
+
+def value_type(key):
+    # 含有min/max的一般是函数值，要变为float方便计算；含有num/state的为int；默认是字符串
+    if 'min' in key or 'max' in key:
+        return float
+    if 'num' in key or 'state' in key:
+        return int
+    return str
+
+
+def load(path):
+    '''
+    读取Config CSV的前两列为{键: 值}，并按键名确定类型（与原先pd.read_csv + iterrows的结果相同）
+    Read the first two columns of a Config CSV into {key: value}, typed by the key name, with the
+    same result as the former pd.read_csv + iterrows parsing but without importing pandas.
+
+    空行跳过，缺失的值按NaN处理，同名的键以后出现的为准
+    Blank lines are skipped, missing values are NaN, and a repeated key keeps its last value.
+    '''
+    model_ini_dict = {}
+    with open(path, newline='', encoding='utf-8') as file:
+        for row in csv.reader(file):
+            if not row or not any(row):
+                continue
+            key = row[0]
+            value = row[1] if len(row) > 1 and row[1] != '' else 'nan'
+            model_ini_dict[key] = value_type(key)(value)
+    return model_ini_dict
+
+
+def path(ques_name, ini_num):
+    '''
+    Config文件的路径，Config/中没有时使用扫描生成的Config/Sweep/中的同名文件
+    Path of a Config: Config/<ques_name>_<ini_num>.csv, or the generated one in Config/Sweep/
+    when only that exists.
+    '''
+    file_name = f'{ques_name}_{ini_num}.csv'
+    if not os.path.isfile('./Config/' + file_name) and os.path.isfile(sweep_folder + file_name):
+        return sweep_folder + file_name
+    return './Config/' + file_name
@@ -0,0 +1,40 @@
+# coding = utf-8
+import os
+import numpy as np
+
+# Database 中CSV文件的进程级缓存，键为(绝对路径, 表头模式)，值为(修改时间, 数组)
+# Process-level cache of the Database CSV files, keyed by (absolute path, header mode) -> (mtime, array)
+_cache = {}
+
+
+def read_csv(file_path, header='infer'):
+    '''
+    读取CSV并返回numpy数组，同一文件在一次运行中只解析一次
+    Read a CSV into a numpy array, parsing each file only once per run.
+
+    文件修改时间变化后会自动重新读取；返回的是副本，调用方可以放心地原地修改
+    The file is re-read if its modification time changes; a copy is returned so callers may modify it in place.
+    '''
+    key = (os.path.abspath(file_path), header)
+    mtime = os.path.getmtime(file_path)
+
+    if key not in _cache or _cache[key][0] != mtime:
+        # pandas只在读取数据时才导入，减少启动时间
+        import pandas as pd
+        _cache[key] = (mtime, pd.read_csv(file_path, header=header).values)
+
+    return np.array(_cache[key][1], copy=True)
+
+
+def invalidate(file_path=None):
+    '''
+    清除缓存，file_path为None时清空全部
+    Drop the cached array of file_path, or every cached file if file_path is None.
+    '''
+    if file_path is None:
+        _cache.clear()
+        return
+
+    path = os.path.abspath(file_path)
+    for key in [key for key in _cache if key[0] == path]:
+        del _cache[key]
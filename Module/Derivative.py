@@ -0,0 +1,112 @@
+# coding = utf-8
+import torch
+
+
+def parse(name):
+    '''
+    将 'u_xy' 这样的名称拆分为输出通道和求导坐标，'u_xy' -> ('u', ('x', 'y'))
+    Split a derivative name such as 'u_xy' into its channel and coordinate sequence.
+    '''
+    channel, coord = name.rsplit('_', 1)
+    return channel, tuple(coord)
+
+
+def derivatives(output, coords: dict, request, names=('u',), create_graph: bool = True):
+    '''
+    按需计算一组偏导数，并尽量减少反向传播的次数
+    Compute the requested set of partial derivatives with as few autograd passes as possible.
+
+    output: 网络输出 [N, C]，第c列对应通道names[c]
+    coords: 坐标名称到坐标张量 [N, 1] 的映射，例如 {'x': self.x, 'y': self.y}
+    request: 需要的导数名称，例如 ['u_x', 'u_yy', 'p_y']
+
+    同一个量对所有需要的坐标的导数在一次autograd.grad中得到，例如u_x和u_y共用一次，
+    u_xx和u_xy也共用一次，因此每个通道的梯度只需一次反传，每个二阶方向再各一次。
+    All derivatives of the same quantity are taken in one autograd.grad call, so u_x and u_y share
+    a pass, as do u_xx and u_xy; nothing that is not requested (or a prefix of a request) is built.
+
+    create_graph=False 时只为中间量建图，得到的导数不能再对网络参数反传（例如只用于评估残差大小）
+    With create_graph=False only the intermediates keep a graph, e.g. for evaluating residual magnitudes.
+
+    返回导数名称到张量的字典，同时包含被请求导数的低阶中间量
+    Returns a dict name -> tensor that also holds the lower-order intermediates.
+    '''
+    names = list(names)
+    result = {}
+
+    # 每个需要继续求导的量，记录它需要对哪些坐标求导
+    # For every quantity that has to be differentiated further, the coordinates it is needed along
+    pending = {}
+    for name in request:
+        channel, coord = parse(name)
+        for order in range(len(coord)):
+            parent = (channel, coord[:order])
+            pending.setdefault(parent, [])
+            if coord[order] not in pending[parent]:
+                pending[parent].append(coord[order])
+
+    # 按阶数从低到高求导，保证父节点在子节点之前算好
+    for channel, coord in sorted(pending, key=lambda key: len(key[1])):
+        if len(coord) == 0:
+            target = output[:, names.index(channel):names.index(channel) + 1]
+        else:
+            target = result[f"{channel}_{''.join(coord)}"]
+
+        wrt = pending[(channel, coord)]
+
+        # 结果还要继续求导时必须保留计算图，create_graph只决定最高阶导数是否可以继续反传
+        further = any((channel, coord + (c,)) in pending for c in wrt)
+        grads = torch.autograd.grad(target, [coords[c] for c in wrt], grad_outputs=torch.ones_like(target),
+                                    retain_graph=True, create_graph=create_graph or further, allow_unused=True)
+
+        for c, grad in zip(wrt, grads):
+            # 与该坐标无关时导数为零
+            result[f"{channel}_{''.join(coord + (c,))}"] = torch.zeros_like(target) if grad is None else grad
+
+    return result
+
+
+def derivatives_forward(net, input, coord_names, request, names=('u',)):
+    '''
+    用嵌套的前向模式自动微分（jvp）计算同一组导数，不需要输入的计算图
+    Compute the same set of derivatives with nested forward-mode AD (jvp of jvp).
+
+    网络逐点作用于输入，所以沿坐标方向的切向量取全1列即可一次得到所有点、所有通道的导数，
+    每个求导方向序列（如 'xx'）只需一次嵌套前向。结果只需一次普通反传即可对参数求梯度，
+    因此可以交给torch.compile整体编译（torch.compile不支持二次反传）。
+    Because the network acts pointwise, a tangent of ones along a coordinate column yields that
+    derivative for every point and every channel at once, so each direction sequence (e.g. 'xx')
+    costs one nested forward. The result needs only a first-order backward for the parameter
+    gradients, which is what makes the residual compilable with torch.compile.
+
+    input: 拼接后的坐标 [N, D]，列的顺序与coord_names一致
+    '''
+    names = list(names)
+    result = {}
+
+    # 嵌套jvp会顺带给出少一阶的前缀方向的导数，这样的序列不必单独计算
+    sequences = set(parse(name)[1] for name in request)
+    sequences = [seq for seq in sequences if not any(len(other) == len(seq) + 1 and other[:len(seq)] == seq for other in sequences)]
+
+    for seq in sorted(sequences):
+        tangents = []
+        for c in seq:
+            tangent = torch.zeros_like(input)
+            tangent[:, coord_names.index(c)] = 1.
+            tangents.append(tangent)
+
+        # 逐层包裹，第k层函数返回沿前k个方向的导数
+        def nest(func, tangent):
+            return lambda p: torch.func.jvp(func, (p,), (tangent,))[1]
+
+        func = net
+        for tangent in tangents[:-1]:
+            func = nest(func, tangent)
+        primal, tangent_out = torch.func.jvp(func, (input,), (tangents[-1],))
+
+        for i, channel in enumerate(names):
+            if len(seq) > 1:
+                result[f"{channel}_{''.join(seq[:-1])}"] = primal[:, i:i + 1]
+            result[f"{channel}_{''.join(seq)}"] = tangent_out[:, i:i + 1]
+
+    return result
@@ -0,0 +1,34 @@
+# coding = utf-8
+import numpy as np
+
+
+def min_max(x, y, point_num: int = 4000):
+    '''
+    保形降采样：把曲线按下标均分为point_num/2段，每段只保留最小值和最大值两个点（按原顺序），以及首尾两点
+    Shape-preserving downsampling for line plots: the curve is split into point_num / 2 equal index
+    buckets and only the minimum and maximum of each bucket are kept, in their original order,
+    plus the first and last points.
+
+    每段的宽度小于一个像素时，折线在每个像素列上覆盖的纵向范围与原曲线相同，画出的图片一致；
+    最大最小值的位置与坐标轴是否取对数无关
+    With buckets narrower than a pixel, the polyline covers the same vertical span in every pixel
+    column as the full curve, so the rendered figure is the same. The positions of the extremes do
+    not depend on a log y axis.
+
+    返回 (x, y)，点数不超过point_num + 2
+    '''
+    x, y = np.asarray(x), np.asarray(y)
+    bucket_num = point_num // 2
+    if len(y) <= point_num or bucket_num == 0:
+        return x, y
+
+    # 前bucket_num * size个点整段reshape，剩下不足一段的点单独成段
+    size = len(y) // bucket_num
+    full = y[:bucket_num * size].reshape([bucket_num, size])
+    offset = np.arange(bucket_num) * size
+    index = [offset + np.argmin(full, axis=1), offset + np.argmax(full, axis=1)]
+    tail = y[bucket_num * size:]
+    if len(tail):
+        index += [[bucket_num * size + np.argmin(tail), bucket_num * size + np.argmax(tail)]]
+    index = np.unique(np.concatenate(index + [[0, len(y) - 1]]))
+    return x[index], y[index]
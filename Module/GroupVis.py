@@ -1,7 +1,7 @@
 import os
-import numpy as np
-import pandas as pd
 import matplotlib.pyplot as plt
+import Module.LossLog as LossLog
+import Module.Downsample as Downsample
 
 
 class Vis():
@@ -57,8 +57,9 @@ class Vis():
         # 几个模型的迭代步数不一定需要一样长，只需要loss的顺序相同就可以了
         self.loss_desti = self.file_desti + '/Loss/'
         self.module_name = module_name
-        self.group_loss.append([self.group_loss,pd.read_csv(self.loss_desti + self.ques_name + '_' + str(self.ini_num) + '_loss_' + self.module_name + '.csv').values])
-        self.loss_header = pd.read_csv(self.loss_desti + self.ques_name + '_'+str(self.ini_num)+'_loss_' + self.module_name + '.csv',  nrows=0).columns
+        loss, self.loss_header = LossLog.table(self.loss_desti + self.ques_name + '_' + str(self.ini_num) + '_loss_' + self.module_name + '.bin',
+                                               self.loss_desti + self.ques_name + '_' + str(self.ini_num) + '_loss_' + self.module_name + '.csv')
+        self.group_loss.append([self.group_loss, loss])
         self.loss_num =  len(self.loss_header)
         self.group_name.append(self.module_name)
         # print(self.group_name)
@@ -74,7 +75,8 @@ class Vis():
                 # print(self.group_name[i])
                 # print(self.label_name)
 
-                plt.plot(self.group_loss[i][1][:,0], self.group_loss[i][1][:,j+1], label=self.group_name[i], color = self.colors[self.label_name[self.group_name[i]]], alpha=0.8)
+                # 每条曲线降采样到几千个点，图片不变
+                plt.plot(*Downsample.min_max(self.group_loss[i][1][:,0], self.group_loss[i][1][:,j+1]), label=self.group_name[i], color = self.colors[self.label_name[self.group_name[i]]], alpha=0.8)
                 font = {'family': 'Times New Roman', 'weight': 'normal', 'size': 16}
 
 
@@ -92,8 +94,10 @@ class Vis():
     def para_read(self, module_name):
         self.para_desti = self.file_desti + '/Parameters/'
         self.module_name = module_name
-        self.group_para.append([self.group_para, pd.read_csv(self.para_desti + self.ques_name + '_' + str(self.ini_num) + '_paras_' + self.module_name + '.csv').values])
-        self.para_header = pd.read_csv(self.para_desti + self.ques_name + '_'+str(self.ini_num)+'_paras_' + self.module_name + '.csv',  nrows=0).columns
+        # 待定参数与损失记录在同一个日志中
+        para, self.para_header = LossLog.table(self.file_desti + '/Loss/' + self.ques_name + '_' + str(self.ini_num) + '_loss_' + self.module_name + '.bin',
+                                               self.para_desti + self.ques_name + '_' + str(self.ini_num) + '_paras_' + self.module_name + '.csv', parameters=True)
+        self.group_para.append([self.group_para, para])
         self.para_num =  len(self.para_header)
         # 如果要读取参数，那么一定一起读取了损失函数，所以这里不用重复append，所以一定要先读取损失函数哟
         # self.group_name.append(self.module_name)
@@ -103,7 +107,7 @@ class Vis():
         for j in range (len(self.para_header)-1):
             plt.figure(figsize=(4.4,4)) #调整图像大小
             for i in range (self.module_num):
-                plt.plot(self.group_para[i][1][:,0], self.group_para[i][1][:,j+1], label=self.group_name[i], color = self.colors[self.label_name[self.group_name[i]]])
+                plt.plot(*Downsample.min_max(self.group_para[i][1][:,0], self.group_para[i][1][:,j+1]), label=self.group_name[i], color = self.colors[self.label_name[self.group_name[i]]])
                 # plt.yscale('log')
                 font = {'family': 'Times New Roman', 'weight': 'normal', 'size': 16}
                 plt.grid()
@@ -0,0 +1,48 @@
+# coding = utf-8
+import os
+import sys
+import json
+import subprocess
+
+# 导入Module.Training时不应加载的重型依赖，它们只在画图、导出CSV或读取数据时才导入
+# Heavy dependencies that importing Module.Training must not load; they are imported when plotting,
+# exporting CSVs or reading data.
+deferred = ('pandas', 'matplotlib', 'scipy')
+
+# 仓库根目录，子进程在这里导入，与调用者的工作目录无关
+# Repository root; the subprocesses import from here whatever the caller's working directory.
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def measure(module, repeat: int = 3):
+    '''
+    在新的解释器中导入module，返回(torch之外的导入时间(秒), 已加载的deferred模块)，取repeat次中的最短时间
+    Import module in fresh interpreters and return (import time beyond torch in seconds, deferred
+    modules that got loaded), best of repeat runs. Subtracting torch keeps the budget independent
+    of how fast the machine loads torch itself.
+    '''
+    script = (f'import sys, time, json; start = time.perf_counter(); import torch; middle = time.perf_counter(); '
+              f'import {module}; end = time.perf_counter(); '
+              f'print(json.dumps([end - middle, [name for name in {deferred!r} if name in sys.modules]]))')
+    results = [json.loads(subprocess.run([sys.executable, '-c', script], capture_output=True, text=True, check=True, cwd=root).stdout.splitlines()[-1])
+               for _ in range(repeat)]
+    return min(result[0] for result in results), results[0][1]
+
+
+def check(budget: float = 0.15, module: str = 'Module.Training'):
+    '''
+    导入时间超过budget秒或加载了deferred中的模块时报错
+    Raise if importing module takes longer than budget seconds beyond torch, or loads a deferred module.
+    '''
+    elapsed, loaded = measure(module)
+    print(f'{module}: {elapsed * 1000:.0f} ms beyond torch (budget {budget * 1000:.0f} ms), deferred modules loaded: {loaded}')
+    if loaded:
+        raise AssertionError(f'{module} imports {loaded} at import time.')
+    if elapsed > budget:
+        raise AssertionError(f'{module} takes {elapsed:.3f} s to import, over the {budget:.3f} s budget.')
+    return elapsed
+
+
+if __name__ == '__main__':
+    # 用法 / usage: python -m Module.ImportBudget [budget_seconds]
+    check(float(sys.argv[1]) if len(sys.argv) > 1 else 0.15)
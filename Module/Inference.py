@@ -0,0 +1,240 @@
+# coding = utf-8
+import sys
+import json
+import time
+import numpy as np
+
+# 本模块的推理部分只依赖numpy，导出和核对时才导入torch
+# Inference only needs numpy; torch is imported by the export and verification helpers alone.
+
+
+def dense_layers(net):
+    '''
+    把训练好的网络展开为逐层的 (权重, 偏置) 列表，层间激活函数为tanh
+    Unroll a trained net into per-layer (weight, bias) numpy arrays with tanh in between.
+
+    PINN / PINN_post_*: layers中的nn.Linear；PsiNN_*: PsiStructure编译出的整层分块矩阵（权重共享已展开）；
+    StructureExtract.TiedNet: 聚类中心与符号模式组合出的矩阵
+    PINN / PINN_post_*: the nn.Linear modules in layers; PsiNN_*: the block matrices assembled by
+    PsiStructure, so the weight sharing is folded in; StructureExtract.TiedNet: centres times sign patterns.
+    '''
+    import torch
+
+    layers = []
+    with torch.no_grad():
+        if hasattr(net, 'program'):
+            for k, pattern in enumerate(net.program.structure):
+                layers.append(net.program.layer(pattern, net.program.in_widths[k]))
+        elif hasattr(net, 'layers'):
+            layers = [(layer.weight, layer.bias) for layer in net.layers if isinstance(layer, torch.nn.Linear)]
+        elif hasattr(net, 'depth') and hasattr(net, 'layer'):
+            for k in range(net.depth):
+                weight, bias = net.layer(k, 'weight'), net.layer(k, 'bias')
+                layers.append((weight, bias if bias is not None else weight.new_zeros(weight.shape[0])))
+        else:
+            raise TypeError(f'{type(net).__module__}: unsupported network, expected PINN, PINN_post_*, PsiNN_* or a TiedNet.')
+        return [(weight.detach().cpu().numpy(), bias.detach().cpu().numpy()) for weight, bias in layers]
+
+
+def export(net, file_path):
+    '''
+    将网络导出为npz权重文件：各层权重偏置，以及对称性包装（PINN_post_*的symmetry）
+    Export a net to an .npz weights file: the dense layers plus the symmetry wrapper.
+
+    每个对称项为 (输入映射矩阵 [模型输入, 输入], 输出符号 [输出])，网络输出 = sum(输出符号 * MLP(输入映射 @ x))
+    Each symmetry term is an input map [model inputs, inputs] and an output sign [outputs];
+    the net computes sum over terms of sign * MLP(map @ x).
+    '''
+    layers = dense_layers(net)
+    model_in, output_num = layers[0][0].shape[1], layers[-1][0].shape[0]
+
+    symmetry = getattr(net, 'symmetry', None)
+    if symmetry is None:
+        input_num = model_in
+        maps = [np.eye(model_in)]
+        signs = [np.ones(output_num)]
+    else:
+        input_num = max(column for columns, _ in symmetry for column, _ in columns) + 1
+        maps, signs = [], []
+        for columns, sign in symmetry:
+            input_map = np.zeros([model_in, input_num])
+            for i, (column, column_sign) in enumerate(columns):
+                input_map[i, column] = column_sign
+            maps.append(input_map)
+            signs.append(np.broadcast_to(np.asarray(sign, dtype=float), [output_num]))
+
+    arrays = {f'weight_{k}': weight for k, (weight, _) in enumerate(layers)}
+    arrays.update({f'bias_{k}': bias for k, (_, bias) in enumerate(layers)})
+    header = {'module': type(net).__module__.split('.')[-1], 'depth': len(layers), 'input_num': input_num, 'output_num': output_num}
+    np.savez(file_path, header=np.array(json.dumps(header)), input_map=np.stack(maps).astype(np.float32),
+             output_sign=np.stack(signs).astype(np.float32), **arrays)
+    return file_path
+
+
+class Engine():
+    '''
+    纯numpy的分块向量化推理，可选输出一阶、二阶导数
+    Pure-numpy chunked, vectorised inference with optional first and second derivatives.
+
+    engine = Inference.Engine('model.npz', dtype=np.float32)
+    u = engine(xy)                    # [N, output_num]
+    u, du = engine(xy, order=1)       # du[n, k, i] = d u_k / d x_i
+    u, du, d2u = engine(xy, order=2)  # d2u[n, k, i, j] = d2 u_k / d x_i d x_j
+
+    对称项的输入映射并入第一层权重，各项堆叠在同一次矩阵乘法中计算
+    The input maps of the symmetry terms are folded into the first-layer weight, so all terms run
+    stacked through the same matmuls.
+    '''
+    def __init__(self, file_path, dtype=np.float32, chunk_num: int = 4096):
+        with np.load(file_path) as data:
+            self.header = json.loads(str(data['header']))
+            self.dtype = np.dtype(dtype)
+            self.chunk_num = chunk_num
+            depth = self.header['depth']
+            self.weights = [data[f'weight_{k}'].astype(self.dtype) for k in range(depth)]
+            self.biases = [data[f'bias_{k}'].astype(self.dtype) for k in range(depth)]
+            input_map = data['input_map'].astype(self.dtype)
+            self.output_sign = data['output_sign'].astype(self.dtype)
+
+        # 第一层: [项数 * 隐藏, 输入]，各项的隐藏层在一次矩阵乘法中得到
+        first = np.einsum('hm,tmd->thd', self.weights[0], input_map)
+        self.term_num = first.shape[0]
+        self.first = first.reshape([-1, first.shape[2]])
+        self.first_grad = first.transpose(0, 2, 1)
+        self.input_num = self.header['input_num']
+        self.output_num = self.header['output_num']
+
+    def chunk(self, x, order):
+        # 各项展开为 [点数 * 项数, 隐藏] 的二维矩阵，后续各层权重相同；导数的隐藏维放在最后 [点数 * 项数, d, 隐藏]
+        point_num, input_num = x.shape
+        z = (x @ self.first.T).reshape([point_num * self.term_num, -1])
+        z += self.biases[0]
+        dz = np.broadcast_to(self.first_grad[None], (point_num,) + self.first_grad.shape).reshape([point_num * self.term_num, input_num, -1]) if order > 0 else None
+        d2z = None
+
+        for k in range(1, len(self.weights)):
+            h = np.tanh(z, out=z)
+            if order > 0:
+                g1 = 1 - h * h
+                dh = g1[:, None, :] * dz
+                if order > 1:
+                    g2 = -2 * h * g1
+                    d2h = g2[:, None, None, :] * dz[:, :, None, :] * dz[:, None, :, :]
+                    if d2z is not None:
+                        d2h += g1[:, None, None, :] * d2z
+                    d2z = d2h @ self.weights[k].T
+                dz = dh @ self.weights[k].T
+            z = h @ self.weights[k].T
+            z += self.biases[k]
+
+        # 按输出符号合并各对称项
+        sign = self.output_sign
+        outputs = [np.einsum('nto,to->no', z.reshape([point_num, self.term_num, -1]), sign)]
+        if order > 0:
+            outputs.append(np.einsum('ntdo,to->nod', dz.reshape([point_num, self.term_num, input_num, -1]), sign))
+        if order > 1:
+            outputs.append(np.einsum('ntijo,to->noij', d2z.reshape([point_num, self.term_num, input_num, input_num, -1]), sign) if d2z is not None
+                           else np.zeros([point_num, self.output_num, input_num, input_num], dtype=self.dtype))
+        return outputs
+
+    def __call__(self, input, order: int = 0):
+        input = np.asarray(input, dtype=self.dtype)[:, :self.input_num]
+        point_num, input_num = input.shape
+        outputs = [np.empty([point_num, self.output_num], dtype=self.dtype)]
+        if order > 0:
+            outputs.append(np.empty([point_num, self.output_num, input_num], dtype=self.dtype))
+        if order > 1:
+            outputs.append(np.empty([point_num, self.output_num, input_num, input_num], dtype=self.dtype))
+
+        for start in range(0, point_num, self.chunk_num):
+            for output, result in zip(outputs, self.chunk(input[start:start + self.chunk_num], order)):
+                output[start:start + self.chunk_num] = result
+        return outputs[0] if order == 0 else tuple(outputs)
+
+
+def verify(net, engine, input, order: int = 0, atol: float = 1e-4):
+    '''
+    核对numpy推理与torch网络（及其autograd导数）一致，返回各阶的最大误差
+    Check the engine against the torch net (and its autograd derivatives); returns the max abs error per order.
+    '''
+    import torch
+
+    parameter = next(net.parameters())
+    x = torch.tensor(np.asarray(input)[:, :engine.input_num], dtype=parameter.dtype, device=parameter.device, requires_grad=True)
+    u = net(x)
+    references = [u.detach()]
+    if order > 0:
+        du = torch.stack([torch.autograd.grad(u[:, k].sum(), x, retain_graph=True, create_graph=order > 1)[0] for k in range(u.shape[1])], dim=1)
+        references.append(du.detach())
+    if order > 1:
+        d2u = torch.stack([torch.stack([torch.autograd.grad(du[:, k, i].sum(), x, retain_graph=True)[0] for i in range(x.shape[1])], dim=1)
+                           for k in range(u.shape[1])], dim=1)
+        references.append(d2u.detach())
+
+    outputs = engine(input, order)
+    outputs = [outputs] if order == 0 else outputs
+    errors = [float(np.abs(output - reference.cpu().numpy()).max()) for output, reference in zip(outputs, references)]
+    if max(errors) > atol:
+        raise AssertionError(f'{engine.header["module"]}: numpy inference differs from torch by {errors}.')
+    return errors
+
+
+def benchmark(net, engine, input, repeat: int = 5):
+    '''
+    比较torch与numpy的前向推理耗时（取repeat次中的最短时间），返回每秒点数
+    Time the torch forward against the numpy engine (best of repeat) and return points per second.
+    '''
+    import torch
+
+    parameter = next(net.parameters())
+    x = torch.tensor(np.asarray(input)[:, :engine.input_num], dtype=parameter.dtype, device=parameter.device)
+    times = {'torch': [], 'numpy': []}
+    for _ in range(repeat):
+        start = time.perf_counter()
+        with torch.no_grad():
+            net(x).cpu()
+        times['torch'].append(time.perf_counter() - start)
+        start = time.perf_counter()
+        engine(input)
+        times['numpy'].append(time.perf_counter() - start)
+    return {name: len(input) / min(value) for name, value in times.items()}
+
+
+def export_saved(ques_name, ini_num, model_name, mode: str = 'teacher'):
+    '''
+    导出Results/<ques_name>_<ini_num>/Models中训练好的模型为同名的npz，返回(npz路径, torch网络, Training.model)
+    Export a trained model from Results/<ques_name>_<ini_num>/Models to an .npz of the same name;
+    returns (npz path, torch net, Training.model).
+    '''
+    import torch
+    import Module.Training as Training
+    import Module.PINN as PINN
+
+    task = Training.model(ques_name, ini_num)
+    suffix_mode = '_student' if mode == 'student' else ''
+    net = PINN.Net(task.layer_student) if mode == 'student' else task.net_build(model_name).cpu()
+    load_path = f'./Results/{ques_name}_{ini_num}/Models/{ques_name}_{ini_num}_{model_name}{suffix_mode}'
+    net.load_state_dict(torch.load(load_path + '.pth', map_location='cpu'))
+    return export(net, load_path + '.npz'), net, task
+
+
+def run(ques_name, ini_num, model_name, mode: str = 'teacher', point_num: int = 1000000):
+    '''
+    导出训练好的模型，核对并测速
+    Export a trained model, then verify and benchmark it.
+    '''
+    file_path, net, task = export_saved(ques_name, ini_num, model_name, mode)
+
+    engine = Engine(file_path)
+    rng = np.random.default_rng(0)
+    input = rng.uniform([task.x_min, task.y_min], [task.x_max, task.y_max], size=[point_num, 2]).astype(np.float32)
+    errors = verify(net, Engine(file_path, dtype=np.float64), input[:1000], order=2)
+    speed = benchmark(net, engine, input)
+    print(f'Exported {file_path}; max error (value, first, second derivatives): {errors}; '
+          f'points/s torch {speed["torch"]:.3e}, numpy {speed["numpy"]:.3e}')
+    return file_path, errors, speed
+
+
+if __name__ == '__main__':
+    # 用法 / usage: python -m Module.Inference Burgers_inv EXP PsiNN_burgers [teacher|student]
+    run(sys.argv[1], sys.argv[2], sys.argv[3], sys.argv[4] if len(sys.argv) > 4 else 'teacher')
@@ -0,0 +1,85 @@
+# coding = utf-8
+import numpy as np
+import torch
+import Module.LossLog as LossLog
+
+
+class LossBuffer():
+    '''
+    在device上预分配的损失记录缓冲区，每步只做device上的写入，到记录间隔时才一次性同步到主机
+    Preallocated on-device buffer for the per-step scalars. Each step writes one row on the
+    device without synchronising; rows are copied to the host in one transfer on flush().
+
+    主机端按块保存为float32的numpy数组，第一列为iter
+    On the host the history is kept as float32 numpy chunks; array() prepends the iter column.
+
+    给出log（LossLog）时，每次同步的行只追加写入日志文件，主机内存中只保留最后一行，array()从日志读取
+    If a LossLog is given, every flushed block is appended to it instead of being kept in memory;
+    only the last row stays on the host and array() reads the history back from the log.
+    '''
+    def __init__(self, columns, capacity: int = 1000, device=None, iter_start: int = 0, log=None):
+        self.columns = list(columns)
+        self.capacity = capacity
+        self.buffer = torch.zeros(capacity, len(self.columns), device=device)
+        self.position = 0
+        self.iter_start = iter_start
+        self.chunks = []
+        self.last_row = None
+        self.row_num = 0
+        self.log = log
+
+    @property
+    def header(self):
+        return ['iter'] + self.columns
+
+    def write(self, values):
+        '''
+        写入一行，values为长度等于列数的一维张量，满了之后先同步
+        Write one row (a 1-D tensor with one entry per column); flushes first when full.
+        '''
+        if self.position == self.capacity:
+            self.flush()
+        self.buffer[self.position] = values
+        self.position += 1
+
+    def flush(self):
+        '''
+        将缓冲区中尚未同步的行复制到主机
+        Copy the pending rows to the host.
+        '''
+        if self.position == 0:
+            return
+        block = self.buffer[:self.position].detach().cpu().numpy().copy()
+        self.last_row = block[-1]
+        if self.log is not None:
+            iters = np.arange(self.iter_start + self.row_num + 1, self.iter_start + self.row_num + self.position + 1).reshape([-1, 1])
+            self.log.write(np.hstack([iters, block.astype(np.float64)]))
+        else:
+            self.chunks.append(block)
+        self.row_num += self.position
+        self.position = 0
+
+    def last(self):
+        '''
+        最近一次同步的最后一行（不含iter）
+        The last flushed row, without the iter column.
+        '''
+        return self.last_row
+
+    def __len__(self):
+        return self.row_num + self.position
+
+    def array(self):
+        '''
+        全部记录的列式数组 [n, 1 + 列数]，第一列为iter，转换为float64；有日志时为日志中的全部记录（续算时包括之前的运行）
+        The full columnar history as a float64 [n, 1 + columns] array with iter first. With a log
+        this is everything in the log, including earlier runs when resuming.
+        '''
+        self.flush()
+        if self.log is not None:
+            return np.array(LossLog.load(self.log.path)[0])
+        values = np.concatenate(self.chunks, axis=0) if self.chunks else np.zeros([0, len(self.columns)], dtype=np.float32)
+        # 合并成一块，后续调用不再重复拼接
+        self.chunks = [values] if len(values) else []
+        iters = np.arange(self.iter_start + 1, self.iter_start + len(values) + 1).reshape([-1, 1])
+        return np.hstack([iters, values.astype(np.float64)])
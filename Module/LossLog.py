@@ -0,0 +1,93 @@
+# coding = utf-8
+import os
+import json
+import numpy as np
+
+
+class LossLog():
+    '''
+    只追加的列式二进制日志，每次只写入新的行
+    Append-only columnar log: rows of float64 are appended to a raw binary file, the column names
+    live in a small JSON file next to it. Checkpoints only write the rows recorded since the last
+    one, and readers get the whole history with a single memory-mapped read (see load()).
+
+    append=True 时若已有相同表头的日志则接着写（续算），否则重新开始
+    With append=True an existing log with the same header is continued (restart from a checkpoint).
+    '''
+    def __init__(self, path, header, append: bool = False):
+        self.path = path
+        self.header = list(header)
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        if not (append and os.path.isfile(path) and read_header(path) == self.header):
+            open(path, 'wb').close()
+            with open(header_path(path), 'w') as file:
+                json.dump({'columns': self.header, 'dtype': '<f8'}, file)
+        self.row_num = os.path.getsize(path) // (8 * len(self.header))
+
+    def write(self, rows):
+        '''
+        追加若干行 [n, 列数]
+        Append rows of shape [n, columns].
+        '''
+        rows = np.ascontiguousarray(rows, dtype='<f8')
+        with open(self.path, 'ab') as file:
+            file.write(rows.tobytes())
+        self.row_num += len(rows)
+
+    def truncate(self, row_num):
+        '''
+        只保留前row_num行，从检查点续算时去掉检查点之后写入的记录
+        Keep only the first row_num rows, dropping what was written after the checkpoint being resumed.
+        '''
+        os.truncate(self.path, row_num * 8 * len(self.header))
+        self.row_num = row_num
+
+
+def header_path(path):
+    return os.path.splitext(path)[0] + '.json'
+
+
+def read_header(path):
+    with open(header_path(path)) as file:
+        return json.load(file)['columns']
+
+
+def load(path, columns=None, drop_zero: bool = False):
+    '''
+    一次内存映射读取整个日志，返回(数组, 表头)
+    Memory-map the whole log and return (values, header).
+
+    columns: 只取其中的若干列
+    drop_zero: 去掉全为零的列（例如正问题中的loss_d），与导出的CSV一致
+    '''
+    header = read_header(path)
+    if os.path.getsize(path) == 0:
+        values = np.zeros([0, len(header)])
+    else:
+        values = np.memmap(path, dtype='<f8', mode='r').reshape([-1, len(header)])
+
+    if columns is not None:
+        values = values[:, [header.index(column) for column in columns]]
+        header = list(columns)
+    if drop_zero:
+        keep = (values != 0).any(axis=0)
+        values = values[:, keep]
+        header = [column for column, k in zip(header, keep) if k]
+    return values, header
+
+
+def table(log_path, csv_path, parameters: bool = False):
+    '''
+    画图用的损失表（parameters=True时为待定参数表），返回(数组, 表头)
+    Table for the Vis modules: the loss columns, or the parameters_* columns if parameters=True.
+
+    有日志时一次内存映射读取，否则读取训练结束时导出的CSV
+    Read from the log with a single memory-mapped read if it exists, else from the exported CSV.
+    '''
+    if os.path.isfile(log_path) and os.path.isfile(header_path(log_path)):
+        columns = ['iter'] + [column for column in read_header(log_path)[1:] if column.startswith('parameters_') == parameters]
+        return load(log_path, columns, drop_zero=not parameters)
+    import pandas as pd
+    df = pd.read_csv(csv_path)
+    return df.values, df.columns
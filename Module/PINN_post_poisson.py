@@ -32,6 +32,9 @@ class Net(torch.nn.Module):
 
         # deploy layers
         self.layers = torch.nn.Sequential(layerDict)
+        # 对称性的声明式描述，与forward等价：输出 = sum(输出符号 * layers(输入列按(列, 符号)重排))，供Inference导出使用
+        # Declarative form of forward: sum over terms of output sign * layers(input columns picked as (column, sign)).
+        self.symmetry = [([(0, 1), (1, 1)], 1), ([(1, 1), (0, 1)], 1)]
         self.iter = 0
         self.iter_list = []
         self.loss_list = []
@@ -0,0 +1,260 @@
+# coding = utf-8
+import torch
+
+# 问题定义注册表，名称 -> 问题定义类。ques_name中包含该名称即使用对应的定义，例如 'Burgers_inv_distill' -> Burgers
+# Registry of problem definitions. A ques_name containing the registered name resolves to that definition.
+registry = {}
+
+
+def register(name):
+    '''
+    注册新的方程，新增算例时只需要在这里写一个Problem子类
+    Register a new equation; adding a case only needs a Problem subclass decorated with this.
+    '''
+    def wrapper(cls):
+        cls.name = name
+        registry[name] = cls
+        return cls
+    return wrapper
+
+
+def resolve(ques_name):
+    '''
+    在模型构造时调用一次，根据问题名称返回问题定义的实例
+    Resolve a ques_name into a problem definition instance, once per model.
+    '''
+    for name, cls in registry.items():
+        if name in ques_name:
+            return cls(ques_name)
+    raise ValueError('The input ' + ques_name + ' is unintegrated or the question name is incorrect. Please check again.')
+
+
+class Problem():
+    '''
+    问题定义的基类，打包方程残差、边界采样、参考解和默认超参数
+    Base problem definition bundling the residual, boundary sampler, reference solution and default hyperparameters.
+    '''
+    name = ''
+
+    # 网络输出的通道名称
+    channels = ('u',)
+
+    # 残差需要的导数，交给Derivative.derivatives
+    derivatives = ()
+
+    # Config中没有给出时使用的超参数
+    defaults = {}
+
+    # 逆问题的监督损失：'monitor' 使用net_d读取观测数据，'global' 使用net_global的全场参考解
+    data_loss = 'monitor'
+
+    # 画图时是否直接使用配点，非规则区域（如流动）使用
+    figure_on_collocation = False
+
+    def __init__(self, ques_name):
+        self.ques_name = ques_name
+        self.inverse = 'inv' in ques_name
+
+        # 边界点在第一次使用时生成并缓存
+        self.edge_points = None
+
+    # 计算场的配点，默认为规则网格，node_num为单边节点数
+    def collocation(self, model, device, node_num=None):
+        node_num = model.grid_node_num if node_num is None else node_num
+        x = torch.linspace(model.x_min, model.x_max, node_num, requires_grad=True).float().to(device)
+        y = torch.linspace(model.y_min, model.y_max, node_num, requires_grad=True).float().to(device)
+        x, y = torch.meshgrid(x, y, indexing='ij')
+        return x.reshape([-1, 1]), y.reshape([-1, 1])
+
+    # 各方程的逐点残差 [N, 1]
+    def equations(self, model, x, y, u, d):
+        raise NotImplementedError
+
+    # 方程残差损失，各方程均方误差之和
+    def residual(self, model, x, y, u, d):
+        return sum([torch.mean((eq)**2) for eq in self.equations(model, x, y, u, d)])
+
+    # 逐点的残差平方和，用于自适应采样
+    def residual_point(self, model, x, y, u, d):
+        return sum([(eq)**2 for eq in self.equations(model, x, y, u, d)])
+
+    # 边界损失，返回(参与训练的损失, 记录的损失, 各分项)
+    def boundary(self, model, device):
+        raise NotImplementedError
+
+    # 控制方程的第i个可变参数，参数化模式下为逐行的参数列 [N, 1]，否则为Config中给出的第一个取值
+    def para_ctrl(self, model, i):
+        if model.para_ctrl_batch is not None:
+            return model.para_ctrl_batch[:, i:i + 1]
+        return model.para_ctrl_list[i][0]
+
+    # 全场参考解，没有解析解时返回None，由Database中的数据代替
+    def reference(self, x, y):
+        return None
+
+    # 矩形区域四条边上的点，依次为 x最小, y最小, y最大, x最大
+    def edges(self, model, device, node_num, y_down=None):
+        if self.edge_points is None:
+            y_b = torch.linspace(model.y_min, model.y_max, node_num).float().to(device).reshape([-1, 1])
+            x_b = torch.full_like(y_b, model.x_min)
+
+            x_down = torch.linspace(model.x_min, model.x_max, node_num).float().to(device).reshape([-1, 1])
+            y_down = torch.full_like(x_down, model.y_min if y_down is None else y_down)
+
+            x_up = torch.linspace(model.x_min, model.x_max, node_num).float().to(device).reshape([-1, 1])
+            y_up = torch.full_like(x_up, model.y_max)
+
+            y_f = torch.linspace(model.y_min, model.y_max, node_num).float().to(device).reshape([-1, 1])
+            x_f = torch.full_like(y_f, model.x_max)
+
+            self.edge_points = [torch.cat([x_b, y_b], dim=1), torch.cat([x_down, y_down], dim=1),
+                                torch.cat([x_up, y_up], dim=1), torch.cat([x_f, y_f], dim=1)]
+        return self.edge_points
+
+
+@register('Flow')
+class Flow(Problem):
+    channels = ('p', 'u', 'v')
+    derivatives = ('u_xx', 'u_yy', 'v_xx', 'v_yy', 'p_x', 'p_y')
+    defaults = {'flow_p_add': 1, 'cylinder_weight': 1, 'bcs_weight': 1}
+    figure_on_collocation = True
+
+    rho = 1.0
+    mu = 0.02
+
+    # 流动问题的计算点就是fluid_data中的点
+    def collocation(self, model, device, node_num=None):
+        return model.data_load('fluid')
+
+    def equations(self, model, x, y, out, d):
+        p, u, v = torch.split(out, 1, dim=1)
+
+        # 连续性方程
+        eq0 = d['u_x'] + d['v_y']
+
+        # x方向动量方程
+        eq1 = self.rho * (u * d['u_x'] + v * d['u_y']) + d['p_x'] - self.mu * (d['u_xx'] + d['u_yy'])
+
+        # y方向动量方程
+        eq2 = self.rho * (u * d['v_x'] + v * d['v_y']) + d['p_y'] - self.mu * (d['v_xx'] + d['v_yy'])
+
+        return [eq0, eq1, eq2]
+
+    def boundary(self, model, device):
+        '''
+        根据边界数据进行计算，约束如下
+        1, 入口速度u 有固定值 v = 0 直接减
+        2， 上下边界，以及壁面速度u=v = 0
+        3， 出口压力p = 0
+        '''
+        boundary = model.data_load('flow_boundary')
+
+        # 所有边界点一次前向
+        out_in, out_cylinder, out_wall, out_out = torch.split(model.net_point(boundary['xy_all']), boundary['sections'], dim=0)
+
+        # 入口速度u有固定值，v=0
+        loss_b_in = ((out_in[:, 1:3] - boundary['uv_in'])**2).mean()
+
+        # 圆柱面速度为0
+        loss_b_cylinder_uv = ((out_cylinder[:, 1:3])**2).mean()
+
+        # 加入壁面压力损失项，圆柱面压力固定
+        if model.flow_p_add:
+            loss_b_cylinder_p = ((out_cylinder[:, 0] - boundary['p_cylinder'])**2).mean()
+        else:
+            loss_b_cylinder_p = torch.tensor(0.).to(device)
+
+        # 上下边界速度为0
+        loss_b_wall = ((out_wall[:, 1:3])**2).mean()
+
+        # 出口压力为0
+        loss_b_out = ((out_out[:, 0])**2).mean()
+
+        # 圆柱面系数已在Config文件中定义
+        loss_b = loss_b_in + model.cylinder_weight * (loss_b_cylinder_uv + loss_b_cylinder_p) + loss_b_wall + loss_b_out
+        loss_b_log = loss_b_in + loss_b_cylinder_uv + loss_b_cylinder_p + loss_b_wall + loss_b_out
+        parts = {'loss_b_in': loss_b_in, 'loss_b_cylinder_uv': loss_b_cylinder_uv, 'loss_b_cylinder_p': loss_b_cylinder_p,
+                 'loss_b_wall': loss_b_wall, 'loss_b_out': loss_b_out}
+        return loss_b, loss_b_log, parts
+
+
+@register('Burgers')
+class Burgers(Problem):
+    derivatives = ('u_xx', 'u_yy')
+
+    def __init__(self, ques_name):
+        super().__init__(ques_name)
+        # 只算一半，边界条件ydown就是-1
+        self.half = 'half' in ques_name
+
+    def equations(self, model, x, y, u, d):
+        if self.inverse:
+            return [d['u_x'] + u*d['u_y'] - model.para_undetermin[0] * d['u_yy']]
+        return [d['u_x'] + u*d['u_y'] - self.para_ctrl(model, 0) / torch.pi * d['u_yy']]
+
+    def boundary(self, model, device):
+        xy_b, xy_down, xy_up, _ = self.edges(model, device, model.bun_node_num, y_down=-1. if self.half else None)
+        u_b, u_down, u_up = torch.split(model.net_point(torch.cat([xy_b, xy_down, xy_up], dim=0)), [len(xy_b), len(xy_down), len(xy_up)], dim=0)
+
+        loss_b = torch.mean((u_b + torch.sin(torch.pi * xy_b[:, 1:2]))**2)
+        loss_b = loss_b + torch.mean((u_down)**2)
+        loss_b = loss_b + torch.mean((u_up)**2)
+        return loss_b, loss_b, {}
+
+
+@register('Laplace')
+class Laplace(Problem):
+    derivatives = ('u_xx', 'u_yy')
+
+    def equations(self, model, x, y, u, d):
+        if self.inverse:
+            return [d['u_xx'] + model.para_undetermin[0] * d['u_yy']]
+        return [d['u_xx'] + d['u_yy']]
+
+    def boundary(self, model, device):
+        edges = self.edges(model, device, model.bun_node_num)
+        xy_total = torch.cat(edges, dim=0)
+        u_total = torch.split(model.net_point(xy_total), [len(edge) for edge in edges], dim=0)
+
+        loss_b = 0
+        for xy, u in zip(edges, u_total):
+            loss_b = loss_b + torch.mean((u - self.reference(xy[:, 0:1], xy[:, 1:2]))**2)
+        return loss_b, loss_b, {}
+
+    def reference(self, x, y):
+        return x**3 - 3*x*y**2
+
+
+@register('Poisson')
+class Poisson(Problem):
+    derivatives = ('u_xx', 'u_yy')
+    defaults = {'learning_rate': '1e-3'}
+    data_loss = 'global'
+
+    # 边界上固定使用1000个点
+    bun_node_num = 1000
+
+    def __init__(self, ques_name):
+        super().__init__(ques_name)
+        # lf 是low frequency的意思
+        self.lf = 'lf' in ques_name
+
+    def source(self, x, y):
+        k = torch.arange(1, 5).to(x.device)
+        return sum([1/2*((-1)**(k+1))*(k**2) * (torch.sin(k * torch.pi * (x)) * torch.sin(k * torch.pi * (y))) for k in k])
+
+    def equations(self, model, x, y, u, d):
+        f = self.source(x, y)
+        if self.inverse:
+            return [d['u_xx'] + model.para_undetermin[0] * d['u_yy'] - f]
+        return [d['u_xx'] + d['u_yy'] - f]
+
+    def boundary(self, model, device):
+        xy_total = torch.cat(self.edges(model, device, self.bun_node_num), dim=0)
+        loss_b = torch.mean((model.net_point(xy_total))**2)
+        return loss_b, loss_b, {}
+
+    def reference(self, x, y):
+        if self.lf:
+            return torch.sin(torch.pi * (x)) * torch.sin(torch.pi * (y)) + torch.sin(2*torch.pi * (x)) * torch.sin(2*torch.pi * (y))
+        return 0.5 / (2*torch.pi**2) * ((torch.sin(torch.pi * (x)) * torch.sin(torch.pi * (y))) - (2 * torch.sin(2 * torch.pi * (x)) * torch.sin(2 * torch.pi * (y))) + (3 * torch.sin(3 * torch.pi * (x)) * torch.sin(3 * torch.pi * (y))) - (4 * torch.sin(4 * torch.pi * (x)) * torch.sin(4 * torch.pi * (y))))
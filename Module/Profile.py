@@ -0,0 +1,172 @@
+# coding = utf-8
+import os
+import csv
+import time
+import contextlib
+import torch
+
+# 关闭时phase()返回的空上下文，不计时也不分配对象
+# Context returned by phase() when profiling is off; it neither times nor allocates.
+null = contextlib.nullcontext()
+
+
+class Phase():
+    # 一次计时，在torch.profiler窗口内同时作为trace中的命名区间
+    def __init__(self, profiler, name, exclusive: bool = False):
+        self.profiler = profiler
+        self.name = name
+        self.exclusive = exclusive
+        self.excluded = 0.
+        self.record = None
+
+    def __enter__(self):
+        if self.profiler.trace is not None:
+            self.record = torch.profiler.record_function(self.name)
+            self.record.__enter__()
+        self.profiler.active.append(self)
+        self.start = self.profiler.clock()
+        return self
+
+    def __exit__(self, *args):
+        elapsed = self.profiler.clock() - self.start
+        self.profiler.active.pop()
+        if self.record is not None:
+            self.record.__exit__(*args)
+        # exclusive的阶段从外层阶段中扣除
+        if self.exclusive:
+            for phase in self.profiler.active:
+                phase.excluded += elapsed
+        total, calls = self.profiler.phases.get(self.name, (0., 0))
+        self.profiler.phases[self.name] = (total + elapsed - self.excluded, calls + 1)
+        return False
+
+
+class Profiler():
+    '''
+    训练循环的分阶段计时器和计数器，以及可选的torch.profiler窗口
+    Named per-phase timers and counters for the training loop, plus an optional torch.profiler
+    window exported as a Chrome trace.
+
+    state=False 时 phase() 返回共享的空上下文，wrap() 原样返回函数，count() 和 step() 直接返回，
+    训练循环的开销可以忽略
+    With state=False, phase() returns a shared empty context, wrap() returns the function
+    unchanged and count() and step() return at once, so the training loop pays next to nothing.
+
+    sync=True 时每次计时前后同步CUDA，使异步执行的核函数计入所在的阶段
+    With sync=True, CUDA is synchronized around every phase so asynchronous kernels are charged
+    to the phase that launched them.
+
+    trace_steps > 0 时，本次运行的前trace_start步（至少1步，跳过首步的预热开销）之后的trace_steps步运行torch.profiler，
+    结束时把Chrome trace写入trace_path（可在chrome://tracing或Perfetto中打开），阶段名出现在trace中
+    With trace_steps > 0, torch.profiler records the trace_steps steps that follow the first
+    trace_start steps of this run (at least one, to skip the first-step warm-up; steps are counted
+    by step()) and the Chrome trace is written to trace_path, viewable in chrome://tracing or
+    Perfetto; the phase names show up as ranges in the trace.
+    '''
+    def __init__(self, state: bool = False, sync: bool = False, trace_start: int = 0, trace_steps: int = 0, trace_path=None):
+        self.state = bool(state) or trace_steps > 0
+        self.sync = sync
+        self.trace_start, self.trace_steps, self.trace_path = max(1, trace_start), trace_steps, trace_path
+        self.trace = None
+        self.step_num = 0
+        self.phases = {}
+        self.counts = {}
+        self.active = []
+        self.start = time.perf_counter()
+
+    def clock(self):
+        if self.sync:
+            torch.cuda.synchronize()
+        return time.perf_counter()
+
+    def phase(self, name, exclusive: bool = False):
+        '''
+        计时一个阶段，用法 with profiler.phase('backward'): ...；阶段可以嵌套（如logging中的model_save）
+        Time one phase: with profiler.phase('backward'): ... Phases may nest (model_save inside
+        logging), so their totals can add up to more than the wall time.
+
+        exclusive=True 时这段时间只计入本阶段，并从所有外层阶段中扣除（如省内存模式下net_f中的分块反传计入backward）
+        With exclusive=True the time counts only for this phase and is taken out of every enclosing
+        phase, e.g. the chunked backward that lean mode runs inside net_f is charged to backward.
+        '''
+        if not self.state:
+            return null
+        return Phase(self, name, exclusive)
+
+    def wrap(self, name, func):
+        # 把每次调用func计入阶段name，关闭时原样返回func
+        if not self.state:
+            return func
+
+        def timed(*args, **kwargs):
+            with Phase(self, name):
+                return func(*args, **kwargs)
+        return timed
+
+    def count(self, name, value=1):
+        if self.state:
+            self.counts[name] = self.counts.get(name, 0) + value
+
+    def step(self):
+        '''
+        每个训练步结束时调用，开启和关闭torch.profiler窗口
+        Call once at the end of every training step; opens and closes the torch.profiler window.
+        '''
+        if not self.state:
+            return
+        self.step_num += 1
+        if self.trace_steps <= 0:
+            return
+        if self.trace is None and self.step_num == self.trace_start:
+            activities = [torch.profiler.ProfilerActivity.CPU]
+            if torch.cuda.is_available():
+                activities.append(torch.profiler.ProfilerActivity.CUDA)
+            self.trace = torch.profiler.profile(activities=activities)
+            self.trace.__enter__()
+        elif self.trace is not None and self.step_num >= self.trace_start + self.trace_steps:
+            self.trace_stop()
+
+    def trace_stop(self):
+        # 关闭torch.profiler并导出Chrome trace，训练在窗口结束前停止时也会调用
+        if self.trace is None:
+            return
+        trace, self.trace = self.trace, None
+        trace.__exit__(None, None, None)
+        os.makedirs(os.path.dirname(self.trace_path), exist_ok=True)
+        trace.export_chrome_trace(self.trace_path)
+        print(f'Profiler trace written to {self.trace_path}')
+
+    def summary(self):
+        '''
+        各阶段的 [阶段, 调用次数, 总时间(秒), 平均时间(毫秒), 占墙钟时间的比例]，按总时间降序，计数器另列 [名称, 值]
+        Return (phase rows, counter rows): phase rows are [phase, calls, total s, mean ms, share of
+        wall time] sorted by total time, counter rows are [name, value].
+        '''
+        wall = time.perf_counter() - self.start
+        phase_rows = [[name, calls, total, 1000 * total / calls, total / wall]
+                      for name, (total, calls) in sorted(self.phases.items(), key=lambda item: -item[1][0])]
+        return phase_rows, sorted([name, value] for name, value in self.counts.items())
+
+    def write(self, path):
+        '''
+        把summary()写为CSV（与损失日志放在同一个Loss文件夹中），并在终端打印
+        Write summary() as a CSV, next to the loss log in the Loss folder, and print it.
+        '''
+        if not self.state:
+            return
+        self.trace_stop()
+        phase_rows, count_rows = self.summary()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w', newline='') as file:
+            writer = csv.writer(file)
+            writer.writerow(['Phase', 'Calls', 'Total s', 'Mean ms', 'Share'])
+            writer.writerows(phase_rows)
+            writer.writerow([])
+            writer.writerow(['Counter', 'Value'])
+            writer.writerows(count_rows)
+
+        print(f'\nProfile ({self.step_num} steps, written to {path}):')
+        for name, calls, total, mean, share in phase_rows:
+            print(f'  {name:<18} {calls:>8d} calls {total:>10.3f} s {mean:>10.3f} ms/call {100 * share:>6.1f} %')
+        for name, value in count_rows:
+            print(f'  {name:<18} {value}')
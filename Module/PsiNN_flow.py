@@ -1,5 +1,6 @@
 import torch
 import torch.nn as nn
+import Module.PsiStructure as PsiStructure
   
 class Net(nn.Module):
     def __init__(self, node_num:int, output_num:int=1):
@@ -30,6 +31,26 @@ class Net(nn.Module):
         self.fc4_1 = nn.Linear(4*self.node_num, self.output_num)
  
 
+        # 结构描述，由PsiStructure编译为每层一次矩阵乘法的前向
+        self.program = PsiStructure.Program(self, [
+            # u1_1 = fc1_1(x) + fc1_3(y),  u1_2 = fc1_1(x) - fc1_3(y),  u1_3 = fc1_2(x) + fc1_4(y),  u1_4 = fc1_2(x) - fc1_4(y)
+            [[('fc1_1', 1), ('fc1_3', 1)],
+             [('fc1_1', 1), ('fc1_3', -1)],
+             [('fc1_2', 1), ('fc1_4', 1)],
+             [('fc1_2', 1), ('fc1_4', -1)]],
+            # u2_1 = fc2_1(u1_1) + fc2_3(u1_2),  u2_2 = fc2_3(u1_1) + fc2_1(u1_2),
+            # u2_3 = fc2_2(u1_3) + fc2_4(u1_4),  u2_4 = fc2_4(u1_3) + fc2_2(u1_4)
+            [[('fc2_1', 1), ('fc2_3', 1), None, None],
+             [('fc2_3', 1), ('fc2_1', 1), None, None],
+             [None, None, ('fc2_2', 1), ('fc2_4', 1)],
+             [None, None, ('fc2_4', 1), ('fc2_2', 1)]],
+            # u3_1 = fc3_1(u2_1) - fc3_1(u2_2),  u3_2 = fc3_2(u2_3) + fc3_2(u2_4)
+            [[('fc3_1', 1), ('fc3_1', -1), None, None],
+             [None, None, ('fc3_2', 1), ('fc3_2', 1)]],
+            # u = fc4_1([u3_1, u3_2])
+            [[('fc4_1', 1)]],
+        ])
+
         #将损失存下来
         self.iter = 0
         self.iter_list = []
@@ -40,8 +61,11 @@ class Net(nn.Module):
         self.loss_rgl_list = []
         self.para_ud_list = []
 
-    # 定义数据的流动方式，要放在类的缩进里面
     def forward(self, input):
+        return self.program(input)
+
+    # 逐分支的原始写法，与编译后的前向等价，用于核对（见PsiStructure.verify）
+    def forward_branch(self, input):
 
         x, y = input[:,0:1], input[:,1:2]
         
@@ -2,6 +2,7 @@
 import torch
 # from torch.utils.data import DataLoader
 import torch.nn as nn
+import Module.PsiStructure as PsiStructure
 
 class Net(nn.Module):
     def __init__(self, node_num:int, output_num:int=1):
@@ -33,6 +34,20 @@ class Net(nn.Module):
         self.fc4_1 = nn.Linear(2*self.node_num, output_num)
  
 
+        # 结构描述，由PsiStructure编译为每层一次矩阵乘法的前向
+        self.program = PsiStructure.Program(self, [
+            # u1_3 = fc1_2(x) + fc1_4(y),  u1_4 = fc1_2(x) - fc1_4(y)
+            [[('fc1_2', 1), ('fc1_4', 1)],
+             [('fc1_2', 1), ('fc1_4', -1)]],
+            # u2_3 = fc2_2(u1_3) + fc2_4(u1_4),  u2_4 = fc2_4(u1_3) + fc2_2(u1_4)
+            [[('fc2_2', 1), ('fc2_4', 1)],
+             [('fc2_4', 1), ('fc2_2', 1)]],
+            # u3_2 = fc3_2(u2_3) + fc3_2(u2_4)
+            [[('fc3_2', 1), ('fc3_2', 1)]],
+            # u = fc4_1(u3_2)
+            [[('fc4_1', 1)]],
+        ])
+
         #将损失存下来
         self.iter = 0
         self.iter_list = []
@@ -43,8 +58,11 @@ class Net(nn.Module):
         self.loss_rgl_list = []
         self.para_ud_list = []
 
-    # 定义数据的流动方式，要放在类的缩进里面
     def forward(self, input):
+        return self.program(input)
+
+    # 逐分支的原始写法，与编译后的前向等价，用于核对（见PsiStructure.verify）
+    def forward_branch(self, input):
 
         x,y = input[:,0:1],input[:,1:2]
 
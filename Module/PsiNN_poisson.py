@@ -3,6 +3,7 @@
 import torch
 # from torch.utils.data import DataLoader
 import torch.nn as nn
+import Module.PsiStructure as PsiStructure
 # import torch.nn.functional as F
 # import torch.optim as optim
 # import matplotlib.pyplot as plt
@@ -32,6 +33,20 @@ class Net(nn.Module):
         # 第四层一种
         self.fc4 = nn.Linear(self.node_num, self.output_num)
 
+        # 结构描述，由PsiStructure编译为每层一次矩阵乘法的前向
+        self.program = PsiStructure.Program(self, [
+            # u1 = fc1(x),  u2 = fc1(y)
+            [[('fc1', 1), None],
+             [None, ('fc1', 1)]],
+            # u2_1 = fc2_1(u1) + fc2_2(u2),  u2_2 = fc2_2(u1) + fc2_1(u2)
+            [[('fc2_1', 1), ('fc2_2', 1)],
+             [('fc2_2', 1), ('fc2_1', 1)]],
+            # u = fc3(u2_1) + fc3(u2_2)
+            [[('fc3', 1), ('fc3', 1)]],
+            # u = fc4(u)
+            [[('fc4', 1)]],
+        ])
+
         #将损失存下来
         self.iter = 0
         self.iter_list = []
@@ -43,6 +58,10 @@ class Net(nn.Module):
         self.para_ud_list = []
 
     def forward(self, input):
+        return self.program(input)
+
+    # 逐分支的原始写法，与编译后的前向等价，用于核对（见PsiStructure.verify）
+    def forward_branch(self, input):
 
         x, y = input[:,0:1], input[:,1:2]
 
@@ -0,0 +1,92 @@
+# coding = utf-8
+import torch
+import torch.nn.functional as F
+
+
+class Program():
+    '''
+    将Psi-NN的结构描述编译为前向计算：每层只做一次矩阵乘法
+    Lower a declarative Psi-NN structure into a forward pass with one GEMM per layer.
+
+    结构描述 structure 为逐层的连接模式 pattern，pattern[i][j] = (权重块名称, 符号) 或 None，
+    表示第i个输出分支包含 符号 * 权重块(第j个输入分支)。第一层的输入分支为输入的各列（x, y, ...）。
+    只有一列的模式作用在全部分支拼接后的向量上（例如最后一层对 [u3_1, u3_2] 整体做线性变换）。
+    The structure is a list of per-layer patterns; pattern[i][j] = (block name, sign) or None means
+    output branch i receives sign * block(input branch j). The input branches of the first layer
+    are the input columns (x, y, ...). A single-column pattern acts on all branches concatenated.
+
+    权重块是net上已有的nn.Linear（保持参数名和state_dict不变）。每次前向时按模式把共享的权重块
+    拼成整层的分块矩阵，偏置按符号合并，因此同一权重块作用在不同分支上、以及重复出现的公共子式
+    （如fc1_1(x)）都在一次矩阵乘法中完成。除最后一层外激活函数为tanh。
+    The blocks are the existing nn.Linear modules of net, so parameter names and state_dict are
+    unchanged. Each forward assembles the shared blocks into the layer's block matrix (biases summed
+    with their signs), so every use of a block and every repeated subexpression such as fc1_1(x)
+    is covered by that single matmul, in the forward as well as in the derivatives of net_f.
+    '''
+    def __init__(self, net, structure, activation=torch.tanh):
+        self.net = [net]    # 放在列表中，避免被注册为子模块
+        self.structure = structure
+        self.activation = activation
+
+        # 编译时检查各权重块的尺寸与分支宽度一致，并记录每层输出分支的宽度
+        widths = [1] * len(structure[0][0])
+        self.in_widths = []
+        for k, pattern in enumerate(structure):
+            in_widths = widths if len(pattern[0]) > 1 else [sum(widths)]
+            self.in_widths.append(in_widths)
+            out_widths = []
+            for i, row in enumerate(pattern):
+                if len(row) != len(in_widths):
+                    raise ValueError(f'Layer {k + 1} branch {i + 1} has {len(row)} inputs, expected {len(in_widths)}.')
+                blocks = [self.block(entry[0]) for entry in row if entry is not None]
+                if len(set(block.out_features for block in blocks)) != 1:
+                    raise ValueError(f'Layer {k + 1} branch {i + 1} mixes blocks of different output sizes.')
+                for j, entry in enumerate(row):
+                    if entry is not None and self.block(entry[0]).in_features != in_widths[j]:
+                        raise ValueError(f'Block {entry[0]} expects {self.block(entry[0]).in_features} inputs, branch {j + 1} has {in_widths[j]}.')
+                out_widths.append(blocks[0].out_features)
+            widths = out_widths
+
+    def block(self, name):
+        return getattr(self.net[0], name)
+
+    # 按模式拼出整层的权重和偏置
+    def layer(self, pattern, in_widths):
+        weight_rows, bias_rows = [], []
+        for row in pattern:
+            out_width = next(self.block(entry[0]).out_features for entry in row if entry is not None)
+            reference = next(self.block(entry[0]).weight for entry in row if entry is not None)
+            weights, bias = [], 0
+            for entry, in_width in zip(row, in_widths):
+                if entry is None:
+                    weights.append(reference.new_zeros(out_width, in_width))
+                    continue
+                block, sign = self.block(entry[0]), entry[1]
+                weights.append(sign * block.weight)
+                if block.bias is not None:
+                    bias = bias + sign * block.bias
+            weight_rows.append(torch.cat(weights, dim=1))
+            bias_rows.append(bias if torch.is_tensor(bias) else reference.new_zeros(out_width))
+        return torch.cat(weight_rows, dim=0), torch.cat(bias_rows, dim=0)
+
+    def __call__(self, input):
+        # 与原写法一致，只取前几列作为输入分支
+        u = input[:, :sum(self.in_widths[0])]
+        for k, pattern in enumerate(self.structure):
+            weight, bias = self.layer(pattern, self.in_widths[k])
+            u = F.linear(u, weight, bias)
+            if k < len(self.structure) - 1:
+                u = self.activation(u)
+        return u
+
+
+def verify(net, input, atol: float = 1e-5):
+    '''
+    核对编译后的前向与逐分支的原始写法（net.forward_branch）一致，返回最大误差
+    Check the lowered forward against the branch-by-branch reference net.forward_branch; returns the max abs error.
+    '''
+    with torch.no_grad():
+        error = (net(input) - net.forward_branch(input)).abs().max().item()
+    if error > atol:
+        raise AssertionError(f'{type(net).__module__}: lowered forward differs from the reference by {error:.3e}.')
+    return error
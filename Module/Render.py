@@ -0,0 +1,182 @@
+# coding = utf-8
+import os
+import sys
+import atexit
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import Module.Config as Config
+
+# 绘图进程池，为None时在当前进程中直接绘图（原来的行为）
+# Process pool for rendering; while None, figures are drawn inline in the calling process.
+pool = None
+futures = []
+
+
+def worker_init():
+    # 无界面的Agg后端 / headless Agg backend
+    import matplotlib
+    matplotlib.use('Agg')
+
+
+def start(worker_num: int):
+    '''
+    启动绘图进程池，之后submit的绘图任务在后台进程中完成，训练不再等待绘图
+    Start the rendering pool; jobs submitted afterwards are drawn in background processes and
+    training no longer waits for them. Call wait() to block until every figure is written.
+
+    训练进程中已有检查点写入线程和torch的计算线程，fork多线程进程可能死锁，所以用forkserver（没有时用spawn）启动；
+    子进程会重新导入主模块，调用train()的脚本需要放在 if __name__ == '__main__': 之下
+    The training process already runs the checkpoint writer and torch's intra-op threads, and
+    forking a multi-threaded process can deadlock, so workers are started with forkserver (spawn
+    where it is unavailable). Both re-import the main module in the workers, so a script that
+    calls train() with render_worker_num > 0 must do so under if __name__ == '__main__':.
+
+    没有调用wait()时，退出前会等待全部图片完成并报告失败的图片
+    If wait() is never called, the figures are waited for at exit and failures are reported then.
+    '''
+    global pool
+    if pool is None and worker_num > 0:
+        method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+        pool = ProcessPoolExecutor(worker_num, mp_context=multiprocessing.get_context(method), initializer=worker_init)
+        atexit.register(wait_at_exit)
+
+
+def field_path(file_desti, ques_name, ini_num, module_name):
+    # result_show保存的计算场，用于不重新训练而重新画图
+    return f'{file_desti}/Figure/{ques_name}_{ini_num}_field_{module_name}.npz'
+
+
+def render(kind, job):
+    '''
+    执行一个绘图任务 / draw one job
+    kind: 'field' (SingleVis.figure_2d / figure_3d), 'loss' (SingleVis.loss_vis), 'para' (SingleVis.para_vis)
+          或 'group' (GroupVis对比图)
+    '''
+    import Module.SingleVis as SingleVis
+    import Module.GroupVis as GroupVis
+
+    if kind == 'group':
+        group = GroupVis.Vis(job['ques_name'], job['ini_num'], job['file_desti'])
+        for model_name in job['model_names']:
+            group.loss_read(model_name)
+            if job['monitor_state']:
+                group.para_read(model_name)
+        group.loss_vis()
+        if job['monitor_state']:
+            group.para_vis()
+        return
+
+    input = job.get('input', np.zeros([0, 2]))
+    vis = SingleVis.Vis(job['ques_name'], job['ini_num'], job['file_desti'], job['module_name'], input, job.get('u', []), job.get('mode', 'teacher'))
+    if kind == 'field':
+        vis.figure_2d() if input.shape[1] == 2 else vis.figure_3d()
+    elif kind == 'loss':
+        vis.loss_vis(job.get('loss'), job.get('header'))
+    elif kind == 'para':
+        vis.para_vis()
+    else:
+        raise ValueError(f'Unknown render job {kind}.')
+
+
+def submit(kind, **job):
+    # 有进程池时放入队列，否则直接绘图
+    if pool is None:
+        render(kind, job)
+    else:
+        futures.append((kind, job.get('module_name', job['ques_name']), pool.submit(render, kind, job)))
+
+
+def wait():
+    '''
+    等待已提交的绘图全部完成，失败的任务统一抛出
+    Block until every submitted job is drawn; failures are raised together at the end.
+    '''
+    failed = []
+    while futures:
+        kind, name, future = futures.pop(0)
+        try:
+            future.result()
+        except Exception as error:
+            failed.append(f'{kind} {name}: {error!r}')
+    if failed:
+        raise RuntimeError(f'{len(failed)} figures failed: {failed}')
+
+
+def wait_at_exit():
+    # 直接调用train()的脚本不会调用wait()，退出前等待绘图完成，失败的图片输出到stderr
+    try:
+        wait()
+    except RuntimeError as error:
+        print(f'Render: {error}', file=sys.stderr)
+
+
+def model_order(ques_name, ini_num, model_names):
+    # 对比图按Config中的模型顺序，Config不存在时按名称排序
+    config_path = Config.path(ques_name, ini_num)
+    if not os.path.isfile(config_path):
+        return sorted(model_names)
+    order = Config.load(config_path)['model'].split(' ')
+    return [name for name in order if name in model_names] + sorted(set(model_names) - set(order))
+
+
+def jobs(ques_name, ini_num):
+    '''
+    根据Results/<ques_name>_<ini_num>中已有的文件列出全部绘图任务，返回[(kind, job)]
+    List every figure job that the files in Results/<ques_name>_<ini_num> allow, as [(kind, job)].
+    '''
+    file_desti = f'./Results/{ques_name}_{ini_num}'
+    base = {'ques_name': ques_name, 'ini_num': ini_num, 'file_desti': file_desti}
+    job_list = []
+
+    def name_mode(module_name):
+        if module_name.endswith('_student'):
+            return {'module_name': module_name[:-len('_student')], 'mode': 'student'}
+        return {'module_name': module_name, 'mode': 'teacher'}
+
+    field_prefix = f'{ques_name}_{ini_num}_field_'
+    if os.path.isdir(file_desti + '/Figure'):
+        for file_name in sorted(os.listdir(file_desti + '/Figure')):
+            if file_name.startswith(field_prefix) and file_name.endswith('.npz'):
+                with np.load(f'{file_desti}/Figure/{file_name}') as data:
+                    job_list.append(('field', {**base, **name_mode(file_name[len(field_prefix):-4]), 'input': data['input'], 'u': data['u']}))
+
+    loss_prefix = f'{ques_name}_{ini_num}_loss_'
+    module_names = []
+    if os.path.isdir(file_desti + '/Loss'):
+        module_names = sorted({file_name[len(loss_prefix):-4] for file_name in os.listdir(file_desti + '/Loss')
+                               if file_name.startswith(loss_prefix) and file_name.endswith(('.bin', '.csv'))})
+    job_list += [('loss', {**base, **name_mode(module_name)}) for module_name in module_names]
+    teachers = [module_name for module_name in module_names if not module_name.endswith('_student')]
+
+    para_prefix = f'{ques_name}_{ini_num}_paras_'
+    monitored = []
+    if os.path.isdir(file_desti + '/Parameters'):
+        monitored = [file_name[len(para_prefix):-4] for file_name in sorted(os.listdir(file_desti + '/Parameters'))
+                     if file_name.startswith(para_prefix) and file_name.endswith('.csv')]
+        job_list += [('para', {**base, 'module_name': module_name}) for module_name in monitored]
+
+    if len(teachers) > 1:
+        job_list.append(('group', {**base, 'model_names': model_order(ques_name, ini_num, teachers),
+                                   'monitor_state': set(teachers) <= set(monitored)}))
+    return job_list
+
+
+def regenerate(tasks, worker_num=None):
+    '''
+    不重新训练，由Results中的记录重新画出全部图片
+    Redraw every figure of the given (ques_name, ini_num) tasks from the files in Results, without retraining.
+    '''
+    job_list = [job for ques_name, ini_num in tasks for job in jobs(ques_name, ini_num)]
+    start(min(len(job_list), os.cpu_count() or 1) if worker_num is None else worker_num)
+    for kind, job in job_list:
+        submit(kind, **job)
+    wait()
+    print(f'Rendered {len(job_list)} figure jobs.')
+
+
+if __name__ == '__main__':
+    # 用法 / usage: python -m Module.Render Flow:EXP Laplace:EXP [worker_num]
+    task_list = [tuple(arg.split(':')) for arg in sys.argv[1:] if ':' in arg]
+    worker_arg = [int(arg) for arg in sys.argv[1:] if arg.isdigit()]
+    regenerate(task_list, worker_arg[0] if worker_arg else None)
@@ -0,0 +1,90 @@
+# coding = utf-8
+import os
+import sys
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import torch
+import Module.Training as Training
+import Module.Render as Render
+
+
+def jobs(tasks):
+    '''
+    将(问题名称, 编号)展开为(问题名称, 编号, 模型)的独立任务
+    Expand every (ques_name, ini_num) task into one independent job per model listed in its Config.
+    '''
+    return [(ques_name, ini_num, model_name) for ques_name, ini_num in tasks
+            for model_name in Training.model(ques_name, ini_num).model_ini_dict['model']]
+
+
+def worker_init(thread_num):
+    # 每个进程只使用分到的线程数，避免多个进程争抢同一批核
+    torch.set_num_threads(thread_num)
+
+
+def run_job(ques_name, ini_num, model_name):
+    # 每个任务使用相同的随机种子，结果与运行顺序无关
+    torch.manual_seed(1234)
+    task = Training.model(ques_name, ini_num)
+    # 任务本身已在进程池中并行，不再为每个任务各开一个绘图进程池
+    task.render_worker_num = 0
+    task.train([model_name])
+    # 进程池中的任务结束前等待其图片画完
+    Render.wait()
+    return ques_name, ini_num, model_name
+
+
+def run(tasks, worker_num=None, thread_num=None):
+    '''
+    在进程池中并行训练全部任务，每个Config的全部模型完成后在主进程中画对比图
+    Train all jobs in a process pool; once every model of a Config has finished, its GroupVis
+    comparison plots are drawn in the main process.
+
+    worker_num: 进程数，默认为任务数与CPU核数中较小者
+    thread_num: 每个进程的torch线程数，默认平分CPU核数
+
+    失败的任务不影响其他任务，全部结束后统一抛出
+    A failed job does not stop the others; failures are raised together at the end.
+    '''
+    job_list = jobs(tasks)
+    cpu_num = os.cpu_count() or 1
+    worker_num = min(len(job_list), cpu_num) if worker_num is None else worker_num
+    thread_num = max(1, cpu_num // worker_num) if thread_num is None else thread_num
+
+    remain = {}
+    for ques_name, ini_num, _ in job_list:
+        remain[(ques_name, ini_num)] = remain.get((ques_name, ini_num), 0) + 1
+    failed = []
+
+    # spawn启动的子进程不继承CUDA上下文
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(worker_num, mp_context=context, initializer=worker_init, initargs=(thread_num,)) as executor:
+        futures = {executor.submit(run_job, *job): job for job in job_list}
+        for future in as_completed(futures):
+            ques_name, ini_num, model_name = futures[future]
+            try:
+                future.result()
+                print(f'Finished {ques_name}_{ini_num} {model_name}.')
+            except Exception as error:
+                print(f'Failed {ques_name}_{ini_num} {model_name}: {error!r}')
+                failed.append(futures[future])
+                remain[(ques_name, ini_num)] = None
+                continue
+
+            if remain[(ques_name, ini_num)] is None:
+                continue
+            remain[(ques_name, ini_num)] -= 1
+            if remain[(ques_name, ini_num)] == 0:
+                task = Training.model(ques_name, ini_num)
+                if len(task.model_ini_dict['model']) > 1:
+                    task.group_show(task.model_ini_dict['model'])
+
+    if failed:
+        raise RuntimeError(f'{len(failed)} of {len(job_list)} jobs failed: {failed}')
+
+
+if __name__ == '__main__':
+    # 用法 / usage: python -m Module.Runner Laplace:EXP Burgers_inv:EXP [worker_num]
+    task_list = [tuple(arg.split(':')) for arg in sys.argv[1:] if ':' in arg]
+    worker_arg = [int(arg) for arg in sys.argv[1:] if arg.isdigit()]
+    run(task_list, worker_arg[0] if worker_arg else None)
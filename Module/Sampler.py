@@ -0,0 +1,53 @@
+# coding = utf-8
+import torch
+
+
+class Sampler():
+    '''
+    配点的小批量随机采样，并按残差大小自适应调整采样概率（RAD）
+    Mini-batch sampler over a candidate pool of collocation points with residual-based adaptive
+    distribution (RAD): every resample_gap steps the sampling probability of each candidate is
+    set to  p ∝ r^k / mean(r^k) + c,  where r is the pointwise squared residual.
+
+    k越大越集中在残差大的区域，c越大越接近均匀采样
+    Larger k concentrates on high-residual regions; larger c keeps the distribution closer to uniform.
+    '''
+    def __init__(self, x, y, batch_num: int, resample_gap: int = 0, k: float = 1., c: float = 1., chunk_num: int = 10000):
+        self.x_pool = x.detach()
+        self.y_pool = y.detach()
+        self.pool_num = self.x_pool.shape[0]
+        self.batch_num = min(batch_num, self.pool_num)
+        self.resample_gap = resample_gap
+        self.k = k
+        self.c = c
+        self.chunk_num = chunk_num
+
+        # 初始为均匀采样
+        self.weights = torch.ones(self.pool_num, device=self.x_pool.device)
+
+    def sample(self):
+        '''
+        按当前概率不放回地抽取一个批次，返回可求导的叶子张量
+        Draw one batch without replacement; the returned coordinates are fresh leaves that require grad.
+        '''
+        index = torch.multinomial(self.weights, self.batch_num, replacement=False)
+        return self.x_pool[index].requires_grad_(), self.y_pool[index].requires_grad_()
+
+    def resample(self, score):
+        '''
+        在整个候选池上分块计算逐点残差，并更新采样概率
+        Score the whole pool chunk by chunk with score(x, y) -> [n, 1] and update the sampling weights.
+        '''
+        residual = torch.cat([score(self.x_pool[i:i + self.chunk_num], self.y_pool[i:i + self.chunk_num]).reshape([-1])
+                              for i in range(0, self.pool_num, self.chunk_num)])
+        residual = residual ** self.k
+        self.weights = residual / residual.mean().clamp_min(1e-30) + self.c
+
+    def step(self, iter, score):
+        '''
+        训练循环每步调用，到达间隔时先重新计算概率，再抽取批次
+        Called once per training step: refresh the distribution on the resample_gap boundary, then sample.
+        '''
+        if self.resample_gap and iter > 0 and iter % self.resample_gap == 0:
+            self.resample(score)
+        return self.sample()
@@ -0,0 +1,268 @@
+# coding = utf-8
+import os
+import sys
+import json
+import time
+import asyncio
+import collections
+import numpy as np
+import Module.Inference as Inference
+
+
+def load_models(ques_name, ini_num, dtype=np.float32):
+    '''
+    读取Results/<ques_name>_<ini_num>/Models中的模型（不含过程中的_step_和续算检查点），返回{名称: Inference.Engine}
+    Load the final models of Results/<ques_name>_<ini_num>/Models (no _step_ snapshots or resume
+    checkpoints) as {name: Inference.Engine}; name is e.g. 'PsiNN_flow' or 'PINN_student'.
+
+    没有npz或npz比pth旧时先导出（此时需要torch）
+    Models whose .npz is missing or older than the .pth are exported first, which needs torch.
+    '''
+    model_dir = f'./Results/{ques_name}_{ini_num}/Models/'
+    prefix = f'{ques_name}_{ini_num}_'
+    engines = {}
+    for file_name in sorted(os.listdir(model_dir)):
+        stem, extension = os.path.splitext(file_name)
+        if extension != '.pth' or not stem.startswith(prefix) or '_step_' in stem:
+            continue
+        name = stem[len(prefix):]
+        file_path = model_dir + stem + '.npz'
+        if not os.path.isfile(file_path) or os.path.getmtime(file_path) < os.path.getmtime(model_dir + file_name):
+            if name.endswith('_student'):
+                Inference.export_saved(ques_name, ini_num, name[:-len('_student')], 'student')
+            else:
+                Inference.export_saved(ques_name, ini_num, name)
+        engines[name] = Inference.Engine(file_path, dtype)
+    return engines
+
+
+class Metrics():
+    # 最近window个请求的延迟分位数，以及启动以来的吞吐量
+    def __init__(self, window: int = 10000):
+        self.latency = collections.deque(maxlen=window)
+        self.start = time.perf_counter()
+        self.request_num = 0
+        self.point_num = 0
+        self.batch_num = 0
+
+    def record(self, latency, point_num):
+        self.latency.append(latency)
+        self.request_num += 1
+        self.point_num += point_num
+
+    def report(self):
+        elapsed = time.perf_counter() - self.start
+        latency = np.array(self.latency) * 1000 if self.latency else np.zeros(1)
+        return {'requests': self.request_num, 'batches': self.batch_num,
+                'requests per batch': self.request_num / max(self.batch_num, 1),
+                'p50 ms': float(np.percentile(latency, 50)), 'p99 ms': float(np.percentile(latency, 99)),
+                'requests/s': self.request_num / elapsed, 'points/s': self.point_num / elapsed}
+
+
+class Server():
+    '''
+    本地的微批处理查询服务：同一模型、同一导数阶数的并发请求在延迟预算max_delay内合并为一批，
+    做一次批量推理后把结果分发回各个请求
+    Local micro-batching query server. Concurrent requests for the same model and derivative order
+    are coalesced for up to max_delay seconds (or until batch_num points), evaluated in one batched
+    Inference.Engine call on a worker thread, and the results are scattered back.
+
+    协议为逐行JSON / newline-delimited JSON:
+      {"id": 1, "model": "PsiNN_flow", "points": [[x, y], ...], "order": 0}
+        -> {"id": 1, "output": [[p, u, v], ...]}  (order 1/2 also returns "first"/"second")
+      {"id": 2, "metrics": true} -> {"id": 2, "metrics": {"p50 ms": ..., "p99 ms": ..., "points/s": ...}}
+    '''
+    def __init__(self, engines, max_delay: float = 0.002, batch_num: int = 65536):
+        self.engines = engines
+        self.max_delay = max_delay
+        self.batch_num = batch_num
+        self.metrics = Metrics()
+        self.queues = {}
+        self.workers = []
+
+    def queue(self, key):
+        # 每个 (模型, 阶数) 一个队列和一个合批任务
+        if key not in self.queues:
+            self.queues[key] = asyncio.Queue()
+            self.workers.append(asyncio.get_running_loop().create_task(self.batch_loop(key, self.queues[key])))
+        return self.queues[key]
+
+    async def batch_loop(self, key, queue):
+        loop = asyncio.get_running_loop()
+        engine, order = self.engines[key[0]], key[1]
+        while True:
+            batch = [await queue.get()]
+            point_num = len(batch[0][0])
+            deadline = loop.time() + self.max_delay
+            while point_num < self.batch_num:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+                point_num += len(batch[-1][0])
+
+            points = np.concatenate([item[0] for item in batch], axis=0)
+            try:
+                outputs = await loop.run_in_executor(None, engine, points, order)
+            except Exception as error:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(error)
+                continue
+            outputs = (outputs,) if order == 0 else outputs
+            self.metrics.batch_num += 1
+
+            start = 0
+            for item_points, future in batch:
+                end = start + len(item_points)
+                if not future.done():
+                    future.set_result([output[start:end] for output in outputs])
+                start = end
+
+    async def query(self, model, points, order: int = 0):
+        if model not in self.engines:
+            raise KeyError(f'Unknown model {model}; available: {sorted(self.engines)}.')
+        points = np.asarray(points, dtype=self.engines[model].dtype).reshape([-1, self.engines[model].input_num])
+        future = asyncio.get_running_loop().create_future()
+        await self.queue((model, int(order))).put((points, future))
+        return await future
+
+    async def handle(self, message):
+        if message.get('metrics'):
+            return {'metrics': self.metrics.report()}
+        start = time.perf_counter()
+        outputs = await self.query(message['model'], message['points'], message.get('order', 0))
+        self.metrics.record(time.perf_counter() - start, len(outputs[0]))
+        return dict(zip(['output', 'first', 'second'], [output.tolist() for output in outputs]))
+
+    async def respond(self, line, writer):
+        message = {}
+        try:
+            parsed = json.loads(line)
+            # 合法的JSON不一定是对象，例如[1, 2]，同样以error返回
+            if not isinstance(parsed, dict):
+                raise ValueError(f'a request must be a JSON object, got {type(parsed).__name__}')
+            message = parsed
+            response = await self.handle(message)
+        except Exception as error:
+            response = {'error': f'{type(error).__name__}: {error}'}
+        response['id'] = message.get('id')
+        writer.write((json.dumps(response) + '\n').encode())
+
+    async def connection(self, reader, writer):
+        # 同一连接上的请求可以流水线发送，按完成顺序返回，用id对应
+        tasks = set()
+        try:
+            while line := await reader.readline():
+                task = asyncio.get_running_loop().create_task(self.respond(line, writer))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+            if tasks:
+                await asyncio.gather(*tasks)
+            await writer.drain()
+        finally:
+            writer.close()
+
+    async def start(self, host='127.0.0.1', port: int = 8765, path=None):
+        if path is not None:
+            return await asyncio.start_unix_server(self.connection, path=path, limit=2 ** 26)
+        return await asyncio.start_server(self.connection, host, port, limit=2 ** 26)
+
+
+class Client():
+    '''
+    本地测试客户端 / local test client
+    client = await Client.connect(port=8765);  output = await client.query('PsiNN_flow', points)
+    '''
+    def __init__(self, reader, writer):
+        self.reader, self.writer = reader, writer
+        self.futures = {}
+        self.count = 0
+        self.listener = asyncio.get_running_loop().create_task(self.listen())
+
+    @classmethod
+    async def connect(cls, host='127.0.0.1', port: int = 8765, path=None):
+        if path is not None:
+            reader, writer = await asyncio.open_unix_connection(path, limit=2 ** 26)
+        else:
+            reader, writer = await asyncio.open_connection(host, port, limit=2 ** 26)
+        return cls(reader, writer)
+
+    async def listen(self):
+        try:
+            while line := await self.reader.readline():
+                response = json.loads(line)
+                self.futures.pop(response['id']).set_result(response)
+        finally:
+            # 连接断开时未完成的请求全部报错，而不是一直等待
+            for future in self.futures.values():
+                if not future.done():
+                    future.set_exception(ConnectionError('Connection to the server closed.'))
+            self.futures.clear()
+
+    async def request(self, message):
+        if self.listener.done():
+            raise ConnectionError('Connection to the server closed.')
+        self.count += 1
+        future = asyncio.get_running_loop().create_future()
+        self.futures[self.count] = future
+        self.writer.write((json.dumps({'id': self.count, **message}) + '\n').encode())
+        await self.writer.drain()
+        response = await future
+        if 'error' in response:
+            raise RuntimeError(response['error'])
+        return response
+
+    async def query(self, model, points, order: int = 0):
+        response = await self.request({'model': model, 'points': np.asarray(points).tolist(), 'order': order})
+        outputs = [np.array(response[key]) for key in ['output', 'first', 'second'] if key in response]
+        return outputs[0] if order == 0 else tuple(outputs)
+
+    async def metrics(self):
+        return (await self.request({'metrics': True}))['metrics']
+
+    async def close(self):
+        self.writer.close()
+        await self.writer.wait_closed()
+        await self.listener
+
+
+async def load_test(model, client_num: int = 32, request_num: int = 100, point_num: int = 16, host='127.0.0.1', port: int = 8765, path=None):
+    '''
+    client_num个并发客户端各发送request_num个随机小请求，返回服务器统计的延迟和吞吐量
+    client_num concurrent clients each send request_num small random queries; returns the server's metrics.
+    '''
+    async def worker(seed):
+        client = await Client.connect(host, port, path)
+        rng = np.random.default_rng(seed)
+        for _ in range(request_num):
+            await client.query(model, rng.uniform(-1, 1, [point_num, 2]))
+        await client.close()
+
+    await asyncio.gather(*[worker(seed) for seed in range(client_num)])
+    client = await Client.connect(host, port, path)
+    metrics = await client.metrics()
+    await client.close()
+    return metrics
+
+
+async def main(ques_name, ini_num, port: int = 8765, path=None, test_model=None):
+    server = Server(load_models(ques_name, ini_num))
+    listener = await server.start(port=port, path=path)
+    print(f'Serving {sorted(server.engines)} on {path if path is not None else f"127.0.0.1:{port}"}')
+    if test_model is not None:
+        print(await load_test(test_model, port=port, path=path))
+        listener.close()
+        return
+    async with listener:
+        await listener.serve_forever()
+
+
+if __name__ == '__main__':
+    # 用法 / usage: python -m Module.Server Flow EXP [port | unix socket path] [model to load-test, then exit]
+    address = sys.argv[3] if len(sys.argv) > 3 else '8765'
+    asyncio.run(main(sys.argv[1], sys.argv[2], int(address) if address.isdigit() else 8765,
+                     None if address.isdigit() else address, sys.argv[4] if len(sys.argv) > 4 else None))
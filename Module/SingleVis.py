@@ -1,8 +1,34 @@
 import os
+import hashlib
 import numpy as np
-import pandas as pd
 import matplotlib.pyplot as plt
 import matplotlib.tri as tri
+import Module.LossLog as LossLog
+import Module.Downsample as Downsample
+
+# 三角剖分缓存，键为点集的哈希，同一网格的各输出通道、各模型以及多次result_show共用
+# Triangulations cached by a hash of the point set, shared by every channel, model and result_show call on that mesh.
+triangulation_cache = {}
+
+
+def masked_triangulation(x, y, center_x, center_y, radius):
+    '''
+    点集的三角剖分，并屏蔽重心在圆柱内的三角形（向量化计算重心）
+    Triangulation of the points with the triangles whose centroid lies inside the cylinder masked out.
+    '''
+    key = hashlib.sha1(np.ascontiguousarray(x).tobytes() + np.ascontiguousarray(y).tobytes()).hexdigest() + str((center_x, center_y, radius))
+    if key not in triangulation_cache:
+        # 三角剖分
+        triang = tri.Triangulation(x, y)
+        # 屏蔽圆柱区域内的三角形
+        xc, yc = x[triang.triangles].mean(axis=1), y[triang.triangles].mean(axis=1)
+        triang.set_mask((xc - center_x)**2 + (yc - center_y)**2 < radius**2)
+        if len(triangulation_cache) >= 8:
+            triangulation_cache.clear()
+        triangulation_cache[key] = triang
+    return triangulation_cache[key]
+
+
 class Vis():
     plt.rcParams["figure.dpi"] = 300
     plt.rcParams['font.sans-serif'] = ['Times New Roman']
@@ -26,10 +52,14 @@ class Vis():
         if mode == 'student':
             self.module_name += '_student'
 
-    def loss_vis(self):
+    # 训练过程中可直接传入内存中的列式损失数组和表头，否则读取Loss文件夹中的日志（或CSV）
+    def loss_vis(self, loss=None, header=None):
         self.loss_desti = self.file_densti + '/Loss/'
-        df = pd.read_csv(f'{self.loss_desti}{self.ques_name}_{self.ini_num}_loss_{self.module_name}.csv').values
-        header = pd.read_csv(f'{self.loss_desti}{self.ques_name}_{self.ini_num}_loss_{self.module_name}.csv', nrows=0).columns
+        if loss is not None:
+            df = loss
+        else:
+            df, header = LossLog.table(f'{self.loss_desti}{self.ques_name}_{self.ini_num}_loss_{self.module_name}.bin',
+                                       f'{self.loss_desti}{self.ques_name}_{self.ini_num}_loss_{self.module_name}.csv')
 
         # 由于有的时候前面的iter是续算的，所以这里要重新弄一个iter列表出来
         iter = np.arange(0, len(df[:,0]), 1)
@@ -40,7 +70,8 @@ class Vis():
                 continue
             plt.figure(figsize=(3.85, 3.5)) #调整图像大小
             # plt.plot(df[:,0],df[:,j+1])
-            plt.plot(iter , df[:,j+1])
+            # 每条曲线降采样到几千个点，图片不变
+            plt.plot(*Downsample.min_max(iter, df[:,j+1]))
             plt.yscale('log')
             ax = plt.gca()
             ax.ticklabel_format(style='sci', scilimits=(-1,2), axis='x')    # x 轴用科学记数法
@@ -54,8 +85,7 @@ class Vis():
     
     def figure_2d(self):
         self.figure_desti = self.file_densti + '/Figure/'
-        if not os.path.exists(self.figure_desti):
-            os.mkdir(self.figure_desti)
+        os.makedirs(self.figure_desti, exist_ok=True)
         
         for i in range(len(self.u.T)):
             print(f"Drawing {self.ques_name} {self.module_name} figure {i+1}...")
@@ -68,21 +98,7 @@ class Vis():
                 # 圆柱参数
                 center_x, center_y, radius = 0.2, 0.2, 0.05
 
-                # 三角剖分
-                triang = tri.Triangulation(x, y)
-
-                # 屏蔽圆柱区域内的三角形
-                mask = []
-                for tri_idx in triang.triangles:
-                    # 计算三角形重心
-                    xc = x[tri_idx].mean()
-                    yc = y[tri_idx].mean()
-                    # 判断重心是否在圆柱内
-                    if ((xc - center_x)**2 + (yc - center_y)**2) < radius**2:
-                        mask.append(True)
-                    else:
-                        mask.append(False)
-                triang.set_mask(mask)
+                triang = masked_triangulation(x, y, center_x, center_y, radius)
 
                 cf = plt.tripcolor(triang, self.u[:,i], cmap='rainbow', vmin=0 if i < 2 else -0.6, vmax=4 if i == 0 else 1.3 if i == 1 else 0.6)
 
@@ -100,8 +116,7 @@ class Vis():
 
     def figure_3d(self):
         self.figure_desti = self.file_densti + '/Figure/'
-        if not os.path.exists(self.figure_desti):
-            os.mkdir(self.figure_desti)
+        os.makedirs(self.figure_desti, exist_ok=True)
         
         for i in range(len(self.u.T)):
             print(f"Drawing {self.ques_name} {self.module_name} figure {i+1}...")
@@ -122,13 +137,15 @@ class Vis():
 
     def para_vis(self):
         self.para_desti = self.file_densti + '/Parameters/'
-        df = pd.read_csv(self.para_desti + self.ques_name + '_' + str(self.ini_num) + '_paras_' + self.module_name + '.csv').values
-        header = pd.read_csv(self.para_desti + self.ques_name + '_' + str(self.ini_num) + '_paras_' + self.module_name + '.csv',  nrows=0).columns
+        # 待定参数与损失记录在同一个日志中
+        df, header = LossLog.table(self.file_densti + '/Loss/' + self.ques_name + '_' + str(self.ini_num) + '_loss_' + self.module_name + '.bin',
+                                   self.para_desti + self.ques_name + '_' + str(self.ini_num) + '_paras_' + self.module_name + '.csv', parameters=True)
 
         iter = np.arange(0, len(df[:,0]), 1)
 
         for j in range (len(header)-1):
-            plt.plot(iter , df[:,j+1])
+            # 每条曲线降采样到几千个点，图片不变
+            plt.plot(*Downsample.min_max(iter, df[:,j+1]))
             # plt.plot(df[:,0],df[:,j+1])
             # plt.yscale('log')
             font = {'family': 'Times New Roman', 'weight': 'normal', 'size': 16}
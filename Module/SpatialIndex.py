@@ -0,0 +1,54 @@
+# coding = utf-8
+import itertools
+import torch
+
+
+def close_any(points, targets, atol: float = 1e-8, rtol: float = 1e-5):
+    '''
+    判断points的每一行是否与targets中任意一行逐元素接近（与torch.isclose(points, target)的判据相同）
+    For every row of points, whether it is close to any row of targets, with the criterion of
+    torch.isclose(points, target, rtol, atol), i.e. |p - t| <= atol + rtol * |t| in every coordinate.
+
+    用哈希网格代替两两比较：网格边长不小于最大容差，接近的两点一定落在相同或相邻的格子里，
+    只对这些候选点对做精确比较，复杂度约为 O((N + M) log(N + M))
+    Uses a hashed grid instead of the all-pairs comparison: with the cell size at least the largest
+    tolerance, close points always fall in the same or neighbouring cells, so only those candidate
+    pairs are compared exactly. Cost is about O((N + M) log(N + M)) instead of O(N * M).
+
+    points: [N, D]，targets: [M, D]，返回 [N] 的bool张量
+    '''
+    points = points.detach()
+    targets = targets.detach().to(points.device, points.dtype)
+    mask = torch.zeros(points.shape[0], dtype=torch.bool, device=points.device)
+    if points.shape[0] == 0 or targets.shape[0] == 0:
+        return mask
+
+    # 边长取最大容差的两倍，避免舍入误差使接近的两点相隔两个格子
+    cell = 2 * (atol + rtol * targets.abs().max().item())
+    point_cells = torch.floor(points / cell).long()
+    target_cells = torch.floor(targets / cell).long()
+
+    # 每个目标点查询自身及相邻的 3^D 个格子
+    offsets = torch.tensor(list(itertools.product([-1, 0, 1], repeat=points.shape[1])), device=points.device)
+    query_cells = (target_cells.unsqueeze(1) + offsets.unsqueeze(0)).reshape([-1, points.shape[1]])
+    query_target = torch.arange(targets.shape[0], device=points.device).repeat_interleave(len(offsets))
+
+    # 格子坐标统一编号后排序，按编号二分查找每个查询格子中的点
+    cell_id = torch.unique(torch.cat([point_cells, query_cells], dim=0), dim=0, return_inverse=True)[1]
+    point_id, query_id = cell_id[:points.shape[0]], cell_id[points.shape[0]:]
+    point_id, order = torch.sort(point_id)
+    start = torch.searchsorted(point_id, query_id, right=False)
+    count = torch.searchsorted(point_id, query_id, right=True) - start
+
+    # 展开候选点对 (点, 目标)
+    pair_num = int(count.sum().item())
+    if pair_num == 0:
+        return mask
+    pair_query = torch.repeat_interleave(torch.arange(len(count), device=points.device), count)
+    pair_rank = torch.arange(pair_num, device=points.device) - torch.repeat_interleave(torch.cumsum(count, 0) - count, count)
+    pair_point = order[start[pair_query] + pair_rank]
+    pair_target = query_target[pair_query]
+
+    close = torch.all(torch.isclose(points[pair_point], targets[pair_target], rtol=rtol, atol=atol), dim=1)
+    mask[pair_point[close]] = True
+    return mask
@@ -0,0 +1,178 @@
+# coding = utf-8
+import os
+import sys
+import string
+import numpy as np
+import torch
+import torch.nn as nn
+import torch.nn.functional as F
+
+
+def cluster(values, max_distance: float = 0.1, zero_tol: float = 0.):
+    '''
+    对一个参数张量的绝对值做层次聚类（ward），与pic_Parameter.ipynb中的方法相同，并记录符号
+    Ward hierarchical clustering of |values| as in pic_Parameter.ipynb, keeping the signs.
+
+    返回(聚类中心 [K], 每个元素的聚类下标, 符号)；中心小于zero_tol的聚类视为0（剪掉）
+    Returns (centres [K], cluster index per element, sign per element); clusters whose centre is
+    below zero_tol are treated as zero and pruned.
+    '''
+    from scipy.cluster.hierarchy import linkage, fcluster
+
+    flat = values.reshape(-1)
+    abs_values = np.abs(flat).reshape([-1, 1])
+    if len(abs_values) < 2:
+        labels = np.ones(len(flat), dtype=int)
+    else:
+        labels = fcluster(linkage(abs_values, method='ward'), max_distance, criterion='distance')
+
+    # 按中心从大到小编号，A为最大的中心
+    centers = np.array([abs_values[labels == label].mean() for label in np.unique(labels)])
+    order = np.argsort(-centers)
+    rank = {label: i for i, label in enumerate(np.unique(labels)[order])}
+    index = np.array([rank[label] for label in labels])
+    centers = centers[order]
+
+    sign = np.sign(flat)
+    sign[centers[index] < zero_tol] = 0
+    return centers, index.reshape(values.shape), sign.reshape(values.shape)
+
+
+def symbolize(index, sign):
+    # 字母代号矩阵，例如 [['-A', 'B'], ...]
+    letters = string.ascii_uppercase + string.ascii_lowercase
+    return np.array([('' if s > 0 else '-') + (letters[i] if i < len(letters) else f'C{i}') if s != 0 else '0'
+                     for i, s in zip(index.reshape(-1), sign.reshape(-1))]).reshape(index.shape)
+
+
+class TiedNet(nn.Module):
+    '''
+    权重共享的网络：每层的权重和偏置由少量可训练的聚类中心与固定的符号模式组合而成
+    Weight-tied network: every weight and bias is sign * one of a few trainable cluster centres.
+    layer k computes  W_k = sum_c centre_c * S_c,  where S_c in {-1, 0, 1} marks where centre c
+    appears (with its sign); the forward is one matmul per layer with tanh in between, like PINN.
+
+    structure: [{'weight': (中心列表, 下标矩阵, 符号矩阵), 'bias': (...) 或 None}, ...]
+    '''
+    def __init__(self, structure):
+        super(TiedNet, self).__init__()
+        self.depth = len(structure)
+
+        for k, layer in enumerate(structure):
+            for kind in ['weight', 'bias']:
+                if layer.get(kind) is None:
+                    continue
+                centers, index, sign = layer[kind]
+                index, sign = torch.tensor(index), torch.tensor(sign, dtype=torch.float)
+                # 符号模式 [K, ...]：第c个模式在使用中心c的位置为对应的符号
+                pattern = torch.stack([sign * (index == c) for c in range(len(centers))])
+                self.register_buffer(f'{kind}_pattern_{k}', pattern)
+                self.register_parameter(f'{kind}_center_{k}', nn.Parameter(torch.tensor(centers, dtype=torch.float)))
+
+        self.iter = 0
+
+    def layer(self, k, kind):
+        if not hasattr(self, f'{kind}_center_{k}'):
+            return None
+        return torch.tensordot(getattr(self, f'{kind}_center_{k}'), getattr(self, f'{kind}_pattern_{k}'), dims=1)
+
+    def forward(self, input):
+        u = input
+        for k in range(self.depth):
+            u = F.linear(u, self.layer(k, 'weight'), self.layer(k, 'bias'))
+            if k < self.depth - 1:
+                u = torch.tanh(u)
+        return u
+
+
+def extract(state_dict, max_distance: float = 0.1, zero_tol: float = 0.):
+    '''
+    将PINN学生网络的state_dict（layers.layer_k.weight/bias）按层聚类，返回TiedNet的结构描述
+    Cluster every weight and bias of a PINN student state_dict into a TiedNet structure description.
+    '''
+    structure = []
+    k = 0
+    while f'layers.layer_{k}.weight' in state_dict:
+        layer = {}
+        for kind in ['weight', 'bias']:
+            name = f'layers.layer_{k}.{kind}'
+            if name in state_dict:
+                centers, index, sign = cluster(state_dict[name].detach().cpu().numpy().astype(np.float64), max_distance, zero_tol)
+                layer[kind] = ([float(c) for c in centers], index.tolist(), sign.astype(int).tolist())
+        structure.append(layer)
+        k += 1
+    if not structure:
+        raise ValueError('The state_dict has no layers.layer_k parameters; a PINN student checkpoint is expected.')
+    return structure
+
+
+def write_module(structure, module_name, source=''):
+    '''
+    生成 Module/<module_name>.py，Config的model中写入该名称即可直接训练
+    Write Module/<module_name>.py holding the structure; put module_name in a Config model field to train it.
+    '''
+    file_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), f'{module_name}.py')
+    with open(file_path, 'w', encoding='utf-8') as file:
+        file.write('# coding = utf-8\n')
+        file.write(f'# 由 Module/StructureExtract.py 自动生成 / generated by Module/StructureExtract.py from {source}\n')
+        file.write('import Module.StructureExtract as StructureExtract\n\n')
+        file.write(f'structure = {structure!r}\n\n\n')
+        file.write('class Net(StructureExtract.TiedNet):\n')
+        file.write('    # 与其他Psi-NN模块的接口一致，结构已经固定，node_num和output_num不再使用\n')
+        file.write('    def __init__(self, node_num: int = 0, output_num: int = 1):\n')
+        file.write('        super(Net, self).__init__(structure)\n')
+    return file_path
+
+
+def report(structure, state_dict):
+    # 打印每层的字母代号矩阵和聚类中心，并统计参数数量
+    for k, layer in enumerate(structure):
+        for kind, (centers, index, sign) in layer.items():
+            print(f'Layer: layers.layer_{k}.{kind}')
+            print('Symbolized Weights Matrix:')
+            print(symbolize(np.array(index), np.array(sign)))
+            print('Cluster Mapping (Letter -> Center):')
+            for letter, center in zip(symbolize(np.arange(len(centers)), np.ones(len(centers))), centers):
+                print(f'{letter}: {center}')
+    original_num = sum(value.numel() for name, value in state_dict.items() if name.startswith('layers.'))
+    tied_num = sum(len(centers) for layer in structure for centers, _, _ in layer.values())
+    print(f'Unique parameters: {tied_num} (student: {original_num})')
+    return original_num, tied_num
+
+
+def run(ques_name, ini_num, model_name='PINN', step=None, module_name=None, max_distance: float = 0.1, zero_tol: float = 0.):
+    '''
+    读取model_save(mode='student')保存的学生网络，聚类并生成权重共享的网络模块，返回(模块路径, 与学生网络输出的最大误差)
+    Load the student checkpoint saved by model_save(mode='student'), cluster it and generate the
+    weight-tied module. Returns (module path, max deviation from the student on the collocation grid).
+    '''
+    import Module.Training as Training
+    import Module.PINN as PINN
+
+    suffix = '' if step is None else f'_step_{step}'
+    file_path = f'./Results/{ques_name}_{ini_num}/Models/{ques_name}_{ini_num}_{model_name}_student{suffix}.pth'
+    state_dict = torch.load(file_path, map_location='cpu')
+
+    structure = extract(state_dict, max_distance, zero_tol)
+    report(structure, state_dict)
+
+    module_name = f'PsiNN_auto_{ques_name}' if module_name is None else module_name
+    module_path = write_module(structure, module_name, file_path)
+
+    # 在计算场上比较聚类后的网络与学生网络
+    task = Training.model(ques_name, ini_num)
+    task.mesh_init()
+    layers = [state_dict['layers.layer_0.weight'].shape[1]] + [state_dict[f'layers.layer_{k}.weight'].shape[0] for k in range(len(structure))]
+    student = PINN.Net(layers)
+    student.load_state_dict(state_dict)
+    with torch.no_grad():
+        input = torch.cat([task.x, task.y], dim=1).detach().cpu()
+        error = (TiedNet(structure)(input) - student(input)).abs().max().item()
+    print(f'Written {module_path}, max deviation from the student: {error:.3e}')
+    return module_path, error
+
+
+if __name__ == '__main__':
+    # 用法 / usage: python -m Module.StructureExtract Burgers_inv_distill EXP [model_name] [max_distance]
+    run(sys.argv[1], sys.argv[2], sys.argv[3] if len(sys.argv) > 3 else 'PINN',
+        max_distance=float(sys.argv[4]) if len(sys.argv) > 4 else 0.1)
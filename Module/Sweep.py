@@ -0,0 +1,178 @@
+# coding = utf-8
+import os
+import io
+import csv
+import sys
+import json
+import hashlib
+import itertools
+import pandas as pd
+import Module.Config as Config
+import Module.Runner as Runner
+
+
+def config_rows(ques_name, ini_num):
+    with open(f'./Config/{ques_name}_{ini_num}.csv', newline='', encoding='utf-8') as file:
+        return list(csv.reader(file))
+
+
+def config_apply(rows, values: dict):
+    '''
+    在基础Config上修改若干项，其余内容（包括注释）保持不变，基础Config中没有的项追加在末尾
+    Return a copy of the base Config rows with the given keys replaced, keeping comments; keys
+    missing from the base are appended.
+    '''
+    rows = [list(row) for row in rows]
+    remain = dict(values)
+    for row in rows:
+        if row and row[0].strip() in remain:
+            row[1] = str(remain.pop(row[0].strip()))
+    rows += [[key, str(value)] for key, value in remain.items()]
+    return rows
+
+
+def normalize(value):
+    # 数值按float比较（1e-3与0.001相同），其余按去掉首尾空白的字符串
+    value = str(value).strip()
+    try:
+        return repr(float(value))
+    except ValueError:
+        return value
+
+
+def config_digest(rows):
+    '''
+    写出的完整Config的哈希，只取键和规范化后的值（与Config.load相同：空行跳过，同名的键以后出现的为准）
+    Hash of a full written Config: only keys and normalized values count, read as Config.load
+    does (blank rows skipped, a repeated key keeps its last value), so comments do not matter.
+    '''
+    items = {}
+    for row in rows:
+        if not row or not any(row):
+            continue
+        items[row[0]] = normalize(row[1]) if len(row) > 1 and row[1] != '' else 'nan'
+    return hashlib.sha1(json.dumps(sorted(items.items())).encode()).hexdigest()[:8]
+
+
+def config_write(rows, ques_name, ini_num):
+    # 写为Config/Sweep/中的新Config（由Config.path找到）
+    buffer = io.StringIO()
+    csv.writer(buffer, lineterminator='\n').writerows(rows)
+    os.makedirs(Config.sweep_folder, exist_ok=True)
+    with open(f'{Config.sweep_folder}{ques_name}_{ini_num}.csv', 'w', encoding='utf-8') as file:
+        file.write(buffer.getvalue())
+
+
+def matrix(ques_name, ini_num, spec: dict, base_rows=None):
+    '''
+    由扫描设置生成全部运行，返回[(编号, 取值, Config行)]
+    Expand a sweep spec {key: [values]} into the run matrix [(ini_num, values, config rows)]
+    over the full grid.
+
+    每次运行的编号由基础编号和完整Config（基础Config加上取值，数值规范化后）的哈希组成：取值写法不同但相同的运行只保留一个，
+    基础Config改动后编号随之改变，之前的结果不会被当作已经完成
+    Each run is named <ini_num>_<hash of its full Config>, base plus overrides with numbers
+    normalized, so runs that differ only in how a value is written collapse into one, and editing
+    the base Config gives new names instead of reusing stale results.
+    '''
+    if base_rows is None:
+        base_rows = config_rows(ques_name, ini_num)
+    keys = list(spec)
+    runs = {}
+    for combination in itertools.product(*[spec[key] for key in keys]):
+        values = {key: str(value) for key, value in zip(keys, combination)}
+        rows = config_apply(base_rows, values)
+        runs.setdefault(f'{ini_num}_{config_digest(rows)}', (values, rows))
+    return [(run_num, values, rows) for run_num, (values, rows) in runs.items()]
+
+
+def finished(ques_name, ini_num, model_names):
+    # Clock time.csv中每个模型都有记录即认为已经完成
+    file_path = f'./Results/{ques_name}_{ini_num}/Clock time.csv'
+    if not os.path.isfile(file_path):
+        return False
+    return set(model_names) <= set(pd.read_csv(file_path)['Module'].astype(str))
+
+
+def last_row(file_path):
+    return pd.read_csv(file_path).iloc[-1] if os.path.isfile(file_path) else None
+
+
+def run_models(values, model_names):
+    # 扫描model时每次运行使用自己的模型列表
+    return values['model'].split(' ') if 'model' in values else model_names
+
+
+def summary(ques_name, runs, model_names):
+    '''
+    收集每次运行每个模型的最终损失、训练时间和识别出的待定参数
+    Collect the final losses, training times and identified inverse parameters of every run and model.
+    '''
+    rows = []
+    for ini_num, values, _ in runs:
+        save_desti = f'./Results/{ques_name}_{ini_num}/'
+        clock = pd.read_csv(save_desti + 'Clock time.csv') if os.path.isfile(save_desti + 'Clock time.csv') else None
+        for model_name in run_models(values, model_names):
+            row = {'Question': ques_name, 'Number': ini_num, 'Module': model_name, **values}
+
+            loss = last_row(f'{save_desti}Loss/{ques_name}_{ini_num}_loss_{model_name}.csv')
+            row['Final loss'] = loss['loss'] if loss is not None else float('nan')
+            loss_student = last_row(f'{save_desti}Loss/{ques_name}_{ini_num}_loss_{model_name}_student.csv')
+            if loss_student is not None:
+                row['Final student loss'] = loss_student['loss']
+
+            if clock is not None and (clock['Module'].astype(str) == model_name).any():
+                time_row = clock[clock['Module'].astype(str) == model_name].iloc[-1]
+                row['Training Time'] = time_row['Training Time']
+                row['Student Training Time'] = time_row['Student Training Time']
+
+            para = last_row(f'{save_desti}Parameters/{ques_name}_{ini_num}_paras_{model_name}.csv')
+            if para is not None:
+                row.update({key: value for key, value in para.items() if key != 'iter'})
+            rows.append(row)
+    return pd.DataFrame(rows)
+
+
+def sweep(ques_name, ini_num, spec: dict, worker_num=None, rerun: bool = False):
+    '''
+    在基础Config Config/<ques_name>_<ini_num>.csv 上按spec扫描超参数，并行运行后汇总到
+    Results/Sweep_<ques_name>_<ini_num>.csv
+    Sweep the hyperparameters in spec over the base Config. Runs go through Runner in parallel and
+    the summary table is written to Results/Sweep_<ques_name>_<ini_num>.csv.
+
+    spec: {'learning_rate': ['1e-3', '1e-4'], 'node_num': [10, 20], 'para_ctrl': ['0.01', '0.02']}
+    rerun=False 时已经完成的运行（例如之前扫描过的相同取值）不再重复计算
+    With rerun=False, runs already finished (e.g. by an earlier sweep with the same values) are skipped.
+    '''
+    base_rows = config_rows(ques_name, ini_num)
+    model_names = [row[1] for row in base_rows if row and row[0].strip() == 'model'][0].split(' ')
+
+    runs = matrix(ques_name, ini_num, spec, base_rows)
+    tasks = []
+    for run_num, values, rows in runs:
+        config_write(rows, ques_name, run_num)
+        if rerun or not finished(ques_name, run_num, run_models(values, model_names)):
+            tasks.append((ques_name, run_num))
+    print(f'Sweep {ques_name}_{ini_num}: {len(runs)} runs, {len(tasks)} to compute.')
+
+    # 失败的运行在汇总表中为空值，汇总之后再抛出
+    error = None
+    if tasks:
+        try:
+            Runner.run(tasks, worker_num)
+        except RuntimeError as run_error:
+            error = run_error
+
+    df_summary = summary(ques_name, runs, model_names)
+    os.makedirs('./Results/', exist_ok=True)
+    df_summary.to_csv(f'./Results/Sweep_{ques_name}_{ini_num}.csv', index=False)
+    if error is not None:
+        raise error
+    return df_summary
+
+
+if __name__ == '__main__':
+    # 用法 / usage: python -m Module.Sweep Burgers_inv EXP spec.json [worker_num]
+    # spec.json: {"learning_rate": ["1e-3", "1e-4"], "node_num": [10, 20]}
+    with open(sys.argv[3]) as spec_file:
+        sweep(sys.argv[1], sys.argv[2], json.load(spec_file), int(sys.argv[4]) if len(sys.argv) > 4 else None)
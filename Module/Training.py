@@ -2,22 +2,39 @@
 import numpy as np
 import torch
 import torch.optim as optim
-import pandas as pd
 import os
 import importlib
 import time
 import itertools
+import Module.Config as Config
 import Module.PINN as PINN
-import Module.SingleVis as SingleVis
-import Module.GroupVis as GroupVis
-
-torch.manual_seed(1234)  # 设置随机种子
+import Module.DataCache as DataCache
+import Module.Derivative as Derivative
+import Module.Problem as Problem
+import Module.Sampler as Sampler
+import Module.LossBuffer as LossBuffer
+import Module.LossLog as LossLog
+import Module.Checkpoint as Checkpoint
+import Module.SpatialIndex as SpatialIndex
+import Module.Render as Render
+import Module.Profile as Profile
+
+# 随机种子和设备在第一次创建model时才确定，导入本模块没有副作用
+# The seed and the device are settled when the first model is created, so importing has no side effects.
+device = None
+
+
+def device_init():
+    global device
+    if device is None:
+        torch.manual_seed(1234)  # 设置随机种子
+        if torch.cuda.is_available():
+            device = torch.device('cuda')
+            print("GPU is available")
+        else:
+            device = torch.device('cpu')
+    return device
 
-if torch.cuda.is_available():
-    device = torch.device('cuda')
-    print("GPU is available")
-else:
-    device = torch.device('cpu')
 
 class model():
     def __init__(self, ques_name, ini_num) :
@@ -26,30 +43,16 @@ class model():
         self.ques_name = ques_name
         self.ini_num = ini_num
 
-        self.ini_file_path = f'./Config/{ques_name}_{ini_num}.csv'
-
-        data = pd.read_csv(self.ini_file_path, header=None, names=['key', 'value'], usecols=[0, 1]) 
-
-        self.model_ini_dict = {}
-        for index, row in data.iterrows():
-            key = row['key']
-            value = row['value']
+        self.ini_file_path = Config.path(ques_name, ini_num)
+        device_init()
 
-            # 含有min/max的一般是函数值，要变为float方便计算
-            if 'min' in key or 'max' in key:    
-                self.model_ini_dict[key] = float(value)
+        # 键名含有min/max的为float，含有num/state的为int，其余为字符串（见Config.load）
+        self.model_ini_dict = Config.load(self.ini_file_path)
 
-            # 含有num的一般是某某数量
-            elif 'num' in key or 'state' in key:  
-                self.model_ini_dict[key] = int(value)
-
-            # 含有state的为int值，反正可以判断真假   
-            elif 'state' in key:
-                self.model_ini_dict[key] = int(value)
-
-            # 默认是字符串
-            else:   
-                self.model_ini_dict[key] = str(value)        
+        # 根据问题名称一次性确定问题定义（方程、边界、参考解），之后不再做名称判断
+        self.problem = Problem.resolve(self.ques_name)
+        for key, value in self.problem.defaults.items():
+            self.model_ini_dict.setdefault(key, value)
 
         # 是否记录每步
         self.pace_record_state = self.model_ini_dict['pace_record_state']
@@ -87,6 +90,11 @@ class model():
         self.para_ctrl_add = int(self.model_ini_dict['para_ctrl_add']) if 'para_ctrl_add' in self.model_ini_dict else False
         # 如果追加输入，则添加参数数量
         self.input_num = self.coord_num + self.para_ctrl_num if self.para_ctrl_add else self.coord_num
+        # 参数化模式下一次前向的最大行数（配点数 × 参数组合数），超过时按参数组合分块
+        self.para_chunk_num = int(self.model_ini_dict['para_chunk_num']) if 'para_chunk_num' in self.model_ini_dict else 200000
+        # 参数化模式下当前批次逐行的参数 [N, para_ctrl_num]，以及边界计算时的参数组合下标
+        self.para_ctrl_batch = None
+        self.para_ctrl_current = None
 
         # 读取隐藏层的节点组数
         self.hidden_layers_group = list(map(float, self.model_ini_dict['hidden_layers_group'].split(',')))
@@ -174,10 +182,68 @@ class model():
 
 
         # 这里表示要不要加流动中的p值参数，默认是加
-        if 'Flow' in self.ques_name:
-            self.flow_p_add = int(self.model_ini_dict['flow_p_add']) if 'flow_p_add' in self.model_ini_dict else 1
-            self.cylinder_weight = float(self.model_ini_dict['cylinder_weight']) if 'cylinder_weight' in self.model_ini_dict else 1
-            self.bcs_weight = float(self.model_ini_dict['bcs_weight']) if 'bcs_weight' in self.model_ini_dict else 1
+        self.flow_p_add = int(self.model_ini_dict['flow_p_add']) if 'flow_p_add' in self.model_ini_dict else 1
+        self.cylinder_weight = float(self.model_ini_dict['cylinder_weight']) if 'cylinder_weight' in self.model_ini_dict else 1
+        # 边界损失在反传时的权重
+        self.bcs_weight = float(self.model_ini_dict['bcs_weight']) if 'bcs_weight' in self.model_ini_dict else 1
+
+        # 配点小批量采样，batch_node_num为0时每步使用全部配点
+        self.batch_node_num = int(self.model_ini_dict['batch_node_num']) if 'batch_node_num' in self.model_ini_dict else 0
+        # 候选池的单边节点数，可以比grid_node_num更密
+        self.candidate_node_num = int(self.model_ini_dict['candidate_node_num']) if 'candidate_node_num' in self.model_ini_dict else self.grid_node_num
+        # 每隔多少步按残差重新计算采样概率，0表示始终均匀采样
+        self.resample_gap = int(self.model_ini_dict['resample_gap']) if 'resample_gap' in self.model_ini_dict else 0
+        self.resample_k = float(self.model_ini_dict['resample_k']) if 'resample_k' in self.model_ini_dict else 1.
+        self.resample_c = float(self.model_ini_dict['resample_c']) if 'resample_c' in self.model_ini_dict else 1.
+
+        # 是否用torch.compile编译训练步
+        self.compile_state = int(self.model_ini_dict['compile_state']) if 'compile_state' in self.model_ini_dict else 0
+        self.compile_check()
+
+        # Adam之后L-BFGS阶段的步数，0表示不使用
+        self.lbfgs_steps = int(self.model_ini_dict['lbfgs_steps']) if 'lbfgs_steps' in self.model_ini_dict else 0
+        self.lbfgs_lr = float(self.model_ini_dict['lbfgs_lr']) if 'lbfgs_lr' in self.model_ini_dict else 1.
+        # 收敛容差，同时用于梯度和损失变化
+        self.lbfgs_tolerance = float(self.model_ini_dict['lbfgs_tolerance']) if 'lbfgs_tolerance' in self.model_ini_dict else 1e-9
+        self.lbfgs_history_num = int(self.model_ini_dict['lbfgs_history_num']) if 'lbfgs_history_num' in self.model_ini_dict else 50
+        # 每步线搜索最多的函数评估次数
+        self.lbfgs_eval_num = int(self.model_ini_dict['lbfgs_eval_num']) if 'lbfgs_eval_num' in self.model_ini_dict else 25
+
+        # 每隔多少步在后台保存一次可续算的完整检查点，0表示不保存
+        self.checkpoint_gap = int(self.model_ini_dict['checkpoint_gap']) if 'checkpoint_gap' in self.model_ini_dict else 0
+        # 是否从checkpoint_gap保存的检查点续算
+        self.resume_state = self.model_ini_dict['resume_state'] if 'resume_state' in self.model_ini_dict else 0
+
+        # Database中的数据转换为张量后缓存在这里，每次迭代直接复用
+        self.data_tensors = {}
+
+        # Config在一次运行中不变，只在第一次保存时复制
+        self.config_saved = False
+
+        # 学生网络阶段每隔多少步重新计算一次教师输出，0表示每个阶段只算一次
+        self.teacher_refresh_gap = int(self.model_ini_dict['teacher_refresh_gap']) if 'teacher_refresh_gap' in self.model_ini_dict else 0
+        self.teacher_cache = None
+
+        # net_teach中去掉观测点后保留的行号，(计算场x, 观测点, 行号)
+        self.teach_index = None
+
+        # 检查点在后台线程中写入
+        self.checkpoint_writer = Checkpoint.Writer()
+        self.resume_point = None
+        self.resume_lbfgs = None
+
+        # 绘图进程数，0表示在训练进程中直接绘图；大于0时图片在后台进程池中绘制，训练结束后直接返回
+        self.render_worker_num = int(self.model_ini_dict['render_worker_num']) if 'render_worker_num' in self.model_ini_dict else 0
+
+        # 分阶段计时，结果写入Loss文件夹；trace_steps > 0时在trace_start步之后用torch.profiler记录trace_steps步，写入Profile文件夹
+        self.profile_state = self.model_ini_dict['profile_state'] if 'profile_state' in self.model_ini_dict else 0
+        self.trace_start = int(self.model_ini_dict['trace_start']) if 'trace_start' in self.model_ini_dict else 10
+        self.trace_steps = int(self.model_ini_dict['trace_steps']) if 'trace_steps' in self.model_ini_dict else 0
+        self.profiler = Profile.Profiler()
+
+        # 省内存模式：反传后不保留计算图，残差按lean_chunk_num个配点分块计算并逐块反传，同一时刻只有一块的高阶导数图
+        self.lean_state = self.model_ini_dict['lean_state'] if 'lean_state' in self.model_ini_dict else 0
+        self.lean_chunk_num = int(self.model_ini_dict['lean_chunk_num']) if 'lean_chunk_num' in self.model_ini_dict else 8192
 
 
     # 这里定义一下计算场
@@ -191,21 +257,9 @@ class model():
             self.y = torch.tensor(self.y,requires_grad=True).float().to(device).reshape([-1,1])
             self.z = torch.tensor(self.z,requires_grad=True).float().to(device).reshape([-1,1])
         
-        elif 'Flow' in self.ques_name:
-            # 流动问题的计算点就是flow
-            fluid_data = pd.read_csv(f'./Database/flow/fluid_data.csv').values
-            self.x = torch.tensor(fluid_data[:,0], requires_grad=True).float().to(device).reshape([-1,1])
-            self.y = torch.tensor(fluid_data[:,1], requires_grad=True).float().to(device).reshape([-1,1])
-            # y值需要减少 0.2以对齐坐标轴
-            # in order to align the coordinate axis, we need to subtract 0.2 from the y values
-            self.y -= 0.2
-
-        else:   
-            self.x = torch.linspace(self.x_min, self.x_max, self.grid_node_num, requires_grad=True).float().to(device)
-            self.y = torch.linspace(self.y_min, self.y_max, self.grid_node_num, requires_grad=True).float().to(device)
-            self.x, self.y = torch.meshgrid(self.x, self.y, indexing='ij')
-            self.x = self.x.reshape([-1, 1])
-            self.y = self.y.reshape([-1, 1])
+        else:
+            # 配点由问题定义给出，流动问题的计算点就是fluid_data
+            self.x, self.y = self.problem.collocation(self, device)
 
             # 实际上，这里只需要把网格点算出来后，在他们前面加入一个维度就行了，这里给出所有可能的参数组合
             if self.para_ctrl_add:
@@ -214,24 +268,35 @@ class model():
 
                 # 将每个组合转换为torch.Tensor
                 self.para_ctrl_tensors = [torch.tensor(combination, dtype=torch.float).to(device) for combination in combinations]
+                # 全部组合堆叠为 [组合数, para_ctrl_num]
+                self.para_ctrl_grid = torch.stack(self.para_ctrl_tensors)
+
+        # 小批量采样时，从候选池中按残差自适应抽取配点
+        self.sampler = None
+        if self.batch_node_num and self.coord_num == 2:
+            x_pool, y_pool = self.problem.collocation(self, device, self.candidate_node_num)
+            self.sampler = Sampler.Sampler(x_pool, y_pool, self.batch_node_num, self.resample_gap, self.resample_k, self.resample_c)
+
+    # 读取Database中的数据并转换为device上的张量，每个文件在一次运行中只读取一次
+    def data_load(self, name):
+        if name in self.data_tensors:
+            return self.data_tensors[name]
+
+        if name == 'fluid':
+            fluid_data = DataCache.read_csv(f'./Database/flow/fluid_data.csv')
+            # 缓存的坐标不保留梯度，求导时在net_f中取新的叶子，避免反传在其.grad上累加
+            x = torch.tensor(fluid_data[:,0:1], dtype=torch.float32, device=device)
+            # y值需要减少 0.2以对齐坐标轴
+            # in order to align the coordinate axis, we need to subtract 0.2 from the y values
+            y = torch.tensor(fluid_data[:,1:2]).float().to(device) - 0.2
+            tensors = (x, y)
+
+        elif name == 'flow_boundary':
+            cylinder_data = DataCache.read_csv(f'./Database/flow/cylinder_data.csv')
+            inlet_data = DataCache.read_csv(f'./Database/flow/inlet_data.csv')
+            outlet_data = DataCache.read_csv(f'./Database/flow/outlet_data.csv')
+            wall_data = DataCache.read_csv(f'./Database/flow/wall_data.csv')
 
-    # 边界条件损失
-    def net_b(self):    
-        loss_b = torch.tensor(0.).to(device)
-
-        # 流动的边界条件
-        if 'Flow' in self.ques_name:
-            # 首先读取边界数据，x,y,p,u,v排列的
-            cylinder_data = pd.read_csv(f'./Database/flow/cylinder_data.csv').values
-            inlet_data = pd.read_csv(f'./Database/flow/inlet_data.csv').values
-            outlet_data = pd.read_csv(f'./Database/flow/outlet_data.csv').values
-            wall_data = pd.read_csv(f'./Database/flow/wall_data.csv').values
-            '''
-            根据边界数据进行计算，约束如下
-            1, 入口速度u 有固定值 v = 0 直接减
-            2， 上下边界，以及壁面速度u=v = 0
-            3， 出口压力p = 0
-            '''
             # 首先把所有的y值减少0.2以对齐坐标轴
             # in order to align the coordinate axis, we need to subtract 0.2 from the y values
             inlet_data[:,1] -= 0.2
@@ -239,179 +304,172 @@ class model():
             outlet_data[:,1] -= 0.2
             cylinder_data[:,1] -= 0.2
 
-            # 入口边界
-            xy_in = torch.tensor(inlet_data[:,0:2], requires_grad=True).float().to(device)
-            uv_in = torch.tensor(inlet_data[:,3:5], requires_grad=True).float().to(device)
-
-            loss_b_in = ((self.net(xy_in)[:, 1:3] - uv_in)**2).mean() # 入口速度u有固定值，v=0
-
-
-            # 圆柱面边界
-            xy_cylinder = torch.tensor(cylinder_data[:,0:2], requires_grad=True).float().to(device)
-
-            loss_b_cylinder_uv = ((self.net(xy_cylinder)[:, 1:3])**2).mean()  # 圆柱面速度为0
-
-            # 加入壁面压力损失项
-            p_cylinder = torch.tensor(cylinder_data[:,2], requires_grad=True).float().to(device)
-            if self.flow_p_add:
-                # 圆柱面压力固定
-                loss_b_cylinder_p = ((self.net(xy_cylinder)[:, 0] - p_cylinder)**2).mean()
-            else:
-                loss_b_cylinder_p = 0
-
-            # 上下边界
-            xy_wall = torch.tensor(wall_data[:,0:2], requires_grad=True).float().to(device)
-            loss_b_wall = ((self.net(xy_wall)[:, 1:3])**2).mean()  # 上下边界速度为0
+            # 所有边界点拼接在一起，按 入口、圆柱、壁面、出口 的顺序，一次前向算完
+            tensors = {
+                'xy_all': torch.tensor(np.vstack([inlet_data[:,0:2], cylinder_data[:,0:2], wall_data[:,0:2], outlet_data[:,0:2]])).float().to(device),
+                'sections': [len(inlet_data), len(cylinder_data), len(wall_data), len(outlet_data)],
+                'uv_in': torch.tensor(inlet_data[:,3:5]).float().to(device),
+                'p_cylinder': torch.tensor(cylinder_data[:,2]).float().to(device),
+                'p_out': torch.tensor(outlet_data[:,2]).float().to(device)
+            }
 
-            # 出口压力
-            xy_out = torch.tensor(outlet_data[:,0:2], requires_grad=True).float().to(device)
-            p_out = torch.tensor(outlet_data[:,2], requires_grad=True).float().to(device)
-            # loss_b_out = ((self.net(xy_out)[:, 0] - p_out)**2).mean()  # 出口压力为0
-            loss_b_out = ((self.net(xy_out)[:, 0])**2).mean()  # 出口压力为0
+        elif name == 'monitor':
+            # 这里采用一个临时的将名称分离的策略
+            ques_name = self.ques_name.split('_')[0]
+
+            # 由于要堆叠，所以这里先把所有文件读进来
+            self.database = np.vstack([DataCache.read_csv(f'./Database/{ques_name}_inv_data_{serial}.csv', header=None) for serial in self.data_serial])
+
+            # 由于这些监督值往往在存储的时候已经是meshgrid之后的状态，所以这里就不再进行meshgrid
+            input_monitor = self.database[:,0:self.input_num].reshape([-1,self.input_num])
+            u_monitor = self.database[:,self.input_num:].reshape([-1,self.output_num])
+            # 不保留梯度，需要对观测点求导的模型在net_d中取新的叶子
+            input_monitor = torch.tensor(input_monitor, dtype=torch.float32, device=device)
+            u_monitor = torch.tensor(u_monitor).float().to(device)
+            tensors = (input_monitor, u_monitor)
+
+        elif name == 'global':
+            self.precise_database = DataCache.read_csv('./Database/'+self.ques_name + '_data.csv')
+            x_monitor = self.precise_database[: , 0:self.coord_num].reshape([-1,self.coord_num])
+            u_monitor = self.precise_database[: , self.coord_num : self.output_num + self.coord_num].reshape([-1,self.output_num])
+            x_monitor = torch.tensor(x_monitor).float().to(device)
+            u_monitor = torch.tensor(u_monitor).float().to(device)
+            tensors = (x_monitor, u_monitor)
 
-            # 圆柱面系数已在Config文件中定义
-            loss_b += loss_b_in + self.cylinder_weight * (loss_b_cylinder_uv + loss_b_cylinder_p) + loss_b_wall + loss_b_out
-            # print(f'Flow boundary loss: {loss_b.item()}')
-            
-            return loss_b, loss_b_in, loss_b_cylinder_uv, loss_b_cylinder_p, loss_b_wall, loss_b_out
         else:
+            raise ValueError(f'Unknown database entry: {name}')
 
-            if 'Poisson' in self.ques_name:
-                self.bun_node_num = 1000
-
-            #x最小,y任意
-            y_b = torch.linspace(self.y_min, self.y_max, self.bun_node_num, requires_grad=True).float().to(device).reshape([-1,1])
-            x_b = torch.full_like(y_b, self.x_min, requires_grad=True).float().to(device).reshape([-1,1])
-            u_b = self.net(torch.cat([x_b, y_b], dim=1))
-
-            # y=最小,x任意
-            x_down = torch.linspace(self.x_min, self.x_max, self.bun_node_num, requires_grad=True).float().to(device).reshape([-1,1])
-            y_down = torch.full_like(x_down, self.y_min, requires_grad=True).float().to(device).reshape([-1,1])
-            u_down = self.net(torch.cat([x_down, y_down], dim=1))
-
-            # y=最大,x任意
-            x_up = torch.linspace(self.x_min, self.x_max, self.bun_node_num, requires_grad=True).float().to(device).reshape([-1,1])
-            y_up = torch.full_like(x_up, self.y_max, requires_grad=True).float().to(device).reshape([-1,1])
-            u_up = self.net(torch.cat([x_up, y_up], dim=1))
-
-            # x最大,y任意
-            y_f = torch.linspace(self.y_min, self.y_max, self.bun_node_num, requires_grad=True).float().to(device).reshape([-1,1])
-            x_f = torch.full_like(y_f, self.x_max, requires_grad=True).float().to(device).reshape([-1,1])
-            u_f = self.net(torch.cat([x_f, y_f], dim=1))
-
-            if 'Burgers' in self.ques_name:
-                u_b_moni = -torch.sin(torch.pi * y_b) # burgers
-                loss_b += torch.mean((u_b - u_b_moni)**2)
-
-                if 'half' in self.ques_name:
-                    # 只算一半，边界条件ydown就是-1
-                    x_down = torch.linspace(self.x_min, self.x_max, self.bun_node_num, requires_grad=True).float().to(device).reshape([-1,1])
-                    y_down = -torch.ones_like(x_down, requires_grad=True).float().to(device).reshape([-1,1])
-                    u_down = self.net(torch.cat([x_down, y_down], dim=1))
-                    
-                u_down_moni = torch.zeros_like(u_down)  #burgers
-                loss_b += torch.mean((u_down - u_down_moni)**2)
-
-                u_up_moni = torch.zeros_like(u_up)  #burgers
-                loss_b += torch.mean((u_up - u_up_moni)**2)
-         #     loss_b += torch.mean((u_up - u_up_moni)**2)
-
-            elif 'Laplace' in self.ques_name:
-                u_b_moni = (x_b**3 - 3*x_b*y_b**2)  #laplace
-                loss_b += torch.mean((u_b - u_b_moni)**2)
-
-                u_down_moni = (x_down**3 - 3*x_down*y_down**2)
-                loss_b += torch.mean((u_down - u_down_moni)**2)
-
-                u_up_moni = (x_up**3 - 3*x_up*y_up**2)
-                loss_b += torch.mean((u_up - u_up_moni)**2)
-
-                u_f_moni = (x_f**3 - 3*x_f*y_f**2)
-                loss_b += torch.mean((u_f - u_f_moni)**2)
-            
-            elif 'Poisson' in self.ques_name:
-                x_total = torch.cat([x_b, x_down, x_up, x_f], dim=0)
-                y_total = torch.cat([y_b, y_down, y_up, y_f], dim=0)
-                u_total = self.net(torch.cat([x_total, y_total], dim=1))
-                loss_b += torch.mean((u_total)**2)
-            
-        return loss_b
-    
-    def net_f(self):
-        
-        loss_f = torch.tensor(0.).to(device)
-        u = self.net(torch.cat([self.x, self.y], dim=1)).to(device)
-
-        # print(f'ques_name: {self.ques_name}')
-        if 'Flow' in self.ques_name:
-
-            rho = 1.0
-            mu = 0.02
+        self.data_tensors[name] = tensors
+        return tensors
 
-            p,u,v = torch.split(u, 1, dim=1)
-            u_x = torch.autograd.grad(u, self.x, grad_outputs=torch.ones_like(u), retain_graph=True, create_graph=True)[0]
-            u_y = torch.autograd.grad(u, self.y, grad_outputs=torch.ones_like(u), retain_graph=True, create_graph=True)[0]
-            u_xx = torch.autograd.grad(u_x, self.x, grad_outputs=torch.ones_like(u_x), retain_graph=True, create_graph=True)[0]
-            u_yy = torch.autograd.grad(u_y, self.y, grad_outputs=torch.ones_like(u_y), retain_graph=True, create_graph=True)[0]
+    # Database文件发生变化后调用，下一次使用时重新读取
+    # Call after the Database files change; the data is re-read on next use
+    def data_invalidate(self):
+        self.data_tensors = {}
+        DataCache.invalidate()
 
-            v_x = torch.autograd.grad(v, self.x, grad_outputs=torch.ones_like(v), retain_graph=True, create_graph=True)[0]
-            v_y = torch.autograd.grad(v, self.y, grad_outputs=torch.ones_like(v), retain_graph=True, create_graph=True)[0]
-            v_xx = torch.autograd.grad(v_x, self.x, grad_outputs=torch.ones_like(v_x), retain_graph=True, create_graph=True)[0]
-            v_yy = torch.autograd.grad(v_y, self.y, grad_outputs=torch.ones_like(v_y), retain_graph=True, create_graph=True)[0]
-
-            p_x = torch.autograd.grad(p, self.x, grad_outputs=torch.ones_like(p), retain_graph=True, create_graph=True)[0]
-            p_y = torch.autograd.grad(p, self.y, grad_outputs=torch.ones_like(p), retain_graph=True, create_graph=True)[0]
+    # 边界条件损失，返回(参与训练的损失, 记录的损失, 各分项)
+    def net_b(self):
+        if not self.para_ctrl_add:
+            return self.problem.boundary(self, device)
+
+        # 参数化模式下边界点较少，逐个参数组合计算后取平均
+        loss_b, loss_b_log, parts = 0, 0, {}
+        for i in range(self.para_ctrl_grid.shape[0]):
+            self.para_ctrl_current = i
+            loss_b_i, loss_b_log_i, parts_i = self.problem.boundary(self, device)
+            loss_b, loss_b_log = loss_b + loss_b_i / self.para_ctrl_grid.shape[0], loss_b_log + loss_b_log_i / self.para_ctrl_grid.shape[0]
+            parts = {key: parts.get(key, 0) + value / self.para_ctrl_grid.shape[0] for key, value in parts_i.items()}
+        self.para_ctrl_current = None
+        return loss_b, loss_b_log, parts
+
+    # 网络在一组坐标点上的输出，参数化模式下追加当前参数组合（见net_b）
+    def net_point(self, xy):
+        if self.para_ctrl_current is None:
+            return self.net(xy)
+        return self.net(torch.cat([xy, self.para_ctrl_grid[self.para_ctrl_current].expand(xy.shape[0], -1)], dim=1))
+
+    # 参数化模式下将坐标展开为 (参数组合 × 配点) 的批次，返回(展开的坐标, 逐行的参数)
+    def para_input(self, coords):
+        para = self.para_ctrl_grid
+        return [coord.repeat(para.shape[0], 1) for coord in coords], para.repeat_interleave(coords[0].shape[0], dim=0)
+
+    # 参数化模式下按para_chunk_num划分 (参数组合 × 配点) 批次的行，返回各块逐行的(参数组合下标, 配点下标)
+    def para_chunks(self, point_num):
+        row_num = self.para_ctrl_grid.shape[0] * point_num
+        rows = [torch.arange(i, min(i + self.para_chunk_num, row_num), device=device) for i in range(0, row_num, self.para_chunk_num)]
+        return [(row // point_num, row % point_num) for row in rows]
+
+    # 参数化模式的方程残差：全部参数组合与配点拼成一个批次一次前向求导。行数超过para_chunk_num时按行分块
+    # （一个参数组合的配点也可以分在几块中），每块算完立即反传并释放计算图（梯度累加），返回的残差不再带计算图
+    def net_f_para(self, x, y):
+        row_num = self.para_ctrl_grid.shape[0] * x.shape[0]
+        chunks = self.para_chunks(x.shape[0]) if row_num > self.para_chunk_num else [(None, None)]
+        loss_f = 0
+        for combination, point in chunks:
+            if point is None:
+                (x_para, y_para), self.para_ctrl_batch = self.para_input([x, y])
+            else:
+                x_para, y_para, self.para_ctrl_batch = x[point], y[point], self.para_ctrl_grid[combination]
+            u = self.net(torch.cat([x_para, y_para, self.para_ctrl_batch], dim=1))
+            d = Derivative.derivatives(u, {'x': x_para, 'y': y_para}, self.problem.derivatives, names=self.problem.channels)
+
+            # 残差是逐行均值之和，各块按行数加权后与整体的结果一致
+            loss_chunk = self.problem.residual(self, x_para, y_para, u, d) * x_para.shape[0] / row_num
+            if len(chunks) > 1 and torch.is_grad_enabled():
+                # 计入backward阶段，不计入外层的net_f和loss
+                with self.profiler.phase('backward', exclusive=True):
+                    loss_chunk.backward()
+                loss_chunk = loss_chunk.detach()
+            loss_f = loss_f + loss_chunk
+        self.para_ctrl_batch = None
+        return loss_f
 
-            # 连续性方程
-            eq0 = u_x + v_y
+    # 默认在全部配点上计算，小批量时传入本步抽取的配点
+    def net_f(self, x=None, y=None):
+        x = self.x if x is None else x
+        y = self.y if y is None else y
 
-            # x方向动量方程
-            eq1 = rho * (u * u_x + v * u_y) + p_x - mu * (u_xx + u_yy)
+        # 不保留梯度的配点（如流动的fluid_data）在这里取可求导的新叶子
+        if not x.requires_grad:
+            x, y = x.detach().requires_grad_(), y.detach().requires_grad_()
 
-            # y方向动量方程
-            eq2 = rho * (u * v_x + v * v_y) + p_y - mu * (v_xx + v_yy)
+        if self.para_ctrl_add:
+            return self.net_f_para(x, y)
 
-            # 方程损失，需要转化为标量
-            loss_f += torch.mean((eq0)**2) + torch.mean((eq1)**2) + torch.mean((eq2)**2)
+        # 编译模式下用前向模式求导，避免torch.compile不支持的二次反传
+        if self.compile_state:
+            xy = torch.cat([x, y], dim=1).detach()
+            u = self.net(xy)
+            d = Derivative.derivatives_forward(self.net, xy, ['x', 'y'], self.problem.derivatives, names=self.problem.channels)
+            return self.problem.residual(self, xy[:, 0:1], xy[:, 1:2], u, d)
 
-            return loss_f
+        if self.lean_state and x.shape[0] > self.lean_chunk_num and torch.is_grad_enabled():
+            return self.net_f_lean(x, y)
 
+        u = self.net(torch.cat([x, y], dim=1)).to(device)
 
-        u_x = torch.autograd.grad(u, self.x, grad_outputs=torch.ones_like(u), retain_graph=True, create_graph=True)[0]    #这就是自动微分的一整个公式，直接照着抄就行了
-        u_xx = torch.autograd.grad(u_x, self.x, grad_outputs=torch.ones_like(u_x), retain_graph=True, create_graph=True)[0]
-        u_y = torch.autograd.grad(u, self.y, grad_outputs=torch.ones_like(u), retain_graph=True, create_graph=True)[0]
-        u_yy = torch.autograd.grad(u_y, self.y, grad_outputs=torch.ones_like(u_y), retain_graph=True, create_graph=True)[0]
-        u_yyy = torch.autograd.grad(u_yy, self.y, grad_outputs=torch.ones_like(u_yy), retain_graph=True, create_graph=True)[0]
+        # 只计算该方程残差需要的导数
+        d = Derivative.derivatives(u, {'x': x, 'y': y}, self.problem.derivatives, names=self.problem.channels)
 
         #方程误差
-        if 'Burgers' in self.ques_name:
-            if 'inv' in self.ques_name:
-                loss_f = torch.mean((u_x + u*u_y - self.para_undetermin[0]* u_yy)**2)
-                # print(loss_f)
-            else:
-                # print(self.para_ctrl_list)
-                loss_f = torch.mean((u_x + u*u_y - self.para_ctrl_list[0][0] / torch.pi * u_yy)**2)
-                # loss_f = torch.mean((u_x + u*u_y - 0.01 / torch.pi * u_yy)**2)
-        
-        elif 'Laplace' in self.ques_name:
-            if 'inv' in self.ques_name:
-                loss_f = torch.mean((u_xx + self.para_undetermin[0] * u_yy)**2)
-            else:
-                loss_f = torch.mean((u_xx + u_yy)**2)
-
-        elif 'Poisson' in self.ques_name:
-            k = torch.arange(1, 5).to(device)
-            f = sum([1/2*((-1)**(k+1))*(k**2) * (torch.sin(k * torch.pi * (self.x)) * torch.sin(k * torch.pi * (self.y))) for k in k])
+        return self.problem.residual(self, x, y, u, d)
+
+    # 省内存模式下分块计算残差，每块算完立即反传并释放其导数图，返回的总残差不再带计算图
+    def net_f_lean(self, x, y):
+        loss_f = 0
+        for i in range(0, x.shape[0], self.lean_chunk_num):
+            x_chunk, y_chunk = x[i:i + self.lean_chunk_num], y[i:i + self.lean_chunk_num]
+            u = self.net(torch.cat([x_chunk, y_chunk], dim=1)).to(device)
+            d = Derivative.derivatives(u, {'x': x_chunk, 'y': y_chunk}, self.problem.derivatives, names=self.problem.channels)
+
+            # 残差是逐点均值之和，各块按点数加权后与整体的结果一致
+            loss_chunk = self.problem.residual(self, x_chunk, y_chunk, u, d) * x_chunk.shape[0] / x.shape[0]
+            # 计入backward阶段，不计入外层的net_f和loss
+            with self.profiler.phase('backward', exclusive=True):
+                loss_chunk.backward()
+            loss_f = loss_f + loss_chunk.detach()
+        return loss_f
 
+    # 反传一步的损失，省内存模式下不保留计算图；残差已在net_f中分块反传时，剩下的项可能不需要梯度
+    def backward(self, loss):
+        if loss.requires_grad:
+            loss.backward(retain_graph=not self.lean_state)
 
-            if 'inv' in self.ques_name:
-                loss_f = torch.mean((u_xx + self.para_undetermin[0] * u_yy - f )**2)
-            else:
-                loss_f = torch.mean((u_xx + u_yy - f)**2)
-        # else:
-        #     raise ValueError('The input ' + self.ques_name + ' is unintegrated or the question name is incorrect. Please check again.')
-        
-        return loss_f
+    # 逐点残差，不参与反传，用于自适应采样
+    def net_f_point(self, x, y):
+        x, y = x.detach().requires_grad_(), y.detach().requires_grad_()
+        if self.para_ctrl_add:
+            # 参数化模式下取各参数组合残差的平均
+            (x_para, y_para), self.para_ctrl_batch = self.para_input([x, y])
+            u = self.net(torch.cat([x_para, y_para, self.para_ctrl_batch], dim=1))
+            d = Derivative.derivatives(u, {'x': x_para, 'y': y_para}, self.problem.derivatives, names=self.problem.channels, create_graph=False)
+            residual = self.problem.residual_point(self, x_para, y_para, u, d).detach()
+            self.para_ctrl_batch = None
+            return residual.reshape([self.para_ctrl_grid.shape[0], -1, 1]).mean(dim=0)
+        u = self.net(torch.cat([x, y], dim=1)).to(device)
+        d = Derivative.derivatives(u, {'x': x, 'y': y}, self.problem.derivatives, names=self.problem.channels, create_graph=False)
+        return self.problem.residual_point(self, x, y, u, d).detach()
         
     def net_rgl(self, mode = 'teacher', object = 'all', reg_type ='l2', weight_rgl = 1e-3):
         loss_rgl = torch.tensor(0.).to(device)
@@ -461,30 +519,16 @@ class model():
 
         loss_global = torch.tensor(0.).to(device)
 
-        if 'Laplace' in self.ques_name:
-            # u = self.net(self.x, self.y).to(device)
-            u = self.net(torch.cat([self.x, self.y], dim=1)).to(device)
-            loss_global += torch.mean((u - (self.x)**3 + 3 * self.x * self.y **2) **2)
+        # 有解析解的直接用参考解监督
+        u_moni = self.problem.reference(self.x, self.y)
 
-        elif 'Poisson' in self.ques_name:
+        if u_moni is not None:
             u = self.net(torch.cat([self.x, self.y], dim=1)).to(device)
-            
-            u_moni = 0.5 / (2*torch.pi**2) * ((torch.sin(torch.pi * (self.x)) * torch.sin(torch.pi * (self.y)))- (2 * torch.sin(2 * torch.pi * (self.x)) * torch.sin(2 * torch.pi * (self.y))) + (3 * torch.sin(3 * torch.pi * (self.x)) * torch.sin(3 * torch.pi * (self.y))) - (4 * torch.sin(4 * torch.pi * (self.x)) * torch.sin(4 * torch.pi * (self.y))))
-            
-            # lf 是low frequency的意思
-            if 'lf' in self.ques_name:
-                # print('lf')
-                u_moni = torch.sin(torch.pi * (self.x)) * torch.sin(torch.pi * (self.y)) + torch.sin(2*torch.pi * (self.x)) * torch.sin(2*torch.pi * (self.y))
-
             loss_global += torch.mean((u_moni - u) ** 2)
 
         else:
             # print(f'Reading precise database for {self.ques_name}: ./Database/{self.ques_name}_data.csv')
-            self.precise_database = pd.read_csv('./Database/'+self.ques_name + '_data.csv').values
-            self.x_monitor = self.precise_database[: , 0:self.coord_num].reshape([-1,self.coord_num])
-            self.u_monitor = self.precise_database[: , self.coord_num : self.output_num + self.coord_num].reshape([-1,self.output_num])
-            self.x_monitor = torch.tensor(self.x_monitor,requires_grad=True).float().to(device)
-            self.u_monitor = torch.tensor(self.u_monitor,requires_grad=True).float().to(device)
+            self.x_monitor, self.u_monitor = self.data_load('global')
 
             u = self.net(self.x_monitor).to(device)
 
@@ -497,27 +541,8 @@ class model():
     def net_d(self, mode = 'teacher'):
         loss_d = torch.tensor(0.).to(device)
 
-        # 这里采用一个临时的将名称分离的策略
-        ques_name = self.ques_name.split('_')[0]
-
-        
-        # 由于要堆叠，所以这里先弄一个进去
-        # current_read = pd.read_csv(f'./Database/{self.ques_name}_data_{self.data_serial[0]}.csv', header=None).values
-        current_read = pd.read_csv(f'./Database/{ques_name}_inv_data_{self.data_serial[0]}.csv', header=None).values
-
-        self.database = current_read
-        for i in range(1, len(self.data_serial)):
-            # current_read = pd.read_csv(f'./Database/{self.ques_name}_data_{self.data_serial[i]}.csv', header=None).values
-            current_read = pd.read_csv(f'./Database/{ques_name}_inv_data_{self.data_serial[i]}.csv', header=None).values
-            self.database = np.vstack([self.database,current_read])
-        
-        # 由于这些监督值往往在存储的时候已经是meshgrid之后的状态，所以这里就不再进行meshgrid
-        self.input_monitor = self.database[:,0:self.input_num].reshape([-1,self.input_num])
-        self.u_monitor = self.database[:,self.input_num:].reshape([-1,self.output_num])
-        self.input_monitor = torch.tensor(self.input_monitor,requires_grad=True).float().to(device)
-        self.u_monitor = torch.tensor(self.u_monitor,requires_grad=True).float().to(device)
-
-
+        # 监督数据只在第一次调用时读取并堆叠
+        self.input_monitor, self.u_monitor = self.data_load('monitor')
 
         if mode == 'student':
 
@@ -525,7 +550,7 @@ class model():
             # 先计算该点教师的值
             if self.k_value > 0:
 
-                self.teacher_monitor_value = self.net(self.input_monitor)
+                self.teacher_monitor_value = self.teacher_output('monitor', self.input_monitor)
 
                 fai = 1 - torch.tanh(self.k_value * torch.abs(self.teacher_monitor_value - self.u_monitor))
 
@@ -539,8 +564,9 @@ class model():
             # return loss_d
 
         if self.net.__module__.split('.')[-1] == 'PINN_post_divfree':
-            output = self.net(self.input_monitor)
-            output = torch.autograd.grad(output, self.input_monitor, grad_outputs=torch.ones_like(output), retain_graph=True, create_graph=True)[0]
+            input_monitor = self.input_monitor.detach().requires_grad_()
+            output = self.net(input_monitor)
+            output = torch.autograd.grad(output, input_monitor, grad_outputs=torch.ones_like(output), retain_graph=True, create_graph=True)[0]
             u = torch.cat((-output[:,1:2], output[:,0:1]), dim=1)
             loss_d += torch.mean((u - self.u_monitor)**2)
         else:
@@ -551,20 +577,31 @@ class model():
         return loss_d
     
 
+    # 学生网络阶段教师网络不更新，教师在计算场和观测点上的输出只计算一次，不在阶段内时直接计算
+    def teacher_output(self, name, input):
+        if self.teacher_cache is None:
+            return self.net(input)
+        if name not in self.teacher_cache:
+            # 不需要计算图，按para_chunk_num分块前向
+            with torch.no_grad():
+                self.teacher_cache[name] = torch.cat([self.net(input[i:i + self.para_chunk_num]) for i in range(0, input.shape[0], self.para_chunk_num)]).detach()
+        return self.teacher_cache[name]
+
     def net_teach(self, weight_teach = 1):
 
                
         if self.para_ctrl_add:
-            current_para_ctrl_tensors = [para_ctrl_tensor.repeat(self.x.shape[0], 1) for para_ctrl_tensor in self.para_ctrl_tensors]
-            for i in range (len(self.para_ctrl_tensors)):
-                u_teacher = self.net(torch.cat([self.x, self.y, current_para_ctrl_tensors[i]], dim=1))
-                u_student = self.net_student(torch.cat([self.x, self.y, current_para_ctrl_tensors[i]], dim=1))
-                return torch.mean((u_teacher - u_student)**2) * weight_teach
+            # 全部参数组合拼成一个批次，教师和学生各一次前向
+            (x_para, y_para), para = self.para_input([self.x, self.y])
+            xyp_cat = torch.cat([x_para, y_para, para], dim=1)
+            u_teacher = self.teacher_output('teach', xyp_cat)
+            u_student = self.net_student(xyp_cat)
+            return torch.mean((u_teacher - u_student)**2) * weight_teach
 
         if self.coord_num == 3:
             # print(type(self.net))
             # u_teacher = self.net(self.x,self.y,self.z).to(device)
-            u_teacher = self.net(torch.cat([self.x, self.y, self.z], dim=1)).to(device)
+            u_teacher = self.teacher_output('teach', torch.cat([self.x, self.y, self.z], dim=1)).to(device)
             # u_student = self.net_student(self.x,self.y,self.z).to(device)
             u_student = self.net_student(torch.cat([self.x, self.y, self.z], dim=1)).to(device)
         else:
@@ -572,29 +609,209 @@ class model():
 
             # 现在需要区分教师模型中已有观测值的坐标点，这里由于包含self.input_monitor，所以调用的时候必须要把net_d放在前面
             if self.k_value > 0:
-                # 计算每个xy_cat行是否与input_monitor任一行完全相同
-                mask = torch.ones(xy_cat.shape[0], dtype=torch.bool, device=xy_cat.device)
-                for row in self.input_monitor:
-                    same = torch.all(torch.isclose(xy_cat, row, atol=1e-8), dim=1)
-                    mask = mask & (~same)  # 只保留不相等的行
+                # 计算场和观测点都不变，保留的行号只在第一次（或它们变化后）计算
+                if self.teach_index is None or self.teach_index[0] is not self.x or self.teach_index[1] is not self.input_monitor:
+                    # 与input_monitor任一行相同的行去掉
+                    keep = ~SpatialIndex.close_any(xy_cat, self.input_monitor, atol=1e-8)
+                    self.teach_index = (self.x, self.input_monitor, torch.nonzero(keep).reshape([-1]))
 
                 # 去除这些行
-                xy_cat = xy_cat[mask]
+                xy_cat = xy_cat[self.teach_index[2]]
 
 
-            u_teacher = self.net(xy_cat).to(device)
+            u_teacher = self.teacher_output('teach', xy_cat).to(device)
             u_student = self.net_student(xy_cat).to(device)
         
         return torch.mean((u_teacher - u_student)**2) * weight_teach
 
   
+    # 根据问题定义一次性组装每步的损失计算，训练循环中不再做名称判断
+    def loss_compile(self, sample:bool=True):
+        zero = torch.tensor(0.).to(device)
+
+        # 逆问题的监督损失，Poisson使用全场参考解
+        if not self.problem.inverse:
+            net_data = lambda: zero
+        elif self.problem.data_loss == 'global':
+            net_data = lambda: self.net_global()[0]
+        else:
+            net_data = self.net_d
+
+        # 有监督值时不计算边界损失
+        net_boundary = (lambda: (zero, zero, {})) if self.monitor_state else self.net_b
+        net_regular = (lambda: self.net_rgl(object='all', reg_type='l2')) if self.regular_state else (lambda: zero)
+
+        # 小批量时每步从采样器取配点
+        if self.sampler is not None and sample:
+            collocation = lambda: self.sampler.step(self.net.iter, self.net_f_point)
+        else:
+            collocation = lambda: (self.x, self.y)
+
+        # 分阶段计时（见Profile），编译时各项在同一个图中，只计整体的loss阶段
+        timed = (lambda name, func: func) if self.compile_state else self.profiler.wrap
+        net_f = timed('net_f', self.net_f)
+        net_data, net_boundary, net_regular = timed('net_d', net_data), timed('net_b', net_boundary), timed('net_rgl', net_regular)
+        collocation = timed('sample', collocation)
+
+        monitor_state, regular_state, bcs_weight = self.monitor_state, self.regular_state, self.bcs_weight
+
+        def loss_points(x, y):
+            loss_f = net_f(x, y)
+            loss_d = net_data()
+            loss_b, loss_b_log, loss_b_parts = net_boundary()
+            loss_rgl = net_regular()
+
+            # 记录的总损失和反传的损失，反传时边界损失乘以bcs_weight
+            if monitor_state:
+                loss = loss_d + loss_f
+                loss_backward = loss
+            else:
+                loss = loss_f + loss_b
+                loss_backward = loss_f + bcs_weight * loss_b
+
+            if regular_state:
+                loss = loss + loss_rgl
+                loss_backward = loss_backward + loss_rgl
+
+            return loss, loss_backward, loss_f, loss_b_log, loss_d, loss_rgl, loss_b_parts
+
+        # 配点采样留在编译范围之外，避免步数变化引起重新编译
+        if self.compile_state:
+            self.compile_check()
+            loss_points = self.step_compile(loss_points)
+
+        return lambda: loss_points(*collocation())
+
+    # 参数化模式的残差在net_f中分块反传，不能放进编译的训练步
+    def compile_check(self):
+        if self.compile_state and self.para_ctrl_add:
+            raise ValueError('compile_state does not support para_ctrl_add: the parameterized residual back-propagates chunk by chunk inside net_f.')
+
+    # 用torch.compile编译一步的前向、残差和损失组装（反传使用编译得到的反向图），失败时退回普通模式
+    def step_compile(self, func):
+        self.compile_fallback = False
+        compiled = {'func': torch.compile(func, fullgraph=True, dynamic=False)}
+
+        def step(*args):
+            try:
+                result = compiled['func'](*args)
+                # 编译得到的反向图在backward()时才运行，第一次调用时先对网络参数试算一次梯度（不累加到.grad），
+                # 反向图出错时同样退回普通模式
+                if not compiled.get('probed') and compiled['func'] is not func:
+                    if result[1].requires_grad:
+                        torch.autograd.grad(result[1], [p for p in self.net.parameters() if p.requires_grad], retain_graph=True, allow_unused=True)
+                    compiled['probed'] = True
+                return result
+            except Exception as e:
+                if compiled['func'] is func:
+                    raise
+                print(f'torch.compile failed ({type(e).__name__}: {str(e).splitlines()[0] if str(e) else ""}), falling back to eager mode.')
+                compiled['func'] = func
+                self.compile_fallback = True
+                return func(*args)
+
+        return step
+
+    # 当前步数对应的记录间隔，超过pace_record_skip中的步数后换用下一个间隔
+    def record_gap(self, iter):
+        index = max([i for i, skip in enumerate(self.pace_record_skip) if skip < iter], default=0)
+        return self.pace_record_gap[index]
+
+    # 记录教师网络一步的损失，到达记录间隔时输出并保存
+    def loss_record(self, total_iter, optimizer=None, stage:str=''):
+        self.net.iter += 1
+
+        # 只在device上写入，不做同步
+        values = torch.stack([self.loss, self.loss_f, self.loss_b, self.loss_d, self.loss_rgl]).detach()
+        if self.monitor_state:
+            values = torch.cat([values, self.para_undetermin.detach()])
+        self.net.loss_buffer.write(values)
+
+        if self.net.iter % self.record_gap(self.net.iter) == 0:
+            # 到达记录间隔才同步到主机
+            self.net.loss_buffer.flush()
+            last = self.net.loss_buffer.last()
+            self.loss_dict = {'Iter':self.net.iter, 'Loss':last[0], 'Loss_f':last[1], 'Loss_b':last[2], 'Loss_d':last[3], 'Loss_rgl':last[4]}
+
+            loss_str = ', '.join([f'{key}: {int(value) if key == "Iter" else value:.5e}' for key, value in self.loss_dict.items() if key != "Iter" and value != 0])
+            iter_str = f'Iter{stage}: {{{self.net.iter}/{total_iter}}}'  
+            print(f'{iter_str}, {loss_str}')
+            self.profiler.count('records')
+            if self.pace_record_state:
+                with self.profiler.phase('model_save'):
+                    self.model_save(str(self.net.iter))
+
+            # 边界损失有分项时（如流动）一并输出
+            if self.loss_b_parts:
+                print(', '.join([f'{key}: {value:.5e}' for key, value in self.loss_b_parts.items()]))
+
+            if optimizer is not None:
+                current_lr = optimizer.param_groups[0]['lr']
+                if current_lr != self.original_lr:
+                    print(f"Learning rate changed from {self.original_lr:.6f} to {current_lr:.6f}")
+                self.original_lr = current_lr
+
+    # Adam之后的L-BFGS阶段（强Wolfe线搜索），在全部配点上优化，逆问题同时优化待定参数
+    # iter_group, start为检查点中记录的位置，从L-BFGS阶段续算时恢复优化器的历史并从第start步继续
+    def train_lbfgs(self, iter_group=0, start=0):
+        optimizer = optim.LBFGS(list(self.net.parameters()) + [self.para_undetermin], lr=self.lbfgs_lr, max_iter=1, max_eval=self.lbfgs_eval_num,
+                                tolerance_grad=self.lbfgs_tolerance, tolerance_change=self.lbfgs_tolerance, history_size=self.lbfgs_history_num, line_search_fn='strong_wolfe')
+        if start > 0 and self.resume_lbfgs is not None:
+            optimizer.load_state_dict(self.resume_lbfgs)
+        self.resume_lbfgs = None
+
+        # L-BFGS要求每次评估的目标函数一致，所以这里不做小批量采样
+        loss_step = self.loss_compile(sample=False)
+        total_iter = self.net.iter + self.lbfgs_steps - start
+
+        # 当前点上已经算好的损失和梯度，下一次optimizer.step开始时的评估直接使用，不重复计算
+        accepted = {}
+
+        def closure():
+            if 'loss' in accepted:
+                return accepted.pop('loss')
+            optimizer.zero_grad()
+            with self.profiler.phase('loss'):
+                self.loss, loss_backward, self.loss_f, self.loss_b, self.loss_d, self.loss_rgl, self.loss_b_parts = loss_step()
+            with self.profiler.phase('backward'):
+                if loss_backward.requires_grad:
+                    loss_backward.backward()
+            self.profiler.count('lbfgs evaluations')
+            return loss_backward
+
+        accepted['loss'] = closure()
+        loss_last = accepted['loss'].item()
+        for iter_inner in range(start, self.lbfgs_steps):
+            with self.profiler.phase('lbfgs step'):
+                optimizer.step(closure)
+
+            # step返回的是步前的损失，线搜索最后一次评估的也不一定是接受的点，所以在接受点上重新评估，
+            # 记录和收敛判断都用这次的结果
+            accepted['loss'] = closure()
+            loss_current = accepted['loss'].item()
+
+            with self.profiler.phase('logging'):
+                self.loss_record(total_iter, stage=' (L-BFGS)')
+            self.profiler.count('lbfgs steps')
+            self.profiler.step()
+
+            self.time_list[0] += time.time() - self.current_time
+            self.current_time = time.time()
+
+            # 相邻两步损失的相对变化小于容差时认为收敛
+            if loss_last is not None and abs(loss_last - loss_current) <= self.lbfgs_tolerance * max(1., abs(loss_current)):
+                print(f'L-BFGS converged at iter {self.net.iter}.')
+                break
+            loss_last = loss_current
+
+            if self.checkpoint_gap and self.net.iter % self.checkpoint_gap == 0:
+                with self.profiler.phase('checkpoint'):
+                    self.checkpoint_save('lbfgs', iter_group, iter_inner + 1, optimizer.state_dict())
+
     def train_adam(self):
         self.para_undetermin = torch.zeros(self.para_ctrl_num, requires_grad=True).float().to(device)
         self.para_undetermin = torch.nn.Parameter(self.para_undetermin)
 
-        if 'Poisson' in self.ques_name:
-            self.learning_rate = 1e-3
-        
         self.optimizer = optim.Adam(list(self.net.parameters()) + [self.para_undetermin], lr=self.learning_rate)
 
        
@@ -603,158 +820,241 @@ class model():
         if self.distill_state:
             self.optimizer_student = optim.Adam(list(self.net_student.parameters()), lr=self.learning_rate) 
 
+        # 每个模型单独计时，loss_compile中的各项损失按阶段包装
+        module_name = self.net.__module__.split('.')[-1]
+        self.profiler = Profile.Profiler(self.profile_state, torch.cuda.is_available(), self.trace_start, self.trace_steps,
+                                         f'{self.save_desti}/Profile/{self.ques_name}_{self.ini_num}_trace_{module_name}.json')
+
+        self.loss_step = self.loss_compile()
+
+        # 续算时恢复网络、优化器等状态，self.resume_point记录循环的位置
+        state = self.checkpoint_load()
+        self.resume_point = None if state is None else {key: state[key] for key in ['stage', 'group', 'inner']}
+        self.resume_lbfgs = None if state is None else state.get('optimizer_lbfgs')
+        # 只有从检查点续算时才接着原日志写；load_state加载模型后iter从0开始，日志与原先一样重新写
+        log_append = state is not None
+
+        # 损失记录缓冲区，容量取最大的记录间隔
+        loss_columns = ['loss', 'loss_f', 'loss_b', 'loss_d', 'loss_rgl']
+        if self.monitor_state:
+            loss_columns += ['parameters_'+str(i+1) for i in range(self.para_ctrl_num)]
+        # 同步到主机的行同时追加到Loss文件夹中的二进制日志，续算时接着原日志写
+        self.net.loss_buffer = LossBuffer.LossBuffer(loss_columns, max(self.pace_record_gap), device, self.net.iter,
+                                                     LossLog.LossLog(self.loss_log_path(), ['iter'] + loss_columns, append=log_append))
+        if self.distill_state:
+            student_columns = ['loss', 'loss_teach', 'loss_rgl', 'loss_student_d']
+            self.net_student.loss_buffer = LossBuffer.LossBuffer(student_columns, max(self.pace_record_gap), device, self.net_student.iter,
+                                                                 LossLog.LossLog(self.loss_log_path('student'), ['iter'] + student_columns, append=log_append))
+
         self.current_time = time.time()
         self.time_list = [0.]
 
-        for iter_group in range(self.step_num):  
+        if state is not None:
+            self.checkpoint_restore(state)
 
-            for iter_inner in range(self.train_steps): 
+        for iter_group in range(0 if self.resume_point is None else self.resume_point['group'], self.step_num):  
+
+            adam_start = self.resume_start(iter_group, 'adam')
+            for iter_inner in range(self.train_steps if adam_start is None else adam_start, self.train_steps): 
 
                 self.optimizer.zero_grad() 
 
                 if self.load_study_state:
                     break
-                self.loss_f = self.net_f()           
-                if 'inv' in self.ques_name:
-                    if 'Poisson' in self.ques_name:
-                        self.loss_d = self.net_global()[0]
-                    else:
-                        self.loss_d = self.net_d()
-                else:
-                    self.loss_d = torch.tensor(0.).to(device)
-                self.loss_b = torch.tensor(0.).to(device) if self.monitor_state else self.net_b()
-                self.loss_rgl = self.net_rgl(object='all', reg_type='l2') if self.regular_state else torch.tensor(0.).to(device)
-
-                if self.monitor_state: 
-                    self.loss = self.loss_d + self.loss_f
-                else:
-                    if 'Flow' in self.ques_name :
-                        self.loss = self.loss_f + self.loss_b[0]
-                    else:
-                        self.loss = self.loss_f + self.loss_b
-
-                if self.regular_state:
-                    self.loss += self.loss_rgl
-                
+                with self.profiler.phase('loss'):
+                    self.loss, loss_backward, self.loss_f, self.loss_b, self.loss_d, self.loss_rgl, self.loss_b_parts = self.loss_step()
 
-                if 'Flow' in self.ques_name:
-                    loss = self.loss_f + self.bcs_weight * self.loss_b[0]
-                    loss.backward(retain_graph=True) 
-                else:
-                    self.loss.backward(retain_graph=True)
-
-                self.optimizer.step()    
-                self.scheduler.step()
-
-
-                self.net.iter += 1
-                self.net.iter_list.append(self.net.iter)
-                self.net.loss_list.append(self.loss.item())
-                self.net.loss_f_list.append(self.loss_f.item())
-                if 'Flow' in self.ques_name:
-                    self.loss_b_origion = self.loss_b[1] + self.loss_b[2] + self.loss_b[3] + self.loss_b[4] + self.loss_b[5]
-                    self.net.loss_b_list.append(self.loss_b_origion.item())
-                else:
-                    self.net.loss_b_list.append(self.loss_b.item())
-                self.net.loss_d_list.append(self.loss_d.item())
-                self.net.loss_rgl_list.append(self.loss_rgl.item())
-
-                if self.monitor_state:
-                    self.net.para_ud_list.append(self.para_undetermin.tolist())
-  
-                if self.net.iter -1 in self.pace_record_skip:
-                    iter_index_teacher = self.pace_record_skip.index(self.net.iter -1)
-                    current_gap_teacher = self.pace_record_gap[iter_index_teacher]
-                
-                if 'Flow' in self.ques_name:
-                    self.loss_dict = {'Iter':self.net.iter, 'Loss':self.loss.item(), 'Loss_f':self.loss_f.item(), 'Loss_b':self.loss_b_origion.item(), 'Loss_d':self.loss_d.item(), 'Loss_rgl':self.loss_rgl.item()}
-                else:
-                    self.loss_dict = {'Iter':self.net.iter, 'Loss':self.loss.item(), 'Loss_f':self.loss_f.item(), 'Loss_b':self.loss_b.item(), 'Loss_d':self.loss_d.item(), 'Loss_rgl':self.loss_rgl.item()}
-
-                if self.net.iter % current_gap_teacher == 0:
-                    total_iter = self.step_num * self.train_steps  
-                    loss_str = ', '.join([f'{key}: {int(value) if key == "Iter" else value:.5e}' for key, value in self.loss_dict.items() if key != "Iter" and value != 0])
-                    iter_str = f'Iter: {{{self.net.iter}/{total_iter}}}'  
-                    print(f'{iter_str}, {loss_str}')
-                    if self.pace_record_state:
-                        self.model_save(str(self.net.iter))
-
-                    if 'Flow' in self.ques_name:
-                        print(f"loss_b_in: {self.loss_b[1]:.5e}, loss_b_cylinder_uv: {self.loss_b[2]:.5e}, loss_b_cylinder_p: {self.loss_b[3]:.5e}, loss_b_wall: {self.loss_b[4]:.5e}, loss_b_out: {self.loss_b[5]:.5e}")
-        
-                    current_lr = self.optimizer.param_groups[0]['lr']
-                    if current_lr != self.original_lr:
-                        print(f"Learning rate changed from {self.original_lr:.6f} to {current_lr:.6f}")
-                    self.original_lr = current_lr
+                with self.profiler.phase('backward'):
+                    self.backward(loss_backward)
 
+                with self.profiler.phase('optimizer'):
+                    self.optimizer.step()    
+                    self.scheduler.step()
 
-                    
+
+                with self.profiler.phase('logging'):
+                    self.loss_record(self.step_num * self.train_steps, self.optimizer)
                 
                 self.time_list[0] += time.time() - self.current_time
                 self.current_time = time.time()
 
+                if self.checkpoint_gap and self.net.iter % self.checkpoint_gap == 0:
+                    with self.profiler.phase('checkpoint'):
+                        self.checkpoint_save('adam', iter_group, iter_inner + 1)
+                self.profiler.count('adam steps')
+                self.profiler.step()
+
+            # Adam之后用L-BFGS继续优化教师网络，从学生网络阶段续算时已经做过
+            lbfgs_start = self.resume_start(iter_group, 'lbfgs')
+            if self.lbfgs_steps and not self.load_study_state and lbfgs_start is not None:
+                self.train_lbfgs(iter_group, lbfgs_start)
+
             if self.distill_state:
 
+                # 教师输出在本阶段开始时重新计算
+                self.teacher_cache = {}
 
-                for iter_inner in range(int(self.train_steps * self.train_ratio)):
+                for iter_inner in range(self.resume_start(iter_group, 'student'), int(self.train_steps * self.train_ratio)):
                     
                     self.optimizer_student.zero_grad()
 
-                    self.loss_student_d = self.net_d(mode='student')
+                    if self.teacher_refresh_gap and iter_inner > 0 and iter_inner % self.teacher_refresh_gap == 0:
+                        self.teacher_cache = {}
 
-                    self.loss_teach = self.net_teach()
-                    self.loss_student_rgl = self.net_rgl(mode='student', object='weight')
+                    with self.profiler.phase('student net_d'):
+                        self.loss_student_d = self.net_d(mode='student')
+
+                    with self.profiler.phase('net_teach'):
+                        self.loss_teach = self.net_teach()
+                    with self.profiler.phase('student net_rgl'):
+                        self.loss_student_rgl = self.net_rgl(mode='student', object='weight')
 
                     self.loss_student = self.loss_student_d + self.loss_teach + self.loss_student_rgl 
 
-                    self.loss_student.backward(retain_graph=True)
+                    with self.profiler.phase('student backward'):
+                        self.backward(self.loss_student)
 
-                    self.optimizer_student.step()
+                    with self.profiler.phase('student optimizer'):
+                        self.optimizer_student.step()
 
                     self.net_student.iter += 1
-                    self.net_student.iter_list.append(self.net_student.iter)
-                    self.net_student.loss_list.append(self.loss_student.item())
-                    self.net_student.loss_teach_list.append(self.loss_teach.item())
-                    self.net_student.loss_d_list.append(self.loss_student_d.item())
-                    self.net_student.loss_rgl_list.append(self.loss_student_rgl.item())
-
-                
-                    if self.net_student.iter - 1  in self.pace_record_skip:
-                        iter_index_student = self.pace_record_skip.index(self.net_student.iter - 1)
-                        current_gap_student = self.pace_record_gap[iter_index_student]
-                    if self.net_student.iter % current_gap_student == 0: 
-                        total_iter_student = int(self.step_num * self.train_steps * self.train_ratio) 
-                        iter_str_student = f'Iter (student): {{{self.net_student.iter}/{total_iter_student}}}'
-
-                        loss_str_student = ', '.join([f'{key}: {value:.5e}' for key, value in {
-                            'loss_student': self.loss_student.item(),
-                            'loss_teach': self.loss_teach.item(),
-                            'loss_rgl': self.loss_student_rgl.item(),
-                            'loss_student_d': self.loss_student_d.item()
-                        }.items() if value != 0])
-                        print(f'{iter_str_student}, {loss_str_student}')
+                    with self.profiler.phase('student logging'):
+                        self.net_student.loss_buffer.write(torch.stack([self.loss_student, self.loss_teach, self.loss_student_rgl, self.loss_student_d]).detach())
+
+                        if self.net_student.iter % self.record_gap(self.net_student.iter) == 0: 
+                            total_iter_student = int(self.step_num * self.train_steps * self.train_ratio) 
+                            iter_str_student = f'Iter (student): {{{self.net_student.iter}/{total_iter_student}}}'
+
+                            self.net_student.loss_buffer.flush()
+                            last = self.net_student.loss_buffer.last()
+                            loss_str_student = ', '.join([f'{key}: {value:.5e}' for key, value in {
+                                'loss_student': last[0],
+                                'loss_teach': last[1],
+                                'loss_rgl': last[2],
+                                'loss_student_d': last[3]
+                            }.items() if value != 0])
+                            print(f'{iter_str_student}, {loss_str_student}')
                         
-                        if self.pace_record_state:
-                            self.model_save(str(self.net_student.iter), mode='student')
+                            self.profiler.count('student records')
+                            if self.pace_record_state:
+                                with self.profiler.phase('model_save'):
+                                    self.model_save(str(self.net_student.iter), mode='student')
+
+                    if self.checkpoint_gap and self.net_student.iter % self.checkpoint_gap == 0:
+                        with self.profiler.phase('checkpoint'):
+                            self.checkpoint_save('student', iter_group, iter_inner + 1)
+                    self.profiler.count('student steps')
+                    self.profiler.step()
+
+                self.teacher_cache = None
 
                 if len(self.time_list) == 1:
                     self.time_list.append(0.)
                 self.time_list[1] += time.time() - self.current_time
                 self.current_time = time.time()
+
+        # 训练完成后再存一次，续算时直接跳过训练
+        if self.checkpoint_gap and not self.load_study_state:
+            self.checkpoint_save('done', self.step_num, 0)
+        self.checkpoint_writer.wait()
                 
         print(f'\nTime occupied: {(self.time_list[0]):.5e} s.\n')
         if self.distill_state:
             print(f'\nTime occupied (student): {(self.time_list[1]):.5e} s.\n')
-    def model_save(self, suffix:str ='', mode:str='teacher'):
-
-        if not os.path.exists(f'./Results/'):
-            os.mkdir(f'./Results/')
-
+    # 可续算检查点的路径
+    def checkpoint_path(self):
+        return f"{self.save_desti}/Models/{self.ques_name}_{self.ini_num}_{self.net.__module__.split('.')[-1]}_resume.pt"
+
+    # 在后台保存完整的训练状态，stage, group, inner为续算时训练循环的位置
+    # lbfgs_state为L-BFGS阶段中优化器的状态，续算时从中断的L-BFGS步继续
+    def checkpoint_save(self, stage, group, inner, lbfgs_state=None):
+        # 日志与检查点保持一致，续算时截掉检查点之后写入的行
+        self.net.loss_buffer.flush()
+        state = {
+            'stage': stage, 'group': group, 'inner': inner,
+            'net': self.net.state_dict(), 'net_iter': self.net.iter,
+            'para_undetermin': self.para_undetermin,
+            'optimizer': self.optimizer.state_dict(), 'scheduler': self.scheduler.state_dict(),
+            'sampler_weights': None if self.sampler is None else self.sampler.weights,
+            'log_row_num': {'teacher': self.net.loss_buffer.log.row_num},
+            'time_list': list(self.time_list), 'original_lr': self.original_lr,
+            'rng': {'torch': torch.get_rng_state(), 'numpy': np.random.get_state()},
+            'optimizer_lbfgs': lbfgs_state,
+        }
+        if torch.cuda.is_available():
+            state['rng']['cuda'] = torch.cuda.get_rng_state_all()
+        if self.distill_state:
+            self.net_student.loss_buffer.flush()
+            state.update({'net_student': self.net_student.state_dict(), 'student_iter': self.net_student.iter,
+                          'optimizer_student': self.optimizer_student.state_dict()})
+            state['log_row_num']['student'] = self.net_student.loss_buffer.log.row_num
+
+        os.makedirs(os.path.dirname(self.checkpoint_path()), exist_ok=True)
+        self.checkpoint_writer.submit(self.checkpoint_path(), state)
+
+    # 续算时读取检查点并恢复网络、优化器、调度器、待定参数和步数，没有检查点时返回None
+    def checkpoint_load(self):
+        if not self.resume_state or not os.path.isfile(self.checkpoint_path()):
+            return None
+        state = Checkpoint.load(self.checkpoint_path(), device)
+
+        self.net.load_state_dict(state['net'])
+        self.net.iter = state['net_iter']
+        with torch.no_grad():
+            self.para_undetermin.copy_(state['para_undetermin'])
+        self.optimizer.load_state_dict(state['optimizer'])
+        self.scheduler.load_state_dict(state['scheduler'])
+        if self.distill_state:
+            self.net_student.load_state_dict(state['net_student'])
+            self.net_student.iter = state['student_iter']
+            self.optimizer_student.load_state_dict(state['optimizer_student'])
+        if self.sampler is not None:
+            self.sampler.weights = state['sampler_weights']
+
+        print(f'\nResuming {self.checkpoint_path()} from iter {self.net.iter}.\n')
+        return state
+
+    # 在损失缓冲区建好之后恢复日志、计时和随机数状态
+    def checkpoint_restore(self, state):
+        self.net.loss_buffer.log.truncate(state['log_row_num']['teacher'])
+        if self.distill_state:
+            self.net_student.loss_buffer.log.truncate(state['log_row_num']['student'])
+        self.time_list = list(state['time_list'])
+        self.original_lr = state['original_lr']
+
+        torch.set_rng_state(state['rng']['torch'].cpu())
+        np.random.set_state(state['rng']['numpy'])
+        if 'cuda' in state['rng'] and torch.cuda.is_available():
+            torch.cuda.set_rng_state_all([rng.cpu() for rng in state['rng']['cuda']])
+
+    # 续算时各阶段循环的起点，已经完成的阶段返回None
+    def resume_start(self, iter_group, stage):
+        point = self.resume_point
+        if point is None or iter_group > point['group']:
+            return 0
+        stages = ['adam', 'lbfgs', 'student', 'done']
+        if stages.index(stage) < stages.index(point['stage']):
+            return None
+        return point['inner'] if stage == point['stage'] else 0
+
+    # 损失日志的路径，与导出的Loss CSV同名
+    def loss_log_path(self, mode:str='teacher'):
+        in_net, suffix_mode = (self.net, '') if mode == 'teacher' else (self.net_student, '_student')
+        return f"{self.save_desti}/Loss/{self.ques_name}_{str(self.ini_num)}_loss_{in_net.__module__.split('.')[-1]}{suffix_mode}.bin"
+
+    # 读取损失日志转换为DataFrame，drop_zero时去掉全为零的列
+    def loss_frame(self, in_net, columns=None, drop_zero:bool=True):
+        import pandas as pd
+
+        in_net.loss_buffer.flush()
+        values, header = LossLog.load(in_net.loss_buffer.log.path, columns, drop_zero)
+        df_loss = pd.DataFrame(values, columns=header)
+        df_loss['iter'] = df_loss['iter'].astype(int)
+        return df_loss
 
-        if not os.path.exists(self.save_desti):
-            os.mkdir(self.save_desti)
-        if not os.path.exists(f'{self.save_desti}/Models/'):       
-            os.mkdir(f'{self.save_desti}/Models/')
+    def model_save(self, suffix:str ='', mode:str='teacher'):
+        # 多个任务并行时可能同时创建同一个文件夹
+        os.makedirs(f'{self.save_desti}/Models/', exist_ok=True)
 
         if mode == 'teacher':
             in_net = self.net
@@ -768,86 +1068,47 @@ class model():
         if suffix == '':
             torch.save(in_net.state_dict(), f"{self.save_desti}/Models/{self.ques_name}_{self.ini_num}_{in_net.__module__.split('.')[-1]}{suffix_mode}.pth")
         elif self.pace_record_state:
-            torch.save(in_net.state_dict(), f"{self.save_desti}/Models/{self.ques_name}_{self.ini_num}_{in_net.__module__.split('.')[-1]}{suffix_mode}_step_{suffix}.pth")
+            # 训练中的模型由后台线程写入
+            self.checkpoint_writer.submit(f"{self.save_desti}/Models/{self.ques_name}_{self.ini_num}_{in_net.__module__.split('.')[-1]}{suffix_mode}_step_{suffix}.pth", in_net.state_dict())
 
-        # 复制控制参数（Config内容）
-        # if not os.path.exists(f'{self.save_desti}{self.ques_name}_{self.ini_num}.csv'):
-        self.control_paras = pd.read_csv(self.ini_file_path)
-        self.control_paras.to_csv(f'{self.save_desti}{self.ques_name}_{self.ini_num}.csv', index=False)
+        # 复制控制参数（Config内容），同一Config的多个模型并行训练时可能同时写入，所以原子地替换
+        if not self.config_saved:
+            Checkpoint.copy_file(self.ini_file_path, f'{self.save_desti}{self.ques_name}_{self.ini_num}.csv')
+            self.config_saved = True
         
 
 
-        # 存储时间，最后一步才存
+        # 存储时间，最后一步才存；并行的任务可能同时追加，表头只写一次
         if suffix == '':
-            self.time_save = pd.DataFrame({
-                'Question': [self.ques_name],
-                'Number': [self.ini_num],
-                'Module': [in_net.__module__.split('.')[-1]],
-                'Training Time': [self.time_list[0]],
-                'Student Training Time': [self.time_list[1]] if self.distill_state else [0.]
-            })
-            file_path = self.save_desti + 'Clock time.csv'
-            if not os.path.isfile(file_path):
-                self.time_save.to_csv(self.save_desti + 'Clock time.csv', mode='a', index=False)    # mode='a'表示追加写入
-            else:
-                self.time_save.to_csv(self.save_desti + 'Clock time.csv', mode='a', index=False, header=False)
-
-        if mode == 'teacher':
-
-            loss_data_dict = {
-                'iter': self.net.iter_list,
-                'loss': self.net.loss_list,
-                'loss_f': self.net.loss_f_list,
-                'loss_b': self.net.loss_b_list,
-                'loss_d': self.net.loss_d_list,
-                'loss_rgl': self.net.loss_rgl_list
-            }
-
-            loss_data_dict = {key: value for key, value in loss_data_dict.items() if value != 0}
-
-
-            df_loss_data = pd.DataFrame(loss_data_dict)
-
-            df_loss_data = df_loss_data.loc[:, (df_loss_data != 0).any(axis=0)]
-            
-        if self.distill_state and mode == 'student':
-            loss_student_data_dict = {
-                'iter': self.net_student.iter_list,
-                'loss': self.net_student.loss_list,
-                'loss_teach': self.net_student.loss_teach_list,
-                'loss_rgl': self.net_student.loss_rgl_list,
-                'loss_student_d': self.net_student.loss_d_list
-            }
-
-            loss_student_data_dict = {key: value for key, value in loss_student_data_dict.items() if value != 0}
+            Checkpoint.append_row(self.save_desti + 'Clock time.csv',
+                                  ['Question', 'Number', 'Module', 'Training Time', 'Student Training Time'],
+                                  [self.ques_name, self.ini_num, in_net.__module__.split('.')[-1], self.time_list[0],
+                                   self.time_list[1] if self.distill_state else 0.])
 
-            df_loss_student_data = pd.DataFrame(loss_student_data_dict)
-
-            df_loss_student_data = df_loss_student_data.loc[:, (df_loss_student_data != 0).any(axis=0)]
-        
-        if not os.path.exists(self.save_desti + '/Loss/'):       
-            os.mkdir(self.save_desti + '/Loss/')
+        # 训练中的检查点只把新的行追加到Loss文件夹的日志中（见LossBuffer），CSV只在最后导出
+        if suffix != '':
+            in_net.loss_buffer.flush()
+            return
 
         if mode == 'teacher':
+            df_loss_data = self.loss_frame(self.net, ['iter', 'loss', 'loss_f', 'loss_b', 'loss_d', 'loss_rgl'])
             df_loss_data.to_csv(f"{self.save_desti}/Loss/{self.ques_name}_{str(self.ini_num)}_loss_{self.net.__module__.split('.')[-1]}.csv", index=False) 
             # print(f'\n Teacher model loss data saved.\n')
 
         if self.distill_state and mode == 'student':
+            df_loss_student_data = self.loss_frame(self.net_student)
             df_loss_student_data.to_csv(f"{self.save_desti}/Loss/{self.ques_name}_{str(self.ini_num)}_loss_{self.net_student.__module__.split('.')[-1]}_student.csv", index=False)
 
-        # 存储算出来的参数
+        # 存储算出来的参数，续算时日志已包含之前的记录
         if self.monitor_state:
             if mode == 'teacher':
-                iter_list = np.array(self.net.iter_list).reshape([-1,1])
-                para_ud = np.array(np.hstack([iter_list, self.net.para_ud_list]))
-                # para_ud = np.transpose(para_ud)
                 para_ud_columns = ['iter']
                 for i in range(self.para_ctrl_num):
                     para_ud_columns.append('parameters_'+str(i+1))
-                df_para_ud = pd.DataFrame(para_ud, columns = para_ud_columns)
-                if not os.path.exists(self.save_desti + '/Parameters/'):       
-                    os.mkdir(self.save_desti + '/Parameters/')
-                df_para_ud.to_csv(f"{self.save_desti}/Parameters/{self.ques_name}_{str(self.ini_num)}_paras_{self.net.__module__.split('.')[-1]}.csv", index=False, mode='a' if self.load_state else 'w')
+                df_para_ud = self.loss_frame(self.net, para_ud_columns, drop_zero=False)
+                df_para_ud['iter'] = df_para_ud['iter'].astype(float)
+                os.makedirs(self.save_desti + '/Parameters/', exist_ok=True)
+                df_para_ud.to_csv(f"{self.save_desti}/Parameters/{self.ques_name}_{str(self.ini_num)}_paras_{self.net.__module__.split('.')[-1]}.csv", index=False)
 
 
     def result_show(self):
@@ -856,7 +1117,7 @@ class model():
         z = np.linspace(self.z_min, self.z_max, self.figure_node_num).reshape([-1,1]) if self.coord_num == 3 else None
         if self.coord_num == 3:
             x, y, z = np.meshgrid(x, y, z)
-        elif 'Flow' in self.ques_name :
+        elif self.problem.figure_on_collocation:
             x, y = self.x.detach().cpu().numpy(), self.y.detach().cpu().numpy()
         else:
             x, y = np.meshgrid(x, y)
@@ -879,69 +1140,84 @@ class model():
 
         u = u.detach().cpu().numpy()
 
-        u_vis = SingleVis.Vis(self.ques_name, self.ini_num, self.save_desti, self.net.__module__.split('.')[-1], input, u)
-        u_vis.figure_2d() if self.coord_num == 2 else u_vis.figure_3d()
+        # 计算场同时保存下来，用于不重新训练而重新画图（python -m Module.Render）
+        module_name = self.net.__module__.split('.')[-1]
+        vis_job = {'ques_name': self.ques_name, 'ini_num': self.ini_num, 'file_desti': self.save_desti}
+        os.makedirs(self.save_desti + '/Figure/', exist_ok=True)
+        np.savez(Render.field_path(self.save_desti, self.ques_name, self.ini_num, module_name), input=input, u=u)
+        Render.submit('field', **vis_job, module_name=module_name, input=input, u=u)
         if not self.load_study_state:
-            u_vis.loss_vis()
+            df_loss = self.loss_frame(self.net, ['iter', 'loss', 'loss_f', 'loss_b', 'loss_d', 'loss_rgl'])
+            Render.submit('loss', **vis_job, module_name=module_name, loss=df_loss.values, header=list(df_loss.columns))
 
         if self.distill_state:
-            u_student_vis = SingleVis.Vis(self.ques_name, self.ini_num, self.save_desti, self.net_student.__module__.split('.')[-1], input, u_student, mode='student')
-            u_student_vis.figure_2d() if self.coord_num == 2 else u_student_vis.figure_3d()
-            u_student_vis.loss_vis()
+            student_name = self.net_student.__module__.split('.')[-1]
+            np.savez(Render.field_path(self.save_desti, self.ques_name, self.ini_num, student_name + '_student'), input=input, u=u_student)
+            Render.submit('field', **vis_job, module_name=student_name, mode='student', input=input, u=u_student)
+            df_loss_student = self.loss_frame(self.net_student)
+            Render.submit('loss', **vis_job, module_name=student_name, mode='student', loss=df_loss_student.values, header=list(df_loss_student.columns))
 
         if self.monitor_state:
-            u_vis.para_vis()
+            Render.submit('para', **vis_job, module_name=module_name)
 
     def workflow(self):
         self.mesh_init()
         self.train_adam()
-        self.model_save() 
-        if self.distill_state:
-            self.model_save(mode='student')
+        with self.profiler.phase('model_save'):
+            self.model_save() 
+            if self.distill_state:
+                self.model_save(mode='student')
         if not self.para_ctrl_add:
-            self.result_show()
-
-    def train(self): 
-
-        model_define_trigger = 0
-        
-        if len(self.model_ini_dict['model']) > 1:
-            group = GroupVis.Vis(self.ques_name, self.ini_num, self.save_desti)
+            with self.profiler.phase('result_show'):
+                self.result_show()
+        # 分阶段计时与损失日志放在同一文件夹
+        self.profiler.write(f"{self.save_desti}/Loss/{self.ques_name}_{str(self.ini_num)}_profile_{self.net.__module__.split('.')[-1]}.csv")
+
+    # 根据Module中的文件名构建网络
+    def net_build(self, model_name):
+        module = importlib.import_module(f"Module.{model_name}")
+        NetClass = getattr(module, 'Net')
+
+        if 'PINN' in model_name:
+            return NetClass(self.layer).float().to(device)
+        else:
+            return NetClass(self.node_num, self.output_num).float().to(device)
 
-        for i in range (len(self.model_ini_dict['model'])):
+    # 训练Config中的一个模型
+    def train_model(self, model_name):
+        self.original_lr = self.learning_rate
 
-            self.original_lr = 1e-3 if 'Poisson' in self.ques_name else self.learning_rate
+        self.net = self.net_build(model_name)
 
-            model_define_trigger = 1
-            module = importlib.import_module(f"Module.{self.model_ini_dict['model'][i]}")
-            NetClass = getattr(module, 'Net')
+        if self.load_state:
+            load_path = f"./Results/{self.ques_name}_{self.ini_num}/Models/{self.ques_name}_{self.ini_num}_{self.net.__module__.split('.')[-1]}.pth"
+            self.net.load_state_dict(torch.load(load_path))
 
-            if 'PINN' in self.model_ini_dict['model'][i]:
-                self.net = NetClass(self.layer).float().to(device)
-            else:
-                self.net = NetClass(self.node_num, self.output_num).float().to(device)
+        if self.distill_state:
+            self.net_student = PINN.Net(self.layer_student).float().to(device)
+        
+        print(f'\nRunning Model: {model_name}\n')
 
-            if self.load_state:
-                load_path = f"./Results/{self.ques_name}_{self.ini_num}/Models/{self.ques_name}_{self.ini_num}_{self.net.__module__.split('.')[-1]}.pth"
-                self.net.load_state_dict(torch.load(load_path))
+        self.workflow()
 
-            if self.distill_state:
-                self.net_student = PINN.Net(self.layer_student).float().to(device)
-            
-            print(f'\nRunning Model: {self.model_ini_dict["model"][i]}\n')
+    # 各模型都训练完成后，从Loss文件夹读取记录画对比图
+    def group_show(self, model_names):
+        Render.submit('group', ques_name=self.ques_name, ini_num=self.ini_num, file_desti=self.save_desti,
+                      model_names=list(model_names), monitor_state=self.monitor_state)
 
-            self.workflow()
+    # model_names为None时依次训练Config中的全部模型并画对比图，否则只训练给出的模型（见Runner）
+    def train(self, model_names=None): 
+        group_state = model_names is None
+        model_names = self.model_ini_dict['model'] if model_names is None else model_names
 
+        if len(model_names) == 0:
+            raise ValueError('The model name is incorrect. Please check again.')
 
-            if len(self.model_ini_dict['model']) > 1:
-                group.loss_read(self.net.__module__.split('.')[-1])
-                if self.monitor_state:
-                    group.para_read(self.net.__module__.split('.')[-1])
+        # 图片交给后台进程池绘制，train返回后可用Render.wait()等待全部图片完成
+        Render.start(self.render_worker_num)
 
-        if len(self.model_ini_dict['model']) > 1:
-            group.loss_vis()
-            if self.monitor_state:
-                group.para_vis()
+        for model_name in model_names:
+            self.train_model(model_name)
 
-        if model_define_trigger == 0:
-            raise ValueError('The model name is incorrect. Please check again.')
\ No newline at end of file
+        if group_state and len(model_names) > 1:
+            self.group_show(model_names)
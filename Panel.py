@@ -1,24 +1,18 @@
-import Module.Training as Training
-
-import torch
-torch.random.manual_seed(1234)
-
-# 串行所有任务，注释掉如果你不需要
-# Serially run all tasks, comment out if you don't need any of them.
-
-task_1 = Training.model('Laplace', 'EXP')
-task_1.train()
-
-task_2 = Training.model('Burgers_inv', 'EXP')
-task_2.train()
-
-task_3 = Training.model('Poisson', 'EXP')
-task_3.train()
-
-task_4 = Training.model('Flow', 'EXP')
-task_4.train()
-
-task_5 = Training.model('Burgers_inv_distill', 'EXP')
-task_5.train()
-
-
+import Module.Runner as Runner
+
+# 所有任务，注释掉如果你不需要
+# All tasks, comment out if you don't need any of them.
+tasks = [
+    ('Laplace', 'EXP'),
+    ('Burgers_inv', 'EXP'),
+    ('Poisson', 'EXP'),
+    ('Flow', 'EXP'),
+    ('Burgers_inv_distill', 'EXP'),
+]
+
+# 每个Config中的每个模型作为一个独立任务并行训练，同一Config的模型全部完成后画对比图
+# Every model of every Config is trained as an independent job in a process pool; the comparison
+# plots of a Config are drawn once all of its models finish.
+# 串行运行 / to run serially: Training.model('Laplace', 'EXP').train()
+if __name__ == '__main__':
+    Runner.run(tasks)
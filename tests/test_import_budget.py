@@ -0,0 +1,18 @@
+# coding = utf-8
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import Module.ImportBudget as ImportBudget
+
+
+class ImportBudgetTest(unittest.TestCase):
+    # 导入Module.Training不加载pandas/matplotlib/scipy，且在torch之外不超过0.15 s
+    # Importing Module.Training loads no pandas/matplotlib/scipy and stays within 0.15 s beyond torch.
+    def test_training_import(self):
+        ImportBudget.check()
+
+
+if __name__ == '__main__':
+    unittest.main()
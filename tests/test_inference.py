@@ -0,0 +1,41 @@
+# coding = utf-8
+import os
+import sys
+import tempfile
+import unittest
+import numpy as np
+import torch
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import Module.Inference as Inference
+import Module.PINN as PINN
+import Module.PINN_post_minus as PINN_post_minus
+import Module.PsiNN_burgers as PsiNN_burgers
+import Module.StructureExtract as StructureExtract
+
+
+class InferenceTest(unittest.TestCase):
+    # 导出后的numpy推理与torch网络的输出、一阶和二阶导数一致（float32与float64）
+    # The exported numpy engine matches the torch net up to second derivatives, in float32 and float64.
+    def test_engine_matches_torch(self):
+        torch.manual_seed(0)
+        nets = {'PINN': PINN.Net([2, 20, 20, 3]),
+                'PINN_post_minus': PINN_post_minus.Net([2, 20, 20, 1]),
+                'PsiNN_burgers': PsiNN_burgers.Net(10, 1),
+                'TiedNet': StructureExtract.TiedNet(StructureExtract.extract(PINN.Net([2, 5, 5, 1]).state_dict()))}
+        self.assertIsNotNone(getattr(nets['PINN_post_minus'], 'symmetry', None))
+        input = np.random.default_rng(0).uniform(-1, 1, [1000, 2]).astype(np.float32)
+
+        with tempfile.TemporaryDirectory() as folder:
+            for name, net in nets.items():
+                file_path = Inference.export(net, os.path.join(folder, name + '.npz'))
+                for dtype in [np.float32, np.float64]:
+                    with self.subTest(net=name, dtype=dtype.__name__):
+                        # chunk_num不整除点数，同时检查分块的边界
+                        engine = Inference.Engine(file_path, dtype, chunk_num=333)
+                        errors = Inference.verify(net, engine, input, order=2, atol=1e-5)
+                        self.assertEqual(len(errors), 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
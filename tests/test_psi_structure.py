@@ -0,0 +1,49 @@
+# coding = utf-8
+import os
+import sys
+import importlib
+import unittest
+import torch
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import Module.PsiStructure as PsiStructure
+
+# (模块, 输出个数)
+# (module, output number)
+NETS = [('PsiNN_laplace', 1), ('PsiNN_burgers', 1), ('PsiNN_poisson', 1), ('PsiNN_flow', 3)]
+
+
+def residual_grads(net, forward, xy):
+    # 各输出对x、y的二阶导数平方和作为残差，返回其对网络参数的梯度（需要二次反传）
+    x = xy[:, 0:1].clone().requires_grad_()
+    y = xy[:, 1:2].clone().requires_grad_()
+    output = forward(torch.cat([x, y], 1))
+    loss = 0.
+    for i in range(output.shape[1]):
+        u_x, u_y = torch.autograd.grad(output[:, i].sum(), (x, y), create_graph=True)
+        u_xx = torch.autograd.grad(u_x.sum(), x, create_graph=True)[0]
+        u_yy = torch.autograd.grad(u_y.sum(), y, create_graph=True)[0]
+        loss = loss + (u_xx + u_yy).pow(2).mean() + u_x.pow(2).mean()
+    grads = torch.autograd.grad(loss, list(net.parameters()), allow_unused=True)
+    return [torch.zeros_like(p) if g is None else g for p, g in zip(net.parameters(), grads)]
+
+
+class PsiStructureTest(unittest.TestCase):
+    # 编译后的前向与逐分支的原始写法（forward_branch）的输出和残差梯度一致
+    # The lowered forward matches forward_branch in outputs and in the residual's parameter gradients.
+    def test_lowered_matches_branch(self):
+        torch.manual_seed(0)
+        xy = torch.rand(2001, 2) * 2 - 1
+        for name, output_num in NETS:
+            with self.subTest(net=name):
+                net = importlib.import_module('Module.' + name).Net(10, output_num)
+                self.assertLessEqual(PsiStructure.verify(net, xy, atol=1e-5), 1e-5)
+
+                lowered = residual_grads(net, net, xy)
+                branch = residual_grads(net, net.forward_branch, xy)
+                for grad_lowered, grad_branch in zip(lowered, branch):
+                    torch.testing.assert_close(grad_lowered, grad_branch, rtol=1e-5, atol=1e-5)
+
+
+if __name__ == '__main__':
+    unittest.main()